@@ -0,0 +1,319 @@
+"""
+Reproducible performance benchmarks for the RAG search engine.
+
+Every case builds a ``RagSearchEngine`` over a synthetic catalog with the
+deterministic ``FakeEmbeddingClient`` (seeded vectors, optional simulated
+API latency), so runs need no API key and are comparable across machines
+and releases. For each row count and index type the harness measures:
+
+- ingestion throughput (rows/s) through the real embedding pipeline,
+- single-query ``search`` latency percentiles (p50/p95/p99, ms),
+- ``search_many`` throughput (queries/s),
+- recall@k against an exact, streamed brute-force scan,
+- peak resident memory of the process that ran the case.
+
+Each case runs in its own process so peak RSS is attributable to it. The
+report is JSON, so two runs can be diffed with ``--compare``.
+
+Example::
+
+    python benchmarks/run.py --rows 10000 100000 --index-specs Flat HNSW32 IVF256,Flat --output bench.json
+    python benchmarks/run.py --compare baseline.json bench.json
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from libs.ragsearch.engine import RagSearchEngine  # noqa: E402
+from libs.ragsearch.fake import FakeEmbeddingClient  # noqa: E402
+from libs.ragsearch.vector_db import VectorDB  # noqa: E402
+
+REPORT_FORMAT_VERSION = 1
+# Metrics where a larger value is better; for every other numeric metric smaller is better
+HIGHER_IS_BETTER = ("ingest_rows_per_second", "batch_qps", "recall")
+
+_WORDS = ("red blue green black white steel wooden cotton leather glass ceramic compact large small "
+          "portable classic modern vintage premium organic lamp chair table mug bowl plate jacket shirt "
+          "shoe bag bottle desk shelf rug pillow blanket kettle pan knife spoon fork clock mirror").split()
+_CATEGORIES = ("home", "kitchen", "apparel", "outdoor", "office", "toys", "garden", "books")
+
+
+def synthetic_catalog(num_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Generates a product catalog with text, categorical and numeric columns.
+
+    Args:
+        num_rows (int): Number of rows.
+        seed (int): Random seed; the same seed always gives the same catalog.
+    Returns:
+        pd.DataFrame: The catalog.
+    """
+    rng = np.random.default_rng(seed)
+    words = np.array(_WORDS)
+    picks = rng.integers(0, len(words), size=(num_rows, 6))
+    names = [" ".join(row) for row in words[picks[:, :3]]]
+    descriptions = [" ".join(row) for row in words[picks[:, 3:]]]
+    return pd.DataFrame({
+        "sku": np.arange(num_rows),
+        "name": names,
+        "description": descriptions,
+        "category": np.array(_CATEGORIES)[rng.integers(0, len(_CATEGORIES), size=num_rows)],
+        "price": np.round(rng.uniform(1, 500, size=num_rows), 2),
+    })
+
+
+def _exact_top_k(model: FakeEmbeddingClient, texts: pd.Series, queries: np.ndarray, k: int,
+                 chunk_size: int = 100_000) -> np.ndarray:
+    """
+    Ground-truth neighbours by brute force, streaming the corpus so memory stays bounded.
+    """
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_ids = np.empty((len(queries), 0), dtype=np.int64)
+    for start in range(0, len(texts), chunk_size):
+        chunk = np.asarray(model.embed(texts=texts.iloc[start:start + chunk_size].tolist()).embeddings)
+        scores = np.concatenate([best_scores, queries @ chunk.T], axis=1)
+        ids = np.concatenate([best_ids, np.broadcast_to(np.arange(start, start + len(chunk)),
+                                                        (len(queries), len(chunk)))], axis=1)
+        top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_ids = np.take_along_axis(ids, top, axis=1)
+    return best_ids
+
+
+def _peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process in MiB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_case(num_rows: int, index_spec: str, embedding_dim: int = 64, num_queries: int = 200,
+             batch_queries: int = 1000, top_k: int = 10, batch_size: int = 1000, latency: float = 0.0,
+             embed_concurrency: int = 4, seed: int = 0, lexical: bool = True, precision: str = "float32",
+             rerank_factor: int = None, nprobe: int = None, ef_search: int = None) -> dict:
+    """
+    Benchmarks one row count and index type.
+
+    Args:
+        num_rows (int): Catalog size.
+        index_spec (str): FAISS index type (see ``VectorDB``).
+        embedding_dim (int): Dimension of the fake embeddings.
+        num_queries (int): Single queries timed for the latency percentiles and scored for recall.
+        batch_queries (int): Queries sent through ``search_many`` for the throughput figure.
+        top_k (int): Results per query, and the k of recall@k.
+        batch_size (int): Rows per embed request during ingestion.
+        latency (float): Seconds each fake embed call sleeps, to simulate the API round-trip.
+        embed_concurrency (int): Embed requests kept in flight during ingestion.
+        seed (int): Seed for the catalog and the fake embedding space.
+        lexical (bool): Build the BM25 index during ingestion too.
+        precision (str): Vector storage precision (see ``VectorDB``).
+        rerank_factor (int): Exact rerank depth multiplier (see ``VectorDB``).
+        nprobe (int): Inverted lists visited per query by IVF indexes.
+        ef_search (int): Search queue size of HNSW indexes.
+    Returns:
+        dict: The case's parameters and measurements.
+    """
+    data = synthetic_catalog(num_rows, seed=seed)
+    model = FakeEmbeddingClient(embedding_dim=embedding_dim, latency=latency, seed=seed)
+
+    with tempfile.TemporaryDirectory(prefix="ragsearch-bench-") as save_dir:
+        started = time.perf_counter()
+        vector_db = VectorDB(embedding_dim=embedding_dim, index_spec=index_spec,
+                             train_sample_size=min(num_rows, 50_000), precision=precision,
+                             rerank_factor=rerank_factor)
+        engine = RagSearchEngine(data, model, model, vector_db=vector_db, batch_size=batch_size,
+                                 save_dir=save_dir, embed_concurrency=embed_concurrency,
+                                 text_columns=["name", "description"], lexical=lexical)
+        ingest_seconds = time.perf_counter() - started
+
+        # Query latency is about the index, so the simulated API latency is switched off
+        model.latency = 0.0
+        queries = [f"{_WORDS[i % len(_WORDS)]} query {i}" for i in range(max(num_queries, batch_queries))]
+        latencies, found = [], []
+        for query in queries[:num_queries]:
+            started = time.perf_counter()
+            results = engine.search(query, top_k=top_k, nprobe=nprobe, ef_search=ef_search, columns=["sku"])
+            latencies.append((time.perf_counter() - started) * 1000)
+            found.append([hit["metadata"]["sku"] for hit in results])
+
+        started = time.perf_counter()
+        engine.search_many(queries[:batch_queries], top_k=top_k, nprobe=nprobe, ef_search=ef_search,
+                           columns=["sku"])
+        batch_seconds = time.perf_counter() - started
+
+        query_vectors = np.asarray(model.embed(texts=queries[:num_queries]).embeddings)
+        truth = _exact_top_k(model, engine.data["combined_text"], query_vectors, top_k)
+        recall = np.mean([len(np.intersect1d(hits, expected)) / top_k for hits, expected in zip(found, truth)])
+
+    latencies = np.array(latencies)
+    return {
+        "rows": num_rows,
+        "index_spec": index_spec,
+        "precision": precision,
+        "rerank_factor": rerank_factor,
+        "nprobe": nprobe,
+        "ef_search": ef_search,
+        "embedding_dim": embedding_dim,
+        "ingest_seconds": round(ingest_seconds, 3),
+        "ingest_rows_per_second": round(num_rows / ingest_seconds, 1),
+        "search_ms": {f"p{q}": round(float(np.percentile(latencies, q)), 3) for q in (50, 95, 99)},
+        "batch_qps": round(batch_queries / batch_seconds, 1),
+        "recall": {f"recall@{top_k}": round(float(recall), 4)},
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _quiet_logging():
+    """
+    Silences the per-query INFO logs, which would otherwise dominate the timings.
+    """
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def _run_case_in_subprocess(kwargs: dict) -> dict:
+    """
+    Runs one case in a fresh process so its peak RSS is not inflated by earlier cases.
+    """
+    with multiprocessing.get_context("spawn").Pool(1, initializer=_quiet_logging) as pool:
+        return pool.apply(run_case, kwds=kwargs)
+
+
+def run(rows: list, index_specs: list, isolate: bool = True, **options) -> dict:
+    """
+    Runs every combination of row count and index type.
+
+    Args:
+        rows (list): Catalog sizes.
+        index_specs (list): FAISS index types.
+        isolate (bool): Run each case in its own process.
+        **options: Passed to ``run_case``.
+    Returns:
+        dict: The report: environment, options and one result per case.
+    """
+    import faiss
+
+    results = []
+    for num_rows in rows:
+        for index_spec in index_specs:
+            kwargs = dict(options, num_rows=num_rows, index_spec=index_spec)
+            result = _run_case_in_subprocess(kwargs) if isolate else run_case(**kwargs)
+            print(f"{num_rows:>10} rows  {index_spec:<16} {result['ingest_rows_per_second']:>10.0f} rows/s  "
+                  f"p50 {result['search_ms']['p50']:.2f} ms  p99 {result['search_ms']['p99']:.2f} ms  "
+                  f"{result['batch_qps']:.0f} qps  {result['recall']}  {result['peak_rss_mb']} MiB",
+                  file=sys.stderr)
+            results.append(result)
+    return {
+        "format_version": REPORT_FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "faiss": faiss.__version__, "numpy": np.__version__, "pandas": pd.__version__},
+        "options": options,
+        "results": results,
+    }
+
+
+def _flatten(result: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.1) -> list:
+    """
+    Compares two reports case by case.
+
+    Args:
+        baseline (dict): The earlier report.
+        current (dict): The new report.
+        tolerance (float): Relative change beyond which a metric counts as a regression.
+    Returns:
+        list: One dict per metric with ``case``, ``metric``, ``baseline``, ``current``,
+        ``change`` (relative) and ``regression``.
+    """
+    def case_key(result):
+        return tuple(result.get(key) for key in ("rows", "index_spec", "precision", "rerank_factor",
+                                                  "nprobe", "ef_search"))
+
+    earlier = {case_key(result): result for result in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        previous = earlier.get(case_key(result))
+        if previous is None:
+            continue
+        before, after = _flatten(previous), _flatten(result)
+        for metric, value in after.items():
+            if metric in ("rows", "embedding_dim", "rerank_factor", "nprobe", "ef_search") or not before.get(metric):
+                continue
+            change = (value - before[metric]) / before[metric]
+            worse = -change if metric.split(".")[0] in HIGHER_IS_BETTER else change
+            rows.append({"case": f"{result['rows']}/{result['index_spec']}", "metric": metric,
+                         "baseline": before[metric], "current": value, "change": round(change, 4),
+                         "regression": worse > tolerance})
+    return rows
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, search latency and recall.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--index-specs", nargs="+", default=["Flat", "HNSW32", "IVF256,Flat"])
+    parser.add_argument("--embedding-dim", type=int, default=64)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--batch-queries", type=int, default=1000)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per embed call.")
+    parser.add_argument("--embed-concurrency", type=int, default=4)
+    parser.add_argument("--precision", default="float32", choices=["float32", "float16", "int8"])
+    parser.add_argument("--rerank-factor", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, default=None)
+    parser.add_argument("--ef-search", type=int, default=None)
+    parser.add_argument("--no-lexical", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-isolate", action="store_true", help="Run every case in this process.")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Compare two reports instead of running; exits 1 on regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args(argv)
+    _quiet_logging()
+
+    if args.compare:
+        baseline, current = (json.loads(Path(path).read_text()) for path in args.compare)
+        changes = compare(baseline, current, tolerance=args.tolerance)
+        print(json.dumps(changes, indent=2))
+        sys.exit(1 if any(change["regression"] for change in changes) else 0)
+
+    report = run(args.rows, args.index_specs, isolate=not args.no_isolate,
+                 embedding_dim=args.embedding_dim, num_queries=args.num_queries,
+                 batch_queries=args.batch_queries, top_k=args.top_k, batch_size=args.batch_size,
+                 latency=args.latency, embed_concurrency=args.embed_concurrency, seed=args.seed,
+                 lexical=not args.no_lexical, precision=args.precision, rerank_factor=args.rerank_factor,
+                 nprobe=args.nprobe, ef_search=args.ef_search)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Cold-import benchmark for the ragsearch package.
+
+CLI tools and serverless workers pay the package's import time on every
+start, so heavy dependencies must only be loaded by the code paths that
+use them. Each measurement imports one module in a fresh interpreter and
+records the wall time and which heavy dependencies ended up loaded.
+
+Example::
+
+    python benchmarks/startup.py --repeat 5 --output startup.json
+    python benchmarks/startup.py --budget 0.2  # exits 1 if "import libs.ragsearch" is slower
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+REPORT_FORMAT_VERSION = 1
+
+DEFAULT_MODULES = ["libs.ragsearch", "libs.ragsearch.vector_db", "libs.ragsearch.engine"]
+HEAVY_DEPENDENCIES = ["pandas", "pyarrow", "faiss", "chromadb", "flask", "werkzeug", "cohere"]
+
+_PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def measure_import(module: str, repeat: int = 3) -> dict:
+    """
+    Imports a module in fresh interpreters and times it.
+
+    Args:
+        module (str): The dotted module name.
+        repeat (int): Number of fresh interpreters to time.
+    Returns:
+        dict: ``module``, ``seconds`` (min and median), and ``loaded``, the heavy
+        dependencies the import pulled in.
+    """
+    probe = _PROBE.format(root=str(REPO_ROOT), module=module, heavy=HEAVY_DEPENDENCIES)
+    samples = []
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True)
+        samples.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    seconds = [sample["seconds"] for sample in samples]
+    return {
+        "module": module,
+        "seconds": {"min": round(min(seconds), 4), "median": round(statistics.median(seconds), 4)},
+        "loaded": samples[-1]["loaded"],
+    }
+
+
+def run(modules: list = None, repeat: int = 3) -> dict:
+    """
+    Measures the cold import of every module.
+
+    Args:
+        modules (list, optional): Dotted module names. Defaults to ``DEFAULT_MODULES``.
+        repeat (int): Fresh interpreters per module.
+    Returns:
+        dict: The report: environment and one result per module.
+    """
+    results = []
+    for module in modules or DEFAULT_MODULES:
+        result = measure_import(module, repeat=repeat)
+        print(f"{module:<32} median {result['seconds']['median'] * 1000:>8.1f} ms  loads {result['loaded']}",
+              file=sys.stderr)
+        results.append(result)
+    return {
+        "format_version": REPORT_FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Benchmark cold import time of the ragsearch package.")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget", type=float, default=None,
+                        help="Exit 1 if the first module's median import takes longer than this many seconds.")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args(argv)
+
+    report = run(args.modules, repeat=args.repeat)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+    if args.budget is not None and report["results"][0]["seconds"]["median"] > args.budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,25 @@
 ragsearch is a Python library designed for building a
 Retrieval-Augmented Generation (RAG) application
 that enables natural language querying over structured data.
+
+Importing the package is cheap: pandas, FAISS, ChromaDB, Flask and the
+Cohere SDK are only loaded by the code paths that use them.
 """
 from .setup import setup
-from .engine import RagSearchEngine
 
 __all__ = [
     "setup",
     "RagSearchEngine",
+    "EngineRegistry",
 ]
+
+
+def __getattr__(name: str):
+    # Resolve the engine and registry on first access rather than at import time
+    if name == "RagSearchEngine":
+        from .engine import RagSearchEngine
+        return RagSearchEngine
+    if name == "EngineRegistry":
+        from .registry import EngineRegistry
+        return EngineRegistry
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
@@ -0,0 +1,176 @@
+"""
+Micro-batching request coalescer for the search path.
+
+Concurrent callers submit single queries; a dispatcher thread collects them
+for up to ``max_wait_ms`` milliseconds or until ``max_batch_size`` queries are
+waiting, runs the whole batch through one batched search (one embed call and
+one ``index.search``) and scatters the results back to the waiting callers.
+At most ``max_pending`` queries may be queued or in flight; beyond that
+``submit`` raises ``CoalescerFullError`` so the server can shed load with a
+503 instead of letting the backlog, and every caller's latency, grow without bound.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+_STOP = object()
+
+
+class CoalescerFullError(RuntimeError):
+    """
+    Raised by ``RequestCoalescer.submit`` when ``max_pending`` queries are already waiting.
+    """
+
+
+class RequestCoalescer:
+    """
+    Coalesces concurrent single-query searches into batched searches.
+    """
+    def __init__(self,
+                 search_many,
+                 max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0,
+                 max_concurrent_batches: int = 2,
+                 max_pending: int = 1_024):
+        """
+        Args:
+            search_many (callable): ``search_many(queries, top_k=..., **params)`` returning
+                one result list per query, e.g. ``RagSearchEngine.search_many``.
+            max_batch_size (int): Maximum number of queries searched together.
+            max_wait_ms (float): Longest time the first query of a batch waits for company.
+                This bounds the latency the coalescer adds to any request.
+            max_concurrent_batches (int): Batches that may be in flight at once, so a new
+                batch can be collected and embedded while the previous one is searched.
+            max_pending (int): Maximum number of queries queued or being searched. Further
+                queries are rejected with ``CoalescerFullError``.
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        if max_pending < 1:
+            raise ValueError("max_pending must be at least 1")
+        self.search_many = search_many
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_pending = max_pending
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_batches,
+                                            thread_name_prefix="ragsearch-coalescer")
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="ragsearch-coalescer-dispatch",
+                                            daemon=True)
+        self._closed = False
+        self._dispatcher.start()
+
+    def submit(self, query: str, top_k: int = 5, **params) -> Future:
+        """
+        Queue a query for the next batch.
+
+        Args:
+            query (str): The search query.
+            top_k (int): The number of results to return.
+            **params: Search knobs such as ``nprobe``, ``ef_search`` or ``filters``. Only
+                queries with identical knobs are batched together.
+        Returns:
+            Future: Resolves to the query's result list.
+        Raises:
+            CoalescerFullError: If ``max_pending`` queries are already queued or in flight.
+        """
+        if self._closed:
+            raise RuntimeError("The request coalescer has been closed.")
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                raise CoalescerFullError(f"{self._pending} queries are already pending.")
+            self._pending += 1
+        future = Future()
+        future.add_done_callback(self._release)
+        group = json.dumps(params, sort_keys=True, default=str)
+        self._queue.put((query, top_k, group, future, params))
+        return future
+
+    def _release(self, future: Future):
+        with self._pending_lock:
+            self._pending -= 1
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of queries queued or being searched.
+        """
+        return self._pending
+
+    def search(self, query: str, top_k: int = 5, timeout: float = None, **params) -> list:
+        """
+        Search for one query through the coalescer, blocking until its batch completes.
+        """
+        return self.submit(query, top_k, **params).result(timeout=timeout)
+
+    def _dispatch_loop(self):
+        """
+        Collects batches from the queue and hands them to the executor.
+        """
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._executor.submit(self._run_batch, batch)
+            if stop:
+                return
+
+    def _run_batch(self, batch: list):
+        """
+        Runs one batch, grouped by search knobs, and resolves every caller's future.
+        """
+        groups = {}
+        for item in batch:
+            groups.setdefault(item[2], []).append(item)
+        for items in groups.values():
+            # Search once with the largest top_k and trim per caller
+            top_k = max(item[1] for item in items)
+            try:
+                batch_results = self.search_many([item[0] for item in items], top_k=top_k, **items[0][4])
+            except Exception as e:
+                for item in items:
+                    item[3].set_exception(e)
+                continue
+            for item, results in zip(items, batch_results):
+                item[3].set_result(results[:item[1]])
+        logging.debug(f"Coalesced {len(batch)} queries into {len(groups)} batched searches")
+
+    def close(self):
+        """
+        Stop accepting queries, finish the queued ones and shut down the worker threads.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+        # Fail anything that raced past the closed check
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                item[3].set_exception(RuntimeError("The request coalescer has been closed."))
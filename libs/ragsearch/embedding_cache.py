@@ -0,0 +1,243 @@
+"""
+Content-addressed cache for embedding API calls.
+
+Embeddings are keyed by (model, input_type, sha256 of the text). Lookups go
+through an in-process LRU tier first and an optional SQLite tier on disk
+second; vectors are stored on disk as float16 blobs to halve their footprint.
+``CachedEmbeddingModel`` wraps any client exposing ``embed(texts=...)`` so
+the engine can use it as a drop-in replacement for the Cohere client.
+"""
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+
+def cache_key(model: str, input_type: str, text: str) -> str:
+    """
+    Build the cache key for one embedded text.
+
+    Args:
+        model (str): The embedding model name.
+        input_type (str): The Cohere input type (e.g. ``search_query``).
+        text (str): The preprocessed text that is sent to the API.
+    Returns:
+        str: The cache key.
+    """
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{model or ''}:{input_type or ''}:{text_hash}"
+
+
+class LRUEmbeddingStore:
+    """
+    In-process tier holding up to ``capacity`` float32 vectors.
+    """
+    def __init__(self, capacity: int = 100_000):
+        if capacity <= 0:
+            raise ValueError("capacity must be a positive integer")
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: list) -> dict:
+        """
+        Return the cached vectors for ``keys``, marking them as recently used.
+        """
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = vector
+        return found
+
+    def put_many(self, items: dict):
+        """
+        Insert vectors, evicting the least recently used entries beyond capacity.
+        """
+        with self._lock:
+            for key, vector in items.items():
+                self._entries[key] = vector
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteEmbeddingStore:
+    """
+    On-disk tier keeping vectors as float16 blobs in a SQLite table.
+    """
+    _LOOKUP_CHUNK = 500  # Stay below SQLite's bound-parameter limit
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    def get_many(self, keys: list) -> dict:
+        """
+        Return the stored vectors for ``keys`` as float32 arrays.
+        """
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), self._LOOKUP_CHUNK):
+                chunk = keys[start:start + self._LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+        return found
+
+    def put_many(self, items: dict):
+        """
+        Insert or replace vectors, downcasting them to float16.
+        """
+        rows = [(key, np.asarray(vector, dtype=np.float16).tobytes()) for key, vector in items.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+    def close(self):
+        """
+        Close the SQLite connection.
+        """
+        with self._lock:
+            self._conn.close()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache: an LRU in memory backed by an optional SQLite file.
+
+    Any object exposing ``get_many(keys) -> dict`` and ``put_many(dict)`` can be
+    passed as a tier, which makes the storage pluggable.
+    """
+    def __init__(self, memory_capacity: int = 100_000, disk_path: Path = None, tiers: list = None):
+        """
+        Args:
+            memory_capacity (int): Number of vectors kept in the in-process LRU.
+            disk_path (Path, optional): SQLite file for the persistent tier.
+            tiers (list, optional): Explicit tiers, fastest first. Overrides the two arguments above.
+        """
+        if tiers is None:
+            tiers = [LRUEmbeddingStore(memory_capacity)]
+            if disk_path is not None:
+                tiers.append(SQLiteEmbeddingStore(disk_path))
+        self.tiers = tiers
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: list) -> dict:
+        """
+        Look up keys tier by tier, promoting lower-tier hits into the faster tiers.
+
+        Args:
+            keys (list): Cache keys to look up.
+        Returns:
+            dict: The vectors that were found, by key.
+        """
+        found = {}
+        missing = list(keys)
+        for depth, tier in enumerate(self.tiers):
+            if not missing:
+                break
+            tier_hits = tier.get_many(missing)
+            if tier_hits:
+                for faster_tier in self.tiers[:depth]:
+                    faster_tier.put_many(tier_hits)
+                found.update(tier_hits)
+                missing = [key for key in missing if key not in tier_hits]
+        self.hits += len(found)
+        self.misses += len(missing)
+        return found
+
+    def put_many(self, items: dict):
+        """
+        Store vectors in every tier.
+
+        Args:
+            items (dict): Vectors by cache key.
+        """
+        for tier in self.tiers:
+            tier.put_many(items)
+
+    @property
+    def hit_ratio(self) -> float:
+        """
+        Fraction of looked-up keys that were served from the cache.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class CachedEmbeddingModel:
+    """
+    Wraps an embedding client so repeated texts are served from an ``EmbeddingCache``.
+
+    Duplicate texts inside one call are embedded once, and only texts that
+    miss the cache are sent to the underlying client.
+    """
+    def __init__(self, client, cache: EmbeddingCache, model: str = None, input_type: str = None):
+        """
+        Args:
+            client: The wrapped client, e.g. ``cohere.Client``.
+            cache (EmbeddingCache): The cache to read from and populate.
+            model (str, optional): Model used (and sent to the client) when a call does not pass ``model``.
+            input_type (str, optional): Input type used (and sent to the client) when a call does not pass one.
+        """
+        self.client = client
+        self.cache = cache
+        self.model = model
+        self.input_type = input_type
+
+    def embed(self, texts: list, **kwargs):
+        """
+        Embed texts, calling the wrapped client only for distinct cache misses.
+
+        Args:
+            texts (list): The texts to embed.
+            **kwargs: Passed through to the wrapped client's ``embed``.
+        Returns:
+            SimpleNamespace: A response whose ``embeddings`` is a float32 matrix aligned with ``texts``.
+        """
+        # Defaults are sent too, so the cached vectors are always those of the keyed model
+        if self.model is not None:
+            kwargs.setdefault("model", self.model)
+        if self.input_type is not None:
+            kwargs.setdefault("input_type", self.input_type)
+        model = kwargs.get("model")
+        input_type = kwargs.get("input_type")
+        keys = [cache_key(model, input_type, text) for text in texts]
+
+        # Deduplicate before touching the cache or the API
+        unique = dict(zip(keys, texts))
+        vectors = self.cache.get_many(list(unique))
+        missing_keys = [key for key in unique if key not in vectors]
+
+        if missing_keys:
+            response = self.client.embed(texts=[unique[key] for key in missing_keys], **kwargs)
+            fetched = np.asarray(response.embeddings, dtype=np.float32)
+            new_vectors = dict(zip(missing_keys, fetched))
+            self.cache.put_many(new_vectors)
+            vectors.update(new_vectors)
+
+        logging.debug(f"Embedding cache: {len(texts)} texts, {len(unique)} unique, {len(missing_keys)} sent to API")
+        if not texts:
+            return SimpleNamespace(embeddings=np.empty((0, 0), dtype=np.float32))
+        return SimpleNamespace(embeddings=np.stack([vectors[key] for key in keys]))
@@ -2,49 +2,130 @@
 This module contains the RAGSearchEngine class,
 which is responsible for initializing the RAG Search Engine
 """
+import copy
 import logging
-from typing import List, Dict
+import os
+import shutil
+import tempfile
+import time
+from typing import TYPE_CHECKING, List, Dict
+import numpy as np
 import pandas as pd
-from cohere import Client as CohereClient
 from .utils import (extract_textual_columns,
                     preprocess_search_text,
-                    preprocess_text,
-                    insert_embeddings_to_vector_db,
+                    build_combined_text,
+                    content_hashes,
                     search_vector_db,
                     log_data_summary)
 from .vector_db import VectorDB
-from flask import Flask, request, jsonify, render_template
-import threading
+from .metadata_store import MetadataStore
+from .lexical import BM25Index, reciprocal_rank_fusion, weighted_fusion
+from .persistence import (METADATA_FILE_NAME,
+                          MetadataWriter,
+                          snapshot_exists,
+                          latest_snapshot,
+                          set_latest_snapshot,
+                          save_snapshot,
+                          load_snapshot,
+                          load_lexical_index,
+                          load_row_state,
+                          read_metadata)
+from .embedding_cache import EmbeddingCache, CachedEmbeddingModel
+from .result_cache import QueryResultCache, result_cache_key
+from .pipeline import EmbeddingPipeline
+from .coalescer import CoalescerFullError, RequestCoalescer
+from .generation import DEFAULT_CONTEXT_TOKENS, DEFAULT_PREAMBLE, pack_context, prefetch, sse_event, stream_chat
+from . import metrics
+from .metrics import span, log_query
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from pathlib import Path
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+if TYPE_CHECKING:
+    # Flask, werkzeug and the Cohere SDK are only imported when serving or calling the API
+    from cohere import Client as CohereClient
+    from flask import Flask
+    from .server import SearchServer
+
+
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+FUSION_METHODS = ("rrf", "weighted")
+# Hybrid search fuses this many times top_k candidates from each retriever
+HYBRID_CANDIDATE_FACTOR = 4
+# Cohere input types: rows are embedded as documents, searches as queries
+DOCUMENT_INPUT_TYPE = "search_document"
+QUERY_INPUT_TYPE = "search_query"
 
 class RagSearchEngine:
     def __init__(self,
                  data: pd.DataFrame,
-                 embedding_model: CohereClient,
-                 llm_client: CohereClient,
+                 embedding_model: "CohereClient",
+                 llm_client: "CohereClient",
                  vector_db: VectorDB = None,
                  batch_size: int = 100,
                  save_dir: str = "embeddings",
                  file_name: str = "data.csv",
                  chromadb_sqlite_path: str = None,
-                 chromadb_collection_name: str = None):
+                 chromadb_collection_name: str = None,
+                 chromadb_query_embeddings: bool = False,
+                 fingerprint: str = None,
+                 embedding_cache: EmbeddingCache = None,
+                 embed_concurrency: int = 4,
+                 requests_per_second: float = None,
+                 text_columns: list = None,
+                 column_prefixes: dict = None,
+                 max_text_tokens: int = None,
+                 lexical: bool = True,
+                 id_column: str = None,
+                 dataset_key: str = None,
+                 result_cache: QueryResultCache = None,
+                 embedding_model_name: str = None):
         """
         Initializes the RAG Search Engine with data, an LLM client, and a vector database.
 
         Args:
-            data (pd.DataFrame): The input data containing structured information.
+            data (pd.DataFrame): The input data containing structured information, or an
+                iterable of DataFrame chunks (see ``loaders.iter_data_chunks``) to stream it
+                into the index with memory bounded by the chunk size.
             embedding_model (CohereClient): The client for generating text embeddings.
             llm_client (CohereClient): The client for interacting with the LLM.
-            vector_db (VectorDB): The vector database for storing and querying embeddings.
+            vector_db (VectorDB): The vector database for storing and querying embeddings, or a
+                ``ShardedVectorDB`` to partition the index and search the shards in parallel.
             batch_size (int): Number of rows to process in each batch.
             save_dir (str): Directory to save intermediate embeddings.
+            chromadb_query_embeddings (bool): Embed ChromaDB queries with ``embedding_model`` and
+                query by vector, for collections built with the same model.
+            fingerprint (str): Identifies the source data (see ``persistence.dataset_fingerprint``).
+                When set, the FAISS index is persisted under ``save_dir/<fingerprint>``
+                and reloaded on later runs instead of re-embedding the data.
+            embedding_cache (EmbeddingCache): Optional cache placed in front of ``embedding_model``
+                so duplicate rows and repeated queries are not sent to the API again.
+            embed_concurrency (int): Number of embed requests kept in flight during ingestion.
+            requests_per_second (float): Optional rate limit for ingestion embed requests.
+            text_columns (list): Allowlist of columns combined into the embedded text.
+                Defaults to every string column.
+            column_prefixes (dict): Per-column text prepended to each value, e.g. ``{"name": "Name: "}``.
+            max_text_tokens (int): Truncate each combined text to roughly this many tokens.
+            lexical (bool): Build a BM25 index over the combined text during ingestion
+                for lexical and hybrid search (FAISS only).
+            id_column (str): Column holding each row's stable primary key, used by ``upsert``,
+                ``delete`` and ``refresh``. Defaults to the row position.
+            dataset_key (str): Identifies the dataset across versions (see ``persistence.dataset_key``).
+                When the fingerprint has no snapshot but an earlier version of the dataset does,
+                that snapshot is refreshed incrementally instead of re-embedding every row.
+            result_cache (QueryResultCache): Optional cache of search results. Repeated (and,
+                with a semantic threshold, near-duplicate) queries skip the embed call and the
+                index search until the rows change.
+            embedding_model_name (str): The Cohere embedding model, e.g. ``"embed-english-v3.0"``.
+                Sent with every embed call and part of the embedding cache keys, so switching
+                models never serves the old model's vectors. Defaults to the client's default model.
         """
         logging.info("Initializing RAG Search Engine...")
         self.data = data
         self.embedding_model = embedding_model
+        self.embedding_model_name = embedding_model_name
+        if embedding_cache is not None:
+            self.embedding_model = CachedEmbeddingModel(embedding_model, embedding_cache, model=embedding_model_name)
+        self.embedding_cache = embedding_cache
         self.llm_client = llm_client
         self.vector_db = vector_db
         self.batch_size = batch_size
@@ -52,29 +133,302 @@ class RagSearchEngine:
         self.file_name = file_name
         self.chromadb_sqlite_path = chromadb_sqlite_path
         self.chromadb_collection_name = chromadb_collection_name
+        self.chromadb_query_embeddings = chromadb_query_embeddings
+        self.fingerprint = fingerprint
+        self.embed_concurrency = embed_concurrency
+        self.requests_per_second = requests_per_second
+        self.text_columns = text_columns
+        self.column_prefixes = column_prefixes
+        self.max_text_tokens = max_text_tokens
+        self.coalescer = None
+        self.metadata = None  # Columnar view of self.data used to hydrate hits
+        self.lexical_index = BM25Index() if lexical and vector_db is not None else None
+        self.id_column = id_column
+        self.dataset_key = dataset_key
+        self.textual_columns = None
+        self.row_ids = None  # Vector id of each row of self.data
+        self.text_hashes = None  # Hash of each row's combined_text
+        self._id_to_row = None  # Row of each vector id, -1 once deleted
+        self._identity_rows = True  # Row i has vector id i and no id was deleted
+        self.result_cache = result_cache
+        self.index_version = 0  # Bumped whenever the searchable rows change
 
         # Ensure the embeddings directory exists
         self.save_dir.mkdir(parents=True, exist_ok=True)
 
-        # Log data summary
-        log_data_summary(self.data)
+        streaming = not isinstance(data, pd.DataFrame)
+        if streaming and self.vector_db is None:
+            raise ValueError("Streaming ingestion requires the FAISS backend.")
 
-        # Extract textual columns
-        textual_columns = extract_textual_columns(data)
+        textual_columns = None
+        if not streaming:
+            # Log data summary
+            log_data_summary(self.data)
+
+            # Extract textual columns
+            textual_columns = extract_textual_columns(data, include=self.text_columns)
 
         # Only process embeddings if using FAISS
         if self.vector_db is not None:
-            self._process_and_store_embeddings(textual_columns)
+            self._load_or_build_index(textual_columns)
 
         logging.info("RAG Search Engine initialized successfully.")
+
+    @classmethod
+    def from_snapshot(cls, snapshot_dir, embedding_model: "CohereClient", llm_client: "CohereClient" = None,
+                      **engine_options) -> "RagSearchEngine":
+        """
+        Opens a persisted snapshot without the source data. The index, rows and lexical index
+        are memory-mapped, so opening is fast and processes serving the same snapshot share
+        its pages.
+
+        Args:
+            snapshot_dir (Path): The snapshot directory, ``save_dir/<fingerprint>``.
+            embedding_model (CohereClient): The client embedding queries; must be the model the
+                snapshot was built with.
+            llm_client (CohereClient): The client for ``answer``.
+            **engine_options: Other constructor arguments, e.g. ``result_cache``.
+        Returns:
+            RagSearchEngine: The engine, ready to search.
+        Raises:
+            FileNotFoundError: If ``snapshot_dir`` holds no complete snapshot.
+        """
+        snapshot_dir = Path(snapshot_dir)
+        if not snapshot_exists(snapshot_dir):
+            raise FileNotFoundError(f"No snapshot found in {snapshot_dir}")
+        # The index is replaced by the snapshot's; an empty stream is never read
+        return cls(iter([]), embedding_model, llm_client, vector_db=VectorDB(), save_dir=snapshot_dir.parent,
+                   fingerprint=snapshot_dir.name, **engine_options)
+
+    def memory_bytes(self) -> int:
+        """
+        Estimates the memory held by the index, the rows and the lexical index, whether
+        on the heap or memory-mapped.
+        """
+        total = self.metadata.nbytes if self.metadata is not None else 0
+        vector_db = self.vector_db
+        if vector_db is not None and vector_db.embedding_dim:
+            component_bytes = {"float16": 2, "int8": 1}.get(vector_db.precision, 4)
+            total += vector_db.ntotal * vector_db.embedding_dim * component_bytes
+            if vector_db.rerank_factor:
+                total += vector_db.ntotal * vector_db.embedding_dim * 4
+        if self.lexical_index is not None:
+            total += self.lexical_index.postings.nbytes + self.lexical_index.tfs.nbytes
+        return int(total)
+
+    def close(self):
+        """
+        Stops the request coalescer and the index's worker threads. The engine must not be
+        used afterwards.
+        """
+        if self.coalescer is not None:
+            self.coalescer.close()
+            self.coalescer = None
+        close = getattr(self.vector_db, "close", None)
+        if close is not None:
+            close()
+
     def chromadb_search(self, query: str, top_k: int = 5):
         """
         Query the ChromaDB collection for similar documents to the query text.
         """
-        from .vector_db import query_chromadb
+        return self.chromadb_search_many([query], top_k=top_k)
+
+    def chromadb_search_many(self, queries: List[str], top_k: int = 5):
+        """
+        Query the ChromaDB collection for many query texts in one call. With
+        ``chromadb_query_embeddings`` the queries are embedded with ``embedding_model``
+        and the vectors are sent instead of the texts.
+
+        Args:
+            queries (List[str]): The search queries.
+            top_k (int): The number of results per query.
+        Returns:
+            dict: ChromaDB's query result, with one list per query under each key.
+        """
+        from .vector_db import query_chromadb_batch
         if not self.chromadb_sqlite_path or not self.chromadb_collection_name:
             raise ValueError("ChromaDB path and collection name must be set for chromadb_search.")
-        return query_chromadb(self.chromadb_sqlite_path, self.chromadb_collection_name, query, n_results=top_k)
+        queries = list(queries)
+        if not queries:
+            return _empty_chromadb_result()
+        cache = self.result_cache
+        if cache is None:
+            if self.chromadb_query_embeddings:
+                embeddings = self.embedding_model.embed(texts=queries, **self._embed_options(QUERY_INPUT_TYPE)).embeddings
+                return query_chromadb_batch(self.chromadb_sqlite_path, self.chromadb_collection_name,
+                                            n_results=top_k, query_embeddings=embeddings)
+            return query_chromadb_batch(self.chromadb_sqlite_path, self.chromadb_collection_name,
+                                        query_texts=queries, n_results=top_k)
+
+        version = self.index_version
+        params = {"backend": "chromadb", "top_k": top_k, "query_embeddings": self.chromadb_query_embeddings}
+        group = result_cache_key("", params)
+        keys = [result_cache_key(preprocess_search_text(query), params) for query in queries]
+        parts = [self._cached_results(key, version) for key in keys]
+        pending = [position for position, part in enumerate(parts) if part is None]
+        embeddings = None
+        if pending and self.chromadb_query_embeddings:
+            embeddings = self.embedding_model.embed(texts=[queries[position] for position in pending],
+                                                    **self._embed_options(QUERY_INPUT_TYPE)).embeddings
+            similar = [self._similar_results(group, embedding, version) for embedding in embeddings]
+            for position, part in zip(pending, similar):
+                parts[position] = part
+            embeddings = [embedding for embedding, part in zip(embeddings, similar) if part is None]
+            pending = [position for position, part in zip(pending, similar) if part is None]
+        if pending:
+            if embeddings is not None:
+                result = query_chromadb_batch(self.chromadb_sqlite_path, self.chromadb_collection_name,
+                                              n_results=top_k, query_embeddings=embeddings)
+            else:
+                result = query_chromadb_batch(self.chromadb_sqlite_path, self.chromadb_collection_name,
+                                              query_texts=[queries[position] for position in pending],
+                                              n_results=top_k)
+            for j, (position, part) in enumerate(zip(pending, _split_chromadb_result(result, len(pending)))):
+                parts[position] = part
+                self._store_results(keys[position], part, version, group,
+                                    embeddings[j] if embeddings is not None else None)
+        return _merge_chromadb_results(parts)
+
+    def _load_or_build_index(self, textual_columns: list = None):
+        """
+        Warm-starts from a persisted snapshot when one matches the fingerprint. Otherwise
+        refreshes the dataset's previous snapshot when there is one, or embeds all the data,
+        and persists the result for the next run.
+
+        Args:
+            textual_columns (list): The list of columns to combine for text embeddings,
+                or None when ``self.data`` is a stream of chunks.
+        """
+        self.textual_columns = textual_columns
+        snapshot_dir = self.save_dir / self.fingerprint if self.fingerprint else None
+        if snapshot_dir is not None and snapshot_exists(snapshot_dir):
+            try:
+                self._load_snapshot(snapshot_dir)
+                if self.dataset_key:
+                    set_latest_snapshot(self.save_dir, self.dataset_key, snapshot_dir)
+                return
+            except Exception as e:
+                logging.error(f"Failed to load snapshot from {snapshot_dir}, rebuilding: {e}")
+
+        if isinstance(self.data, pd.DataFrame):
+            previous_dir = latest_snapshot(self.save_dir, self.dataset_key) \
+                if snapshot_dir is not None and self.dataset_key else None
+            if previous_dir is not None:
+                data, vector_db, lexical_index = self.data, self.vector_db, self.lexical_index
+                try:
+                    self._load_snapshot(previous_dir, mmap=False)
+                    self.refresh(data, textual_columns)
+                    self.persist()
+                    shutil.rmtree(previous_dir, ignore_errors=True)
+                    return
+                except Exception as e:
+                    logging.error(f"Failed to refresh snapshot {previous_dir}, rebuilding: {e}")
+                    self.data, self.vector_db, self.lexical_index = data, vector_db, lexical_index
+
+            self._process_and_store_embeddings(textual_columns)
+            self._set_rows(self.data)
+            if snapshot_dir is not None:
+                self.persist()
+            return
+
+        # Streaming: row metadata is spilled to an Arrow file and memory-mapped afterwards
+        fd, metadata_file = tempfile.mkstemp(dir=self.save_dir, suffix=".metadata.arrow")
+        os.close(fd)
+        metadata_file = Path(metadata_file)
+        try:
+            self.textual_columns, text_hashes = self._process_and_store_stream(self.data, metadata_file)
+            row_state = {"row_ids": np.arange(len(text_hashes), dtype=np.int64), "text_hashes": text_hashes}
+            if snapshot_dir is not None:
+                save_snapshot(snapshot_dir, self.vector_db, manifest=self._manifest(),
+                              metadata_file=metadata_file, lexical_index=self.lexical_index,
+                              row_state=row_state)
+                metadata_file = snapshot_dir / METADATA_FILE_NAME
+                if self.dataset_key:
+                    set_latest_snapshot(self.save_dir, self.dataset_key, snapshot_dir)
+            self._set_rows(read_metadata(metadata_file), **row_state)
+        finally:
+            if snapshot_dir is None or metadata_file.parent != snapshot_dir:
+                # The mapping stays valid after the unlink on POSIX systems
+                try:
+                    metadata_file.unlink()
+                except OSError:
+                    pass
+
+    def _load_snapshot(self, snapshot_dir: Path, mmap: bool = True):
+        """
+        Restores the index, rows, lexical index and row ids from a snapshot.
+        """
+        self.vector_db, data, manifest = load_snapshot(snapshot_dir, mmap=mmap)
+        self.textual_columns = manifest.get("textual_columns", self.textual_columns)
+        self.file_name = manifest.get("file_name") or self.file_name
+        self.id_column = self.id_column or manifest.get("id_column")
+        row_state = load_row_state(snapshot_dir) or {}
+        self._set_rows(data, row_state.get("row_ids"), row_state.get("text_hashes"))
+        if self.lexical_index is not None:
+            self.lexical_index = load_lexical_index(snapshot_dir, mmap=mmap) or self._build_lexical_index()
+
+    def _manifest(self) -> dict:
+        """
+        The manifest fields recorded with every snapshot.
+        """
+        return {"file_name": self.file_name, "textual_columns": self.textual_columns, "id_column": self.id_column}
+
+    def persist(self) -> Path:
+        """
+        Persists the current index, rows and lexical index under ``save_dir/<fingerprint>``
+        and records it as the dataset's latest snapshot.
+
+        Returns:
+            Path: The snapshot directory.
+        Raises:
+            ValueError: If the engine has no fingerprint.
+        """
+        if not self.fingerprint:
+            raise ValueError("A fingerprint is required to save a snapshot.")
+        snapshot_dir = save_snapshot(self.save_dir / self.fingerprint, self.vector_db, self.data,
+                                     self._manifest(), lexical_index=self.lexical_index,
+                                     row_state={"row_ids": self.row_ids, "text_hashes": self.text_hashes})
+        if self.dataset_key:
+            set_latest_snapshot(self.save_dir, self.dataset_key, snapshot_dir)
+        return snapshot_dir
+
+    def _set_rows(self, data: pd.DataFrame, row_ids: np.ndarray = None, text_hashes: np.ndarray = None):
+        """
+        Installs ``data`` as the engine's rows: moves it into a columnar ``MetadataStore``,
+        replaces it with an Arrow-backed view of the store (so the rows are held only once)
+        and maps the rows to their vector ids.
+
+        Args:
+            data (pd.DataFrame): The rows, including ``combined_text``.
+            row_ids (np.ndarray, optional): The vector id of each row. Defaults to the row position.
+            text_hashes (np.ndarray, optional): Hashes of ``combined_text``, computed if missing.
+        """
+        self.metadata = MetadataStore.from_pandas(data)
+        self.data = self.metadata.to_pandas()
+        num_rows = len(self.data)
+        self.row_ids = np.arange(num_rows, dtype=np.int64) if row_ids is None else np.asarray(row_ids, np.int64)
+        if text_hashes is None:
+            text_hashes = content_hashes(self.data["combined_text"]) if "combined_text" in self.data.columns \
+                else np.zeros(num_rows, dtype=np.uint64)
+        self.text_hashes = np.asarray(text_hashes, dtype=np.uint64)
+
+        num_ids = max(self.vector_db.current_id, int(self.row_ids.max()) + 1 if num_rows else 0)
+        self._id_to_row = np.full(num_ids, -1, dtype=np.int64)
+        self._id_to_row[self.row_ids] = np.arange(num_rows)
+        self._identity_rows = num_ids == num_rows and np.array_equal(self.row_ids, np.arange(num_rows))
+        self.index_version += 1
+        logging.info(f"Metadata for {len(self.metadata)} records indexed ({self.metadata.nbytes / 2**20:.1f} MiB).")
+
+    def _build_lexical_index(self) -> BM25Index:
+        """
+        Builds the BM25 index from ``combined_text``, e.g. for a snapshot saved without one.
+        """
+        lexical_index = BM25Index()
+        if "combined_text" in self.data.columns:
+            lexical_index.add(self.data["combined_text"].tolist())
+            lexical_index.flush()
+        return lexical_index
 
     def _process_and_store_embeddings(self, textual_columns: list):
         """
@@ -84,78 +438,584 @@ class RagSearchEngine:
             textual_columns (list): The list of columns to combine for text embeddings.
         """
         # Combine textual fields into a single text column
-        self.data["combined_text"] = self.data.apply(lambda row: preprocess_text(row, textual_columns), axis=1)
+        self.data["combined_text"] = self._build_combined_text(self.data, textual_columns)
 
         # Split data into batches
-        batches = [self.data.iloc[i:i + self.batch_size] for i in range(0, len(self.data), self.batch_size)]
-        logging.info(f"Data split into {len(batches)} batches (batch size: {self.batch_size})")
+        texts = self.data["combined_text"]
+        if self.lexical_index is not None:
+            self.lexical_index.add(texts.tolist())
+        logging.info(f"Data split into {-(-len(texts) // self.batch_size)} batches (batch size: {self.batch_size})")
+        metrics.INGEST_TARGET_ROWS.set(len(texts))
+        self._embed_and_store(self._iter_text_batches(texts, row_offset=0))
 
-        for batch_idx, batch in enumerate(batches):
-            try:
-                logging.info(f"Processing batch {batch_idx + 1} with {len(batch)} records...")
+    def _process_and_store_stream(self, chunks, metadata_file: Path) -> list:
+        """
+        Embeds and stores a stream of DataFrame chunks without holding more than
+        one chunk (plus the batches in flight) in memory.
+
+        Args:
+            chunks (iterable): DataFrames to ingest, in order.
+            metadata_file (Path): Arrow IPC file that receives each chunk's rows.
+        Returns:
+            tuple: The textual columns, taken from the first chunk, and the hash of every
+            row's combined text.
+        """
+        state = {"textual_columns": None, "rows": 0, "hashes": []}
+        metrics.INGEST_TARGET_ROWS.set(0)  # Unknown until the stream ends
 
-                # Generate embeddings
-                response = self.embedding_model.embed(texts=batch["combined_text"].tolist())
-                embeddings = response.embeddings
+        def batches():
+            for chunk_idx, chunk in enumerate(chunks):
+                chunk = chunk.reset_index(drop=True)
+                if state["textual_columns"] is None:
+                    state["textual_columns"] = extract_textual_columns(chunk, include=self.text_columns)
+                chunk["combined_text"] = self._build_combined_text(chunk, state["textual_columns"])
+                writer.write(chunk)
+                state["hashes"].append(content_hashes(chunk["combined_text"]))
+                if self.lexical_index is not None:
+                    self.lexical_index.add(chunk["combined_text"].tolist(), first_id=state["rows"])
+                logging.info(f"Streaming chunk {chunk_idx + 1} with {len(chunk)} records...")
+                yield from self._iter_text_batches(chunk["combined_text"], row_offset=state["rows"])
+                state["rows"] += len(chunk)
 
-                # Add embeddings to the batch DataFrame
-                batch["embedding"] = embeddings
+        with MetadataWriter(metadata_file) as writer:
+            self._embed_and_store(batches())
+        logging.info(f"Streaming ingestion stored {state['rows']} records.")
+        text_hashes = np.concatenate(state["hashes"]) if state["hashes"] else np.empty(0, dtype=np.uint64)
+        return state["textual_columns"] or [], text_hashes
 
-                # Insert embeddings and metadata into the vector database
-                metadata_columns = self.data.columns.difference(["embedding"]).tolist()
-                insert_embeddings_to_vector_db(self.vector_db, batch, metadata_columns)
+    def refresh(self, data: pd.DataFrame, textual_columns: list = None) -> Dict[str, int]:
+        """
+        Replaces the engine's rows with a new version of the dataset, re-embedding only rows
+        whose combined text is new or changed. Rows are matched by ``id_column`` (or by
+        position without one); removed rows are deleted from the index.
 
-                logging.info(f"Batch {batch_idx + 1} successfully stored in the vector database.")
-            except Exception as e:
-                logging.error(f"Failed to process batch {batch_idx + 1}: {e}")
+        Args:
+            data (pd.DataFrame): The new version of the data.
+            textual_columns (list): The columns to embed. Defaults to the engine's current ones.
+        Returns:
+            Dict[str, int]: Counts of ``added``, ``updated``, ``deleted`` and ``unchanged`` rows.
+        Raises:
+            ValueError: If the id column is missing, has nulls or has duplicate keys.
+        """
+        self._ensure_writable()
+        textual_columns = textual_columns or self.textual_columns or \
+            extract_textual_columns(data, include=self.text_columns)
+        data = data.reset_index(drop=True)
+        data["combined_text"] = self._build_combined_text(data, textual_columns)
+        new_hashes = content_hashes(data["combined_text"])
+
+        old_keys, new_keys = self._row_keys(self.data), self._row_keys(data)
+        old_positions = old_keys.get_indexer(new_keys)
+        matched = old_positions >= 0
+        unchanged = matched.copy()
+        unchanged[matched] = self.text_hashes[old_positions[matched]] == new_hashes[matched]
+
+        row_ids = np.empty(len(data), dtype=np.int64)
+        row_ids[unchanged] = self.row_ids[old_positions[unchanged]]
+        changed = np.flatnonzero(~unchanged)
+        row_ids[changed] = self._embed_rows(data["combined_text"].iloc[changed])
+        removed = np.setdiff1d(self.row_ids, row_ids[unchanged])
+        self.vector_db.delete(removed)
+        if self.lexical_index is not None:
+            self.lexical_index.delete(removed)
+
+        self.textual_columns = textual_columns
+        self._set_rows(data, row_ids, new_hashes)
+        stats = {"added": int((~matched).sum()), "updated": int((matched & ~unchanged).sum()),
+                 "deleted": int(len(old_keys) - matched.sum()), "unchanged": int(unchanged.sum())}
+        logging.info(f"Refreshed the index: {stats}")
+        return stats
+
+    def upsert(self, rows: pd.DataFrame) -> Dict[str, int]:
+        """
+        Inserts new rows and replaces existing ones with the same key in ``id_column``.
+        Only rows whose combined text changed are embedded.
+
+        Args:
+            rows (pd.DataFrame): The rows to insert or replace.
+        Returns:
+            Dict[str, int]: The counts reported by ``refresh``.
+        Raises:
+            ValueError: If the engine has no ``id_column``.
+        """
+        if not self.id_column:
+            raise ValueError("upsert requires an id_column to match rows.")
+        keep = ~self._row_keys(self.data).isin(self._row_keys(rows))
+        existing = self.data.loc[keep].drop(columns=["combined_text"])
+        return self.refresh(pd.concat([existing, rows.reset_index(drop=True)], ignore_index=True))
+
+    def delete(self, keys: list) -> Dict[str, int]:
+        """
+        Deletes the rows whose ``id_column`` value is in ``keys``.
+
+        Args:
+            keys (list): Primary keys of the rows to delete.
+        Returns:
+            Dict[str, int]: The counts reported by ``refresh``.
+        Raises:
+            ValueError: If the engine has no ``id_column``.
+        """
+        if not self.id_column:
+            raise ValueError("delete requires an id_column to match rows.")
+        keep = ~self._row_keys(self.data).isin(pd.Index(list(keys), dtype=object))
+        return self.refresh(self.data.loc[keep].drop(columns=["combined_text"]))
+
+    def _row_keys(self, data: pd.DataFrame) -> pd.Index:
+        """
+        The primary key of every row: the ``id_column`` values, or the row positions.
+        """
+        if not self.id_column:
+            return pd.Index(np.arange(len(data)), dtype=object)
+        if self.id_column not in data.columns:
+            raise ValueError(f"id column '{self.id_column}' is missing from the data")
+        keys = data[self.id_column]
+        if keys.isna().any():
+            raise ValueError(f"id column '{self.id_column}' contains missing values")
+        keys = pd.Index(keys.astype(object).tolist(), dtype=object)
+        if not keys.is_unique:
+            raise ValueError(f"id column '{self.id_column}' contains duplicate keys")
+        return keys
+
+    def _embed_rows(self, texts: pd.Series) -> np.ndarray:
+        """
+        Embeds texts under freshly allocated vector ids and adds them to the lexical index.
+
+        Returns:
+            np.ndarray: The allocated ids, in the order of ``texts``.
+        """
+        first_id = self.vector_db.current_id
+        if len(texts):
+            if self.lexical_index is not None:
+                self.lexical_index.add(texts.tolist(), first_id=first_id)
+            self._embed_and_store(self._iter_text_batches(texts, row_offset=first_id))
+        return np.arange(first_id, first_id + len(texts), dtype=np.int64)
+
+    def _ensure_writable(self):
+        """
+        Swaps a memory-mapped, read-only index for a writable copy of the same snapshot.
+        """
+        if not self.vector_db.read_only:
+            return
+        if not self.fingerprint:
+            raise RuntimeError("The index is read-only and has no snapshot to reload.")
+        self.vector_db = type(self.vector_db).load(self.save_dir / self.fingerprint, mmap=False)
+        logging.info("Reloaded the index writable for updates.")
+
+    def _build_combined_text(self, data: pd.DataFrame, textual_columns: list) -> pd.Series:
+        """
+        Builds the embedded text for ``data`` with the engine's prefixes and token budget.
+        """
+        return build_combined_text(data, textual_columns,
+                                   prefixes=self.column_prefixes,
+                                   max_tokens=self.max_text_tokens)
+
+    def _iter_text_batches(self, texts: pd.Series, row_offset: int):
+        """
+        Yields ``(first_row, texts)`` pairs of at most ``batch_size`` texts.
+        """
+        for start in range(0, len(texts), self.batch_size):
+            yield row_offset + start, texts.iloc[start:start + self.batch_size].tolist()
+
+    def _embed_and_store(self, batches):
+        """
+        Embeds batches concurrently with an ``EmbeddingPipeline`` and writes them to the
+        index in order. Rate-limited and 5xx requests are retried; any batch that still
+        fails aborts ingestion instead of silently leaving rows out of the index.
+
+        Args:
+            batches (iterable): ``(first_row, texts)`` pairs, where ``first_row`` is the
+                position of the batch's first row in the data.
+        """
+        def store_batch(first_row: int, embeddings: np.ndarray):
+            # ids are the positional rows of the data used to hydrate search hits
+            ids = np.arange(first_row, first_row + len(embeddings), dtype=np.int64)
+            self.vector_db.add_batch(embeddings, ids=ids)
+            metrics.INGESTED_ROWS.inc(len(embeddings))
+            logging.debug(f"Rows {first_row}-{first_row + len(embeddings) - 1} stored in the vector database.")
+
+        pipeline = EmbeddingPipeline(self.embedding_model,
+                                     concurrency=self.embed_concurrency,
+                                     requests_per_second=self.requests_per_second,
+                                     embed_options=self._embed_options(DOCUMENT_INPUT_TYPE))
+        try:
+            pipeline.run(batches, store_batch)
+            # Train on whatever is still buffered if the index needs training
+            self.vector_db.flush()
+            if self.lexical_index is not None:
+                self.lexical_index.flush()
+        except Exception as e:
+            logging.error(f"Failed to embed and store the data: {e}")
+            raise RuntimeError(f"Embedding ingestion failed: {e}") from e
 
-    def search(self, query: str, top_k: int = 5) -> List[Dict]:
+    def search(self, query: str, top_k: int = 5, nprobe: int = None, ef_search: int = None,
+               columns: List[str] = None, filters: Dict = None, mode: str = "vector",
+               fusion: str = "rrf", lexical_weight: float = 0.5) -> List[Dict]:
         """
         Searches the vector database for the top-k most relevant results for a given query.
 
         Args:
             query (str): The search query.
             top_k (int): The number of top results to return.
+            nprobe (int): Inverted lists to visit when the index is IVF-based.
+            ef_search (int): Search queue size when the index is HNSW-based.
+            columns (List[str]): Metadata columns to return. Defaults to every column except 'embedding'.
+            filters (Dict): Only return rows matching these conditions on metadata columns,
+                e.g. ``{"category": "books", "price": {"lt": 20}}`` (see ``MetadataStore.mask``).
+            mode (str): ``"vector"`` (embeddings), ``"lexical"`` (BM25 keywords, no embedding
+                API call) or ``"hybrid"`` (both, fused).
+            fusion (str): How hybrid mode fuses the rankings: ``"rrf"`` (reciprocal rank fusion)
+                or ``"weighted"`` (weighted sum of min-max normalized scores).
+            lexical_weight (float): Weight of the lexical ranking in hybrid mode, between 0 and 1.
 
         Returns:
             List[Dict]: A list of dictionaries containing metadata (excluding embeddings) and similarity scores for each result.
         """
         try:
-            logging.info(f"Processing search query: '{query}'")
+            log_query("Processing search query: '%s'", query)
+            self._check_mode(mode, fusion)
+            metrics.QUERIES.inc(mode=mode)
+            text = preprocess_search_text(query)
+            cache, version = self.result_cache, self.index_version
+            if cache is not None:
+                params = _search_params(top_k, nprobe, ef_search, columns, filters, mode, fusion, lexical_weight)
+                key, group = result_cache_key(text, params), result_cache_key("", params)
+                cached = self._cached_results(key, version)
+                if cached is not None:
+                    return cached
+            query_embedding = None
+            with span("filter"):
+                subset = self._filter_mask(filters)
 
-            # Generate the query embedding
-            query_embedding = self.embedding_model.embed(texts=[preprocess_search_text(query)]).embeddings[0]
+            if mode == "lexical":
+                with span("lexical"):
+                    results = self._lexical_search(text, top_k, subset)
+            else:
+                # Generate the query embedding
+                with span("embed"):
+                    query_embedding = self.embedding_model.embed(
+                        texts=[text], **self._embed_options(QUERY_INPUT_TYPE)).embeddings[0]
+                if cache is not None and mode == "vector":
+                    cached = self._similar_results(group, query_embedding, version)
+                    if cached is not None:
+                        return cached
 
-            # Search the vector database
-            results = search_vector_db(self.vector_db, query_embedding, top_k=top_k)
-            logging.info(f"Search completed. Found {len(results)} results.")
+                # Search the vector database
+                depth = top_k * HYBRID_CANDIDATE_FACTOR if mode == "hybrid" else top_k
+                with span("ann"):
+                    results = search_vector_db(self.vector_db, query_embedding, top_k=depth,
+                                               nprobe=nprobe, ef_search=ef_search, subset=subset)
+                if mode == "hybrid":
+                    with span("lexical"):
+                        lexical_results = self._lexical_search(text, depth, subset)
+                    with span("fusion"):
+                        results = self._fuse(results, lexical_results, top_k, fusion, lexical_weight)
 
-            # Map indices to metadata and include similarity scores, excluding 'embedding'
-            enriched_results = []
-            for result in results:
-                index = result["index"]
-                metadata = self.data.iloc[index].to_dict()
+            with span("hydrate"):
+                enriched_results = self._hydrate([results], columns)[0]
+            log_query("Found %d results for the query.", len(enriched_results))
+            if cache is not None:
+                self._store_results(key, enriched_results, version, group,
+                                    query_embedding if mode == "vector" else None)
+            return enriched_results
+        except Exception as e:
+            logging.error(f"Search failed: {e}")
+            raise
 
-                # Remove the embedding from metadata if it exists
-                if "embedding" in metadata:
-                    del metadata["embedding"]
+    def search_many(self, queries: List[str], top_k: int = 5, nprobe: int = None,
+                    ef_search: int = None, columns: List[str] = None, filters: Dict = None,
+                    mode: str = "vector", fusion: str = "rrf", lexical_weight: float = 0.5) -> List[List[Dict]]:
+        """
+        Searches for many queries at once: the queries are embedded in as few API calls as
+        possible (``batch_size`` texts per call, issued concurrently) and searched with a
+        single FAISS call over the stacked query matrix.
 
-                enriched_results.append({
-                    "metadata": metadata
-                })
+        Args:
+            queries (List[str]): The search queries.
+            top_k (int): The number of top results to return per query.
+            nprobe (int): Inverted lists to visit when the index is IVF-based.
+            ef_search (int): Search queue size when the index is HNSW-based.
+            columns (List[str]): Metadata columns to return. Defaults to every column except 'embedding'.
+            filters (Dict): Metadata conditions applied to every query (see ``search``).
+            mode (str): ``"vector"``, ``"lexical"`` or ``"hybrid"`` (see ``search``).
+            fusion (str): ``"rrf"`` or ``"weighted"`` fusion for hybrid mode.
+            lexical_weight (float): Weight of the lexical ranking in hybrid mode.
 
-            logging.info(f"Found {len(enriched_results)} results for the query.")
-            return enriched_results
+        Returns:
+            List[List[Dict]]: The results of each query, in the same format as ``search``.
+        """
+        try:
+            if not queries:
+                return []
+            log_query("Processing %d search queries in one batch", len(queries))
+            self._check_mode(mode, fusion)
+            metrics.QUERIES.inc(len(queries), mode=mode)
+            texts = pd.Series([preprocess_search_text(query) for query in queries])
+            cache, version = self.result_cache, self.index_version
+            batch, keys, group = [None] * len(texts), None, None
+            if cache is not None:
+                params = _search_params(top_k, nprobe, ef_search, columns, filters, mode, fusion, lexical_weight)
+                keys, group = [result_cache_key(text, params) for text in texts], result_cache_key("", params)
+                batch = [self._cached_results(key, version) for key in keys]
+            # Positions of the queries that still need searching
+            pending = [position for position, results in enumerate(batch) if results is None]
+            if not pending:
+                return batch
+            texts = texts.iloc[pending].reset_index(drop=True)
+            query_embeddings = None
+            with span("filter"):
+                subset = self._filter_mask(filters)
+
+            if mode == "lexical":
+                with span("lexical"):
+                    batch_results = [self._lexical_search(text, top_k, subset) for text in texts]
+                with span("hydrate"):
+                    return self._fill_batch(batch, pending, self._hydrate(batch_results, columns), keys, version)
+
+            with span("embed"):
+                if len(texts) <= self.batch_size:
+                    query_embeddings = np.asarray(self.embedding_model.embed(
+                        texts=texts.tolist(), **self._embed_options(QUERY_INPUT_TYPE)).embeddings, dtype=np.float32)
+                else:
+                    embedded = []
+                    pipeline = EmbeddingPipeline(self.embedding_model, concurrency=self.embed_concurrency,
+                                                 embed_options=self._embed_options(QUERY_INPUT_TYPE))
+                    pipeline.run(self._iter_text_batches(texts, row_offset=0),
+                                 lambda first_row, embeddings: embedded.append(embeddings))
+                    query_embeddings = np.concatenate(embedded)
+            if cache is not None and mode == "vector":
+                similar = [self._similar_results(group, embedding, version) for embedding in query_embeddings]
+                unanswered = [j for j, results in enumerate(similar) if results is None]
+                for position, results in zip(pending, similar):
+                    batch[position] = results
+                if not unanswered:
+                    return batch
+                pending = [pending[j] for j in unanswered]
+                texts = texts.iloc[unanswered].reset_index(drop=True)
+                query_embeddings = query_embeddings[unanswered]
+
+            depth = top_k * HYBRID_CANDIDATE_FACTOR if mode == "hybrid" else top_k
+            with span("ann"):
+                batch_results = self.vector_db.search_batch(query_embeddings, top_k=depth,
+                                                            nprobe=nprobe, ef_search=ef_search,
+                                                            subset=subset)
+            if mode == "hybrid":
+                with span("lexical"):
+                    lexical_results = [self._lexical_search(text, depth, subset) for text in texts]
+                with span("fusion"):
+                    batch_results = [self._fuse(results, lexical, top_k, fusion, lexical_weight)
+                                     for results, lexical in zip(batch_results, lexical_results)]
+            with span("hydrate"):
+                hydrated = self._hydrate(batch_results, columns)
+            if cache is None:
+                return hydrated
+            return self._fill_batch(batch, pending, hydrated, keys, version, group,
+                                    query_embeddings if mode == "vector" else None)
         except Exception as e:
-            logging.error(f"Search failed: {e}")
+            logging.error(f"Batch search failed: {e}")
             raise
 
-    def run(self):
+    def answer(self, query: str, top_k: int = 5, max_context_tokens: int = DEFAULT_CONTEXT_TOKENS,
+               model: str = None, preamble: str = DEFAULT_PREAMBLE, temperature: float = None,
+               max_tokens: int = None, results: List[Dict] = None, **search_params):
         """
-        Launches an interactive search interface where users can input queries and see results.
+        Answers a question from the indexed rows with ``llm_client``, streaming the answer.
+
+        The top-k hits are retrieved, deduplicated and packed into a context of at most
+        ``max_context_tokens`` (see ``generation.pack_context``). The streaming chat call is
+        started on a background thread when the first event is requested, so the answer is
+        already being generated while the caller sends the sources to its client. Closing the
+        returned iterator cancels the generation.
+
+        Args:
+            query (str): The question.
+            top_k (int): The number of hits to retrieve.
+            max_context_tokens (int): Token budget of the documents passed to the LLM.
+            model (str): The Cohere chat model. Defaults to the client's default model.
+            preamble (str): The system instructions.
+            temperature (float): Sampling temperature.
+            max_tokens (int): Maximum number of tokens to generate.
+            results (List[Dict]): Hits already retrieved for ``query``, e.g. through the request
+                coalescer. Defaults to searching with ``search_params``.
+            **search_params: Arguments of ``search``, e.g. ``filters`` or ``mode``.
+
+        Returns:
+            Iterator[Dict]: ``{"event": "sources", "data": [...]}`` with the packed hits, then
+            ``{"event": "token", "data": text}`` for each piece of the answer, then
+            ``{"event": "done", "data": {"finish_reason": ..., "time_to_first_token": ...}}``.
         """
-        logging.info("Launching browser-based search interface...")
+        if self.llm_client is None:
+            raise ValueError("An llm_client is required to generate answers.")
+        started = time.perf_counter()
+        if results is None:
+            with span("retrieve"):
+                if self.vector_db is None:
+                    results = _chromadb_hits(self.chromadb_search(query, top_k=top_k))
+                else:
+                    results = self.search(query, top_k=top_k, **search_params)
+        with span("pack"):
+            documents = pack_context(results, max_tokens=max_context_tokens)
+        sources = [dict(results[int(document["id"])], id=document["id"]) for document in documents]
+
+        def events():
+            first_token = None
+            # Started with the first event, so an answer that is never consumed never calls the LLM
+            tokens = prefetch(stream_chat(self.llm_client, query, documents, model=model, preamble=preamble,
+                                          temperature=temperature, max_tokens=max_tokens))
+            try:
+                yield {"event": "sources", "data": sources}
+                for kind, value in tokens:
+                    if kind == "token":
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                            metrics.ANSWER_FIRST_TOKEN_SECONDS.observe(first_token)
+                        yield {"event": "token", "data": value}
+                    else:
+                        yield {"event": "done", "data": {"finish_reason": value,
+                                                         "time_to_first_token": first_token}}
+            finally:
+                # Stops the generation when the client disconnects mid-answer
+                tokens.cancel()
+
+        return events()
+
+    def _embed_options(self, input_type: str) -> dict:
+        """
+        The arguments of every embed call besides the texts: the input type and, when set, the model.
+        """
+        options = {"input_type": input_type}
+        if self.embedding_model_name:
+            options["model"] = self.embedding_model_name
+        return options
+
+    def _cached_results(self, key: str, version: int):
+        """
+        Returns a copy of the exact-tier results for a query key, or None on a miss.
+        """
+        cached = self.result_cache.get(key, version)
+        if cached is None:
+            return None
+        metrics.RESULT_CACHE_LOOKUPS.inc(result="exact")
+        return copy.deepcopy(cached)
+
+    def _similar_results(self, group: str, embedding, version: int):
+        """
+        Returns a copy of the semantic-tier results for a query embedding, or None on a miss.
+        """
+        cached = self.result_cache.get_similar(group, embedding, version)
+        if cached is None:
+            return None
+        metrics.RESULT_CACHE_LOOKUPS.inc(result="semantic")
+        return copy.deepcopy(cached)
+
+    def _store_results(self, key: str, results, version: int, group: str = None, embedding=None):
+        """
+        Records a cache miss and caches a copy of the results computed for it.
+        """
+        self.result_cache.record_miss()
+        metrics.RESULT_CACHE_LOOKUPS.inc(result="miss")
+        self.result_cache.put(key, copy.deepcopy(results), version, group=group, embedding=embedding)
+
+    def _fill_batch(self, batch: list, pending: list, results: list, keys: list, version: int,
+                    group: str = None, embeddings=None) -> list:
+        """
+        Puts freshly computed results into their positions of a partially cached batch and caches them.
+        """
+        for j, position in enumerate(pending):
+            batch[position] = results[j]
+            if self.result_cache is not None:
+                self._store_results(keys[position], results[j], version, group,
+                                    embeddings[j] if embeddings is not None else None)
+        return batch
+
+    def _check_mode(self, mode: str, fusion: str):
+        """
+        Validates the search mode and fusion method.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}'; expected one of {SEARCH_MODES}")
+        if fusion not in FUSION_METHODS:
+            raise ValueError(f"Unknown fusion method '{fusion}'; expected one of {FUSION_METHODS}")
+        if mode != "vector" and self.lexical_index is None:
+            raise ValueError(f"Search mode '{mode}' requires the lexical index (lexical=True).")
+
+    def _lexical_search(self, text: str, top_k: int, subset=None) -> List[Dict]:
+        """
+        Runs a BM25 query and returns hits in the vector database's result format.
+        """
+        if subset is None and not self._identity_rows:
+            # Also masks rows removed before the lexical index tracked deletions
+            subset = self._live_ids()
+        return [{"index": doc_id, "similarity": score}
+                for doc_id, score in self.lexical_index.search(text, top_k=top_k, subset=subset)]
+
+    @staticmethod
+    def _fuse(vector_results: List[Dict], lexical_results: List[Dict], top_k: int,
+              fusion: str, lexical_weight: float) -> List[Dict]:
+        """
+        Fuses a vector and a lexical ranking; ``similarity`` becomes the fused score.
+        """
+        rankings = [[(hit["index"], hit["similarity"]) for hit in vector_results],
+                    [(hit["index"], hit["similarity"]) for hit in lexical_results]]
+        weights = [1.0 - lexical_weight, lexical_weight]
+        if fusion == "rrf":
+            fused = reciprocal_rank_fusion(rankings, top_k, weights=weights)
+        else:
+            fused = weighted_fusion(rankings, top_k, weights=weights)
+        return [{"index": doc_id, "similarity": score} for doc_id, score in fused]
+
+    def _filter_mask(self, filters: Dict = None):
+        """
+        Evaluates metadata filters into a mask over the vector ids, or None when there are none.
+        """
+        if not filters:
+            return None
+        row_mask = self.metadata.mask(filters)
+        if self._identity_rows:
+            return row_mask
+        id_mask = np.zeros(len(self._id_to_row), dtype=bool)
+        id_mask[self.row_ids[row_mask]] = True
+        return id_mask
+
+    def _live_ids(self) -> np.ndarray:
+        """
+        A mask over the vector ids that is True for ids currently backing a row.
+        """
+        return self._id_to_row >= 0
 
+    def _hydrate(self, batch_results: List[List[Dict]], columns: List[str] = None) -> List[List[Dict]]:
+        """
+        Maps the hits of one or more queries to their rows with a single columnar lookup.
+        Unless ``columns`` is given, every column except 'embedding' is returned.
+        """
+        ids = np.array([result["index"] for results in batch_results for result in results], dtype=np.int64)
+        rows = ids if self._identity_rows else self._id_to_row[ids]
+        metadata = iter(self.metadata.take(rows, columns=columns))
+        return [[{"metadata": next(metadata), "similarity": result["similarity"]} for result in results]
+                for results in batch_results]
+
+    def create_app(self, coalesce: bool = True, max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                   request_timeout: float = None, max_pending: int = 1_024) -> "Flask":
+        """
+        Builds the Flask app serving the web interface and the JSON search API.
+
+        Args:
+            coalesce (bool): Route concurrent ``/query`` requests through a ``RequestCoalescer``
+                so they share embed calls and FAISS searches.
+            max_batch_size (int): Maximum number of queries coalesced into one batch.
+            max_wait_ms (float): Longest time a query waits for others to join its batch.
+            request_timeout (float): Seconds a coalesced query may wait for its results
+                before the request fails with 504.
+            max_pending (int): Coalesced queries that may wait at once; further ``/query`` and
+                ``/answer`` requests fail fast with 503.
+
+        Returns:
+            Flask: The application, ready to be served or used with ``app.test_client()``.
+        """
+        from flask import Flask, Response, g, request, jsonify, render_template
+
+        if coalesce and self.coalescer is None:
+            self.coalescer = RequestCoalescer(self.search_many, max_batch_size=max_batch_size,
+                                              max_wait_ms=max_wait_ms, max_pending=max_pending)
         # Initialize Flask app
         app = Flask(__name__, template_folder="templates")
 
@@ -171,9 +1031,16 @@ class RagSearchEngine:
             return jsonify({
                 "file_name": self.file_name,
                 "num_records": num_records,
-                "columns": columns
+                "columns": columns,
+                "memory_bytes": self.memory_bytes()
             })
 
+        def request_search_params(request_data: dict) -> dict:
+            return {"nprobe": request_data.get('nprobe'), "ef_search": request_data.get('ef_search'),
+                    "columns": request_data.get('columns'), "filters": request_data.get('filters'),
+                    "mode": request_data.get('mode', 'vector'), "fusion": request_data.get('fusion', 'rrf'),
+                    "lexical_weight": float(request_data.get('lexical_weight', 0.5))}
+
         # Route for handling search queries
         @app.route('/query', methods=['POST'])
         def query():
@@ -183,8 +1050,202 @@ class RagSearchEngine:
                 return jsonify({"error": "Query parameter is required"}), 400  # Return error if query is missing
 
             top_k = int(request_data.get('top_k', 5))
-            results = self.search(query, top_k=top_k)
-            return jsonify({"results": [res['metadata'] for res in results]})
+            search_params = request_search_params(request_data)
+            if coalesce:
+                try:
+                    results = self.coalescer.search(query, top_k=top_k, timeout=request_timeout, **search_params)
+                except FutureTimeoutError:
+                    return jsonify({"error": "Search timed out"}), 504
+                except CoalescerFullError:
+                    return jsonify({"error": "Too many pending searches"}), 503, {"Retry-After": "1"}
+            else:
+                results = self.search(query, top_k=top_k, **search_params)
+            with span("serialize"):
+                return jsonify({"results": [res['metadata'] for res in results]})
+
+        # Route for handling many search queries in one request
+        @app.route('/query/batch', methods=['POST'])
+        def query_batch():
+            request_data = request.get_json()
+            queries = request_data.get('queries')
+            if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q for q in queries):
+                return jsonify({"error": "queries must be a non-empty list of strings"}), 400
+
+            top_k = int(request_data.get('top_k', 5))
+            batch_results = self.search_many(queries, top_k=top_k,
+                                             nprobe=request_data.get('nprobe'),
+                                             ef_search=request_data.get('ef_search'),
+                                             columns=request_data.get('columns'),
+                                             filters=request_data.get('filters'),
+                                             mode=request_data.get('mode', 'vector'),
+                                             fusion=request_data.get('fusion', 'rrf'),
+                                             lexical_weight=float(request_data.get('lexical_weight', 0.5)))
+            with span("serialize"):
+                return jsonify({"results": [[res['metadata'] for res in results] for results in batch_results]})
+
+        # Route streaming a generated answer as server-sent events
+        @app.route('/answer', methods=['POST'])
+        def answer():
+            request_data = request.get_json()
+            query = request_data.get('query')
+            if not query:
+                return jsonify({"error": "Query parameter is required"}), 400
+
+            top_k = int(request_data.get('top_k', 5))
+            search_params = request_search_params(request_data)
+            results = None
+            if coalesce and self.vector_db is not None:
+                # Retrieval shares batches with concurrent /query requests
+                try:
+                    results = self.coalescer.search(query, top_k=top_k, timeout=request_timeout, **search_params)
+                except FutureTimeoutError:
+                    return jsonify({"error": "Search timed out"}), 504
+                except CoalescerFullError:
+                    return jsonify({"error": "Too many pending searches"}), 503, {"Retry-After": "1"}
+            events = self.answer(query, top_k=top_k, results=results,
+                                 max_context_tokens=int(request_data.get('max_context_tokens',
+                                                                         DEFAULT_CONTEXT_TOKENS)),
+                                 model=request_data.get('model'), temperature=request_data.get('temperature'),
+                                 max_tokens=request_data.get('max_tokens'), **search_params)
+
+            def stream():
+                try:
+                    for event in events:
+                        yield sse_event(event["event"], event["data"])
+                except Exception as e:
+                    # The status line is already sent; report the failure in the stream
+                    logging.error(f"Answer generation failed: {e}")
+                    yield sse_event("error", {"error": str(e)})
+                finally:
+                    events.close()
+
+            return Response(stream(), mimetype="text/event-stream",
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+        # Prometheus scrape endpoint
+        @app.route('/metrics', methods=['GET'])
+        def prometheus_metrics():
+            self.update_metrics()
+            return Response(metrics.REGISTRY.render(), mimetype=metrics.CONTENT_TYPE)
+
+        @app.before_request
+        def start_timer():
+            g.request_started = time.perf_counter()
+
+        @app.after_request
+        def record_latency(response):
+            if request.endpoint in ("query", "query_batch"):
+                metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, route=request.path)
+            return response
+
+        return app
+
+    def update_metrics(self):
+        """
+        Refreshes the gauges describing the index and the embedding cache.
+        """
+        metrics.INDEX_ROWS.set(len(self.data) if isinstance(self.data, pd.DataFrame) else 0)
+        if self.vector_db is not None:
+            metrics.INDEX_VECTORS.set(self.vector_db.ntotal)
+        if self.embedding_cache is not None:
+            metrics.EMBEDDING_CACHE_LOOKUPS.set(self.embedding_cache.hits, result="hit")
+            metrics.EMBEDDING_CACHE_LOOKUPS.set(self.embedding_cache.misses, result="miss")
+            metrics.EMBEDDING_CACHE_HIT_RATIO.set(self.embedding_cache.hit_ratio)
+        if self.result_cache is not None:
+            metrics.RESULT_CACHE_HIT_RATIO.set(self.result_cache.hit_ratio)
+
+    def run(self,
+            host: str = "0.0.0.0",
+            port: int = 8080,
+            coalesce: bool = True,
+            max_batch_size: int = 32,
+            max_wait_ms: float = 5.0,
+            request_timeout: float = 30.0,
+            graceful_timeout: float = 30.0,
+            max_pending: int = 1_024) -> "SearchServer":
+        """
+        Launches an interactive search interface where users can input queries and see results.
+
+        The server runs on a background thread; call ``stop()`` on the returned server to
+        shut it down gracefully. For multi-process serving use ``SearchServer`` with
+        ``engine_loader`` and ``workers``.
+
+        Args:
+            host (str): Interface to bind.
+            port (int): Port to bind.
+            coalesce (bool): Micro-batch concurrent ``/query`` requests (see ``create_app``).
+            max_batch_size (int): Maximum number of queries coalesced into one batch.
+            max_wait_ms (float): Longest time a query waits for others to join its batch.
+            request_timeout (float): Seconds before a search request fails with 504.
+            graceful_timeout (float): Seconds ``stop()`` waits for in-flight requests.
+            max_pending (int): Coalesced queries that may wait at once before requests fail with 503.
+
+        Returns:
+            SearchServer: The running server.
+        """
+        from .server import SearchServer
+
+        logging.info("Launching browser-based search interface...")
+        server = SearchServer(engine=self, host=host, port=port,
+                              request_timeout=request_timeout, graceful_timeout=graceful_timeout,
+                              coalesce=coalesce, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                              max_pending=max_pending)
+        return server.start()
+
+
+def _search_params(top_k, nprobe, ef_search, columns, filters, mode, fusion, lexical_weight) -> dict:
+    """
+    The search arguments besides the query text, as part of a result cache key.
+    """
+    params = {"top_k": top_k, "nprobe": nprobe, "ef_search": ef_search, "columns": columns,
+              "filters": filters, "mode": mode}
+    if mode == "hybrid":
+        params.update(fusion=fusion, lexical_weight=lexical_weight)
+    return params
+
+
+# Keys of a ChromaDB query result that hold one list per query
+_CHROMADB_PER_QUERY_KEYS = ("ids", "embeddings", "documents", "uris", "data", "metadatas", "distances")
+
+
+def _chromadb_hits(result: dict) -> List[Dict]:
+    """
+    Converts a single-query ChromaDB result to the hit format of ``search``, with each
+    document's text under the ``document`` metadata key.
+    """
+    hits = []
+    for position, document in enumerate(result["documents"][0]):
+        metadata = dict((result.get("metadatas") or [[None]])[0][position] or {}, document=document)
+        distances = (result.get("distances") or [None])[0]
+        hits.append({"metadata": metadata, "similarity": -distances[position] if distances else None})
+    return hits
+
+
+def _split_chromadb_result(result: dict, count: int) -> List[dict]:
+    """
+    Splits a ChromaDB batch query result into one single-query result per query.
+    """
+    return [{key: [value[position]] if key in _CHROMADB_PER_QUERY_KEYS and value is not None else value
+             for key, value in result.items()}
+            for position in range(count)]
+
+
+def _empty_chromadb_result() -> dict:
+    """
+    A ChromaDB query result for zero queries.
+    """
+    return {"ids": [], "embeddings": None, "documents": [], "uris": None, "data": None, "metadatas": [],
+            "distances": [], "included": ["metadatas", "documents", "distances"]}
+
 
-        # Run the Flask app on a separate thread
-        threading.Thread(target=app.run, kwargs={"host": "0.0.0.0", "port": 8080, "use_reloader": False}).start()
+def _merge_chromadb_results(parts: List[dict]) -> dict:
+    """
+    Joins single-query ChromaDB results back into one batch result.
+    """
+    if not parts:
+        return _empty_chromadb_result()
+    merged = dict(parts[0])
+    for key in _CHROMADB_PER_QUERY_KEYS:
+        if merged.get(key) is not None:
+            merged[key] = [value for part in parts for value in (part.get(key) or [None])]
+    return merged
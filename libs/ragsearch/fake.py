@@ -0,0 +1,116 @@
+"""
+Deterministic, offline stand-ins for the Cohere client.
+
+``FakeEmbeddingClient`` returns seeded random vectors derived from each
+text, so the same text always maps to the same vector, and can simulate
+network latency and rate limiting. ``FakeChatClient`` adds a streaming
+``chat_stream`` that answers by naming the documents it was given. They are
+meant for tests, benchmarks and local development without an API key.
+"""
+import hashlib
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+
+class FakeRateLimitError(Exception):
+    """
+    Mimics the Cohere client's HTTP 429 error.
+    """
+    status_code = 429
+
+
+class FakeEmbeddingClient:
+    """
+    Embedding client producing deterministic unit vectors without network access.
+    """
+    def __init__(self, embedding_dim: int = 1024, latency: float = 0.0, seed: int = 0, fail_first: int = 0):
+        """
+        Args:
+            embedding_dim (int): Dimension of the returned embeddings.
+            latency (float): Seconds each ``embed`` call sleeps, to simulate a round-trip.
+            seed (int): Mixed into every text's vector; different seeds give different spaces.
+            fail_first (int): Number of initial calls that raise ``FakeRateLimitError``.
+        """
+        self.embedding_dim = embedding_dim
+        self.latency = latency
+        self.seed = seed
+        self.fail_first = fail_first
+        self.calls = 0
+        self.texts_embedded = 0
+        self._lock = threading.Lock()
+
+    def vector_for(self, text: str) -> np.ndarray:
+        """
+        Return the deterministic unit vector for one text.
+        """
+        digest = hashlib.blake2b(f"{self.seed}:{text}".encode("utf-8"), digest_size=8).digest()
+        rng = np.random.default_rng(int.from_bytes(digest, "little"))
+        vector = rng.standard_normal(self.embedding_dim).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def embed(self, texts: list, **kwargs):
+        """
+        Embed texts the way ``cohere.Client.embed`` does.
+
+        Args:
+            texts (list): The texts to embed.
+            **kwargs: Accepted for signature compatibility and ignored.
+        Returns:
+            SimpleNamespace: A response with an ``embeddings`` matrix.
+        Raises:
+            FakeRateLimitError: For the first ``fail_first`` calls.
+        """
+        with self._lock:
+            self.calls += 1
+            should_fail = self.calls <= self.fail_first
+        if self.latency:
+            time.sleep(self.latency)
+        if should_fail:
+            raise FakeRateLimitError("simulated 429 Too Many Requests")
+        with self._lock:
+            self.texts_embedded += len(texts)
+        embeddings = np.stack([self.vector_for(text) for text in texts]) if texts \
+            else np.empty((0, self.embedding_dim), dtype=np.float32)
+        return SimpleNamespace(embeddings=embeddings)
+
+
+class FakeChatClient(FakeEmbeddingClient):
+    """
+    Embedding client that also streams chat answers without network access.
+    """
+    def __init__(self, embedding_dim: int = 1024, token_latency: float = 0.0, **kwargs):
+        """
+        Args:
+            embedding_dim (int): Dimension of the returned embeddings.
+            token_latency (float): Seconds to wait before each streamed token.
+            **kwargs: Other ``FakeEmbeddingClient`` arguments.
+        """
+        super().__init__(embedding_dim=embedding_dim, **kwargs)
+        self.token_latency = token_latency
+        self.chat_requests = []
+
+    def chat_stream(self, message: str, documents: list = None, **kwargs):
+        """
+        Stream an answer the way ``cohere.Client.chat_stream`` does.
+
+        The answer repeats the question and lists the ids of the documents it was given.
+
+        Args:
+            message (str): The user's question.
+            documents (list): The grounding documents, ``{"id": ..., "text": ...}``.
+            **kwargs: Recorded with the request and otherwise ignored.
+        Yields:
+            SimpleNamespace: ``stream-start``, one ``text-generation`` event per word, then ``stream-end``.
+        """
+        documents = list(documents or [])
+        self.chat_requests.append(dict(kwargs, message=message, documents=documents))
+        yield SimpleNamespace(event_type="stream-start")
+        words = f"Answer to {message} from documents {' '.join(doc['id'] for doc in documents)}".split()
+        for i, word in enumerate(words):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            yield SimpleNamespace(event_type="text-generation", text=word if i == 0 else " " + word)
+        yield SimpleNamespace(event_type="stream-end", finish_reason="COMPLETE")
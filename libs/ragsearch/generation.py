@@ -0,0 +1,220 @@
+"""
+Retrieval-augmented answer generation.
+
+``pack_context`` turns ranked search hits into the documents handed to the
+LLM: duplicates are dropped and hits are added in rank order until a token
+budget is spent, so the prompt never overflows the model's context and the
+best evidence always makes it in. ``stream_chat`` calls Cohere chat in
+streaming mode and yields the answer text as it is generated, and
+``prefetch`` runs such a stream on a background thread so the request to the
+LLM is already in flight while the caller is still sending the retrieved
+sources to its client, and cancels it when the client goes away.
+``sse_event`` formats an event for a ``text/event-stream`` response.
+"""
+import json
+import logging
+import math
+import queue
+import threading
+from typing import Dict, List
+
+from .utils import CHARS_PER_TOKEN
+
+
+DEFAULT_CONTEXT_TOKENS = 3_000
+DEFAULT_PREAMBLE = ("Answer the question using only the provided documents. "
+                    "If they do not contain the answer, say that you do not know.")
+# A hit truncated to fewer tokens than this is left out instead
+MIN_DOCUMENT_TOKENS = 32
+
+_DONE = object()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens of a text (``CHARS_PER_TOKEN`` characters per token).
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def document_text(metadata: Dict, skip: tuple = ("combined_text",)) -> str:
+    """
+    Render a hit's metadata as ``column: value`` lines, leaving out missing values.
+
+    Args:
+        metadata (Dict): The hit's metadata, as returned by ``RagSearchEngine.search``.
+        skip (tuple): Columns not shown to the LLM. ``combined_text`` repeats the other columns.
+    Returns:
+        str: The document text.
+    """
+    lines = []
+    for column, value in metadata.items():
+        if column in skip or value is None or (isinstance(value, float) and math.isnan(value)):
+            continue
+        lines.append(f"{column}: {value}")
+    return "\n".join(lines)
+
+
+def pack_context(results: List[Dict], max_tokens: int = DEFAULT_CONTEXT_TOKENS) -> List[Dict]:
+    """
+    Select the documents passed to the LLM from ranked search results.
+
+    Hits are taken in rank order; a hit whose text duplicates an earlier one is
+    skipped, and packing stops once ``max_tokens`` is reached. The hit that
+    crosses the budget is truncated to fit, unless less than
+    ``MIN_DOCUMENT_TOKENS`` would remain.
+
+    Args:
+        results (List[Dict]): Search results, best first, each with a ``metadata`` dict.
+        max_tokens (int): Token budget for all documents together.
+    Returns:
+        List[Dict]: Cohere chat documents, ``{"id": ..., "text": ...}``, where ``id`` is
+        the hit's rank in ``results``.
+    """
+    documents, seen, budget = [], set(), max_tokens
+    for rank, result in enumerate(results):
+        text = document_text(result["metadata"])
+        key = " ".join(text.lower().split())
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        tokens = estimate_tokens(text)
+        if tokens > budget:
+            if budget < MIN_DOCUMENT_TOKENS:
+                break
+            text, tokens = text[:budget * CHARS_PER_TOKEN], budget
+        documents.append({"id": str(rank), "text": text})
+        budget -= tokens
+        if budget <= 0:
+            break
+    return documents
+
+
+def stream_chat(llm_client, message: str, documents: List[Dict], model: str = None,
+                preamble: str = DEFAULT_PREAMBLE, **chat_options):
+    """
+    Generate an answer with Cohere chat in streaming mode.
+
+    Args:
+        llm_client (CohereClient): A client with ``chat_stream``.
+        message (str): The user's question.
+        documents (List[Dict]): The grounding documents (see ``pack_context``).
+        model (str, optional): The chat model. Defaults to the client's default model.
+        preamble (str): The system instructions.
+        **chat_options: Other ``chat_stream`` arguments, e.g. ``temperature`` or ``max_tokens``.
+            Options set to None are not sent.
+    Yields:
+        tuple: ``("token", text)`` for each piece of generated text, then
+        ``("end", finish_reason)``.
+    """
+    options = {key: value for key, value in dict(chat_options, model=model, preamble=preamble).items()
+               if value is not None}
+    finish_reason = None
+    stream = llm_client.chat_stream(message=message, documents=documents, **options)
+    try:
+        for event in stream:
+            event_type = getattr(event, "event_type", None)
+            if event_type == "text-generation":
+                yield "token", event.text
+            elif event_type == "stream-end":
+                finish_reason = getattr(event, "finish_reason", None)
+    finally:
+        # Closes the HTTP stream when generation is abandoned
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+    yield "end", finish_reason
+
+
+def prefetch(iterable, max_pending: int = 1_024) -> "Prefetch":
+    """
+    Consume an iterable on a background thread, starting immediately.
+
+    Args:
+        iterable: The items to produce, e.g. a ``stream_chat`` generator.
+        max_pending (int): Maximum number of buffered items.
+    Returns:
+        Prefetch: An iterator over the items of ``iterable``.
+    """
+    return Prefetch(iterable, max_pending=max_pending)
+
+
+class Prefetch:
+    """
+    Iterator over the items of an iterable that a background thread consumes ahead of the caller.
+
+    Items produced before the caller asks for them are buffered, up to
+    ``max_pending``; an exception raised by the iterable is re-raised to the
+    caller. ``cancel`` (or ``close``) stops the thread at its next item and
+    closes the iterable, whether or not iteration has started, so an
+    abandoned stream does not keep reading from the LLM.
+    """
+    def __init__(self, iterable, max_pending: int = 1_024):
+        self._iterable = iterable
+        self._items = queue.Queue(maxsize=max_pending)
+        self._stopped = threading.Event()
+        self._finished = False
+        self._thread = threading.Thread(target=self._produce, name="ragsearch-prefetch", daemon=True)
+        self._thread.start()
+
+    def _put(self, entry) -> bool:
+        # Gives up once cancelled, so a full queue cannot block the thread forever
+        while not self._stopped.is_set():
+            try:
+                self._items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self):
+        try:
+            for item in self._iterable:
+                if not self._put((item, None)):
+                    return
+            self._put((_DONE, None))
+        except Exception as e:
+            logging.error(f"Background stream failed: {e}")
+            self._put((_DONE, e))
+        finally:
+            # Releases the LLM connection when the consumer went away mid-stream
+            close = getattr(self._iterable, "close", None)
+            if close is not None:
+                close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._finished:
+            raise StopIteration
+        item, error = self._items.get()
+        if item is _DONE:
+            self._finished = True
+            self._stopped.set()
+            if error is not None:
+                raise error
+            raise StopIteration
+        return item
+
+    def cancel(self):
+        """
+        Stops the background thread at its next item. Safe to call more than once.
+        """
+        self._finished = True
+        self._stopped.set()
+
+    close = cancel
+
+
+def sse_event(event: str, data) -> str:
+    """
+    Format one server-sent event with a JSON payload.
+
+    Args:
+        event (str): The event name, e.g. ``"token"``.
+        data: A JSON-serializable payload.
+    Returns:
+        str: The event, terminated by a blank line.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
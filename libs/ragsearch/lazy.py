@@ -0,0 +1,31 @@
+"""
+Deferred imports for heavy optional backends.
+
+``import ragsearch`` should not pay for FAISS, ChromaDB, Flask or the Cohere
+SDK unless a code path actually uses them. ``LazyModule`` stands in for a
+module at import time and imports the real one on first attribute access.
+"""
+import importlib
+
+
+class LazyModule:
+    """
+    A placeholder for a module that is imported on first attribute access.
+
+    Example:
+        faiss = LazyModule("faiss")
+        index = faiss.IndexFlatIP(8)  # faiss is imported here
+    """
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute: str):
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attribute)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
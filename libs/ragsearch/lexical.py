@@ -0,0 +1,393 @@
+"""
+In-process BM25 lexical index and rank fusion for hybrid retrieval.
+
+``BM25Index`` keeps an inverted index over the engine's combined text. Each
+term's postings are stored compressed: doc ids are delta-encoded and packed
+with variable-byte encoding, and term frequencies are kept as ``uint16``.
+Top-k queries use MaxScore pruning. Terms are visited from the highest score
+upper bound down. Once the bounds of the remaining terms can no longer lift
+an unseen document into the top k, those terms only update the documents
+already collected. Deleted documents keep their postings but are masked
+out, and the document count, document frequencies and average length used
+for scoring only count live documents, so scores match an index built from
+the live documents alone. Keyword lookups (SKUs, ids, exact names) are answered
+without calling the embedding API, and ``reciprocal_rank_fusion`` and
+``weighted_fusion`` merge lexical and vector rankings.
+"""
+import json
+import logging
+import re
+from array import array
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+RRF_K = 60
+
+_VOCABULARY_FILE = "vocabulary.json"
+_ARRAY_FILES = ("postings", "posting_offsets", "tfs", "tf_offsets", "max_tfs", "min_lengths", "doc_lengths")
+# Snapshots written before deletions were tracked have no deleted documents
+_DELETED_FILE = "deleted.npy"
+
+
+def tokenize(text: str) -> list:
+    """
+    Splits text into lowercase word tokens.
+    """
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+def vbyte_encode(values: np.ndarray) -> np.ndarray:
+    """
+    Packs non-negative integers with variable-byte encoding, 7 bits per byte.
+    Every byte except the last of a value has its high bit set.
+
+    Args:
+        values (np.ndarray): Non-negative integers.
+    Returns:
+        np.ndarray: The encoded bytes as ``uint8``.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    if len(values) == 0:
+        return np.empty(0, dtype=np.uint8)
+    bit_lengths = np.floor(np.log2(np.maximum(values, 1))).astype(np.int64) + 1
+    num_bytes = (bit_lengths + 6) // 7
+    positions = np.arange(num_bytes.max())
+    shifted = (values[:, None] >> (7 * positions[None, :]).astype(np.uint64)) & np.uint64(0x7F)
+    continuation = positions[None, :] < (num_bytes[:, None] - 1)
+    encoded = (shifted | (continuation.astype(np.uint64) << np.uint64(7))).astype(np.uint8)
+    return encoded[positions[None, :] < num_bytes[:, None]]
+
+
+def vbyte_decode(data: np.ndarray) -> np.ndarray:
+    """
+    Decodes bytes written by ``vbyte_encode``.
+
+    Args:
+        data (np.ndarray): The encoded ``uint8`` bytes.
+    Returns:
+        np.ndarray: The decoded integers as ``int64``.
+    """
+    data = np.asarray(data, dtype=np.uint8)
+    if len(data) == 0:
+        return np.empty(0, dtype=np.int64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    value_of_byte = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shifts = 7 * (np.arange(len(data)) - starts[value_of_byte])
+    parts = (data & 0x7F).astype(np.int64) << shifts
+    return np.add.reduceat(parts, starts)
+
+
+def reciprocal_rank_fusion(rankings: list, top_k: int, k: int = RRF_K, weights: list = None) -> list:
+    """
+    Fuses rankings by summing ``weight / (k + rank)`` for every list a document appears in.
+
+    Args:
+        rankings (list): Lists of ``(id, score)`` pairs, best first.
+        top_k (int): Number of fused results to return.
+        k (int): Damping constant; larger values flatten the contribution of top ranks.
+        weights (list, optional): One weight per ranking. Defaults to equal weights.
+    Returns:
+        list: ``(id, fused_score)`` pairs, best first.
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, (doc_id, _) in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+
+
+def weighted_fusion(rankings: list, top_k: int, weights: list = None) -> list:
+    """
+    Fuses rankings by a weighted sum of their min-max normalized scores.
+
+    Args:
+        rankings (list): Lists of ``(id, score)`` pairs, best first.
+        top_k (int): Number of fused results to return.
+        weights (list, optional): One weight per ranking. Defaults to equal weights.
+    Returns:
+        list: ``(id, fused_score)`` pairs, best first.
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused = {}
+    for ranking, weight in zip(rankings, weights):
+        if not ranking:
+            continue
+        scores = [score for _, score in ranking]
+        low, high = min(scores), max(scores)
+        for doc_id, score in ranking:
+            normalized = (score - low) / (high - low) if high > low else 1.0
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight * normalized
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+
+
+class BM25Index:
+    """
+    A compressed BM25 inverted index over documents identified by positional row ids.
+    """
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """
+        Args:
+            k1 (float): Term frequency saturation.
+            b (float): Strength of document length normalization.
+        """
+        self.k1 = k1
+        self.b = b
+        self.vocabulary = {}  # term -> term id
+        self.postings = np.empty(0, dtype=np.uint8)
+        self.posting_offsets = np.zeros(1, dtype=np.int64)
+        self.tfs = np.empty(0, dtype=np.uint16)
+        self.tf_offsets = np.zeros(1, dtype=np.int64)
+        self.max_tfs = np.empty(0, dtype=np.uint16)  # per term, for score upper bounds
+        self.min_lengths = np.empty(0, dtype=np.uint32)  # per term, shortest document containing it
+        self.doc_lengths = np.empty(0, dtype=np.uint32)
+        self.deleted = np.empty(0, dtype=bool)  # per document
+        self.num_live = 0
+        self.average_length = 1.0
+        self._pending = {}  # term -> (doc ids, term frequencies) not yet compressed
+        self._pending_lengths = array("I")
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_lengths) + len(self._pending_lengths)
+
+    def add(self, texts, first_id: int = None):
+        """
+        Adds documents. Their ids must continue the positional sequence.
+
+        Args:
+            texts (iterable): The document texts.
+            first_id (int, optional): Id of the first document, checked against the sequence.
+        Raises:
+            ValueError: If ``first_id`` does not continue the sequence.
+        """
+        doc_id = self.num_docs
+        if first_id is not None and first_id != doc_id:
+            raise ValueError(f"Lexical index expected document id {doc_id}, got {first_id}")
+        for text in texts:
+            counts = Counter(tokenize(text))
+            self._pending_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings = self._pending.get(term)
+                if postings is None:
+                    postings = self._pending[term] = (array("q"), array("H"))
+                postings[0].append(doc_id)
+                postings[1].append(min(tf, 0xFFFF))
+            doc_id += 1
+
+    def flush(self):
+        """
+        Compresses documents added since the last flush into the postings arrays.
+        """
+        if not self._pending_lengths:
+            return
+        doc_lengths = np.concatenate([self.doc_lengths, np.frombuffer(self._pending_lengths, dtype=np.uint32)])
+        terms = list(self.vocabulary) + [term for term in self._pending if term not in self.vocabulary]
+        encoded, term_tfs = [], []
+        for term_id, term in enumerate(terms):
+            pending = self._pending.get(term)
+            if term_id < len(self.vocabulary) and pending is None:
+                # Untouched terms keep their compressed bytes
+                encoded.append(self.postings[self.posting_offsets[term_id]:self.posting_offsets[term_id + 1]])
+                term_tfs.append(self.tfs[self.tf_offsets[term_id]:self.tf_offsets[term_id + 1]])
+                continue
+            ids, tfs = self._decode(term_id) if term_id < len(self.vocabulary) else \
+                (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint16))
+            ids = np.concatenate([ids, np.frombuffer(pending[0], dtype=np.int64)])
+            tfs = np.concatenate([tfs, np.frombuffer(pending[1], dtype=np.uint16)])
+            encoded.append(vbyte_encode(np.diff(ids, prepend=0)))
+            term_tfs.append(tfs)
+
+        lengths = np.array([len(chunk) for chunk in encoded], dtype=np.int64)
+        counts = np.array([len(chunk) for chunk in term_tfs], dtype=np.int64)
+        self.postings = np.concatenate(encoded) if encoded else np.empty(0, dtype=np.uint8)
+        self.posting_offsets = np.concatenate(([0], np.cumsum(lengths)))
+        self.tfs = np.concatenate(term_tfs) if term_tfs else np.empty(0, dtype=np.uint16)
+        self.tf_offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.doc_lengths = doc_lengths
+        self.deleted = np.concatenate([self.deleted, np.zeros(len(self._pending_lengths), dtype=bool)])
+        self._update_stats()
+        self._update_bounds(terms)
+        self.vocabulary = {term: term_id for term_id, term in enumerate(terms)}
+        self._pending = {}
+        self._pending_lengths = array("I")
+        logging.info(f"Lexical index holds {self.num_docs} documents and {len(terms)} terms "
+                     f"({self.postings.nbytes + self.tfs.nbytes} bytes of postings).")
+
+    def delete(self, ids):
+        """
+        Removes documents from the results and from the collection statistics.
+        Their postings stay in place, so the ids of other documents do not change.
+
+        Args:
+            ids (array-like): Ids of the documents to delete. Ids already deleted are ignored.
+        Raises:
+            IndexError: If an id is not in the index.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        self.flush()
+        if ids.min() < 0 or ids.max() >= len(self.doc_lengths):
+            raise IndexError(f"Lexical index has no document {int(ids.max())}")
+        # Snapshots are memory-mapped read-only
+        self.deleted = np.array(self.deleted, dtype=bool)
+        self.deleted[ids] = True
+        self._update_stats()
+
+    def _update_stats(self):
+        """
+        Recomputes the live document count and average length used for scoring.
+        """
+        live_lengths = self.doc_lengths[~self.deleted]
+        self.num_live = len(live_lengths)
+        self.average_length = max(float(live_lengths.mean()), 1.0) if self.num_live else 1.0
+
+    def _update_bounds(self, terms: list):
+        """
+        Updates each term's maximum frequency and shortest document, used for MaxScore bounds.
+        Only terms with new postings are recomputed.
+        """
+        max_tfs = np.zeros(len(terms), dtype=np.uint16)
+        min_lengths = np.zeros(len(terms), dtype=np.uint32)
+        max_tfs[:len(self.max_tfs)] = self.max_tfs
+        min_lengths[:len(self.min_lengths)] = self.min_lengths
+        for term_id, term in enumerate(terms):
+            if term_id < len(self.max_tfs) and term not in self._pending:
+                continue
+            ids, tfs = self._decode(term_id)
+            max_tfs[term_id] = tfs.max()
+            min_lengths[term_id] = self.doc_lengths[ids].min()
+        self.max_tfs, self.min_lengths = max_tfs, min_lengths
+
+    def _decode(self, term_id: int):
+        """
+        Returns the doc ids and term frequencies of one term.
+        """
+        data = self.postings[self.posting_offsets[term_id]:self.posting_offsets[term_id + 1]]
+        ids = np.cumsum(vbyte_decode(data))
+        return ids, self.tfs[self.tf_offsets[term_id]:self.tf_offsets[term_id + 1]]
+
+    def _term_weights(self, tfs: np.ndarray, lengths: np.ndarray, idf: float) -> np.ndarray:
+        """
+        The BM25 contribution of one term for the given frequencies and document lengths.
+        """
+        tfs = tfs.astype(np.float32)
+        norm = self.k1 * (1.0 - self.b + self.b * lengths.astype(np.float32) / self.average_length)
+        return idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+
+    def search(self, query: str, top_k: int = 5, subset: np.ndarray = None) -> list:
+        """
+        Returns the top-k documents for a keyword query.
+
+        Args:
+            query (str): The query text.
+            top_k (int): Number of results.
+            subset (np.ndarray, optional): Boolean mask over document ids; other documents are skipped.
+        Returns:
+            list: ``(id, score)`` pairs, best first.
+        """
+        self.flush()
+        has_deleted = self.num_live < len(self.doc_lengths)
+        terms = []
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            ids, tfs = self._decode(term_id)
+            if has_deleted:
+                live = ~self.deleted[ids]
+                ids, tfs = ids[live], tfs[live]
+            df = len(ids)
+            if not df:
+                continue
+            idf = float(np.log(1.0 + (self.num_live - df + 0.5) / (df + 0.5)))
+            # Still an upper bound after deletions: they can only lower the maximum frequency
+            bound = float(self._term_weights(self.max_tfs[term_id:term_id + 1],
+                                             self.min_lengths[term_id:term_id + 1], idf)[0])
+            terms.append((bound, term_id, idf, ids, tfs))
+        if not terms or top_k <= 0:
+            return []
+
+        terms.sort(key=lambda term: (term[0], term[1]), reverse=True)
+        remaining = sum(term[0] for term in terms)
+        candidate_ids = np.empty(0, dtype=np.int64)
+        candidate_scores = np.empty(0, dtype=np.float64)
+        threshold = -np.inf
+        for bound, term_id, idf, ids, tfs in terms:
+            if subset is not None:
+                keep = subset[ids]
+                ids, tfs = ids[keep], tfs[keep]
+            scores = self._term_weights(tfs, self.doc_lengths[ids], idf)
+            if remaining >= threshold:
+                # An unseen document could still reach the top k: merge the whole list
+                merged_ids, inverse = np.unique(np.concatenate([candidate_ids, ids]), return_inverse=True)
+                candidate_scores = np.bincount(inverse, weights=np.concatenate([candidate_scores, scores]),
+                                               minlength=len(merged_ids))
+                candidate_ids = merged_ids
+            else:
+                # Only documents already collected can still make it: score those alone
+                positions = np.searchsorted(candidate_ids, ids)
+                found = positions < len(candidate_ids)
+                found[found] = candidate_ids[positions[found]] == ids[found]
+                candidate_scores[positions[found]] += scores[found]
+            remaining -= bound
+            if len(candidate_scores) >= top_k:
+                threshold = np.partition(candidate_scores, len(candidate_scores) - top_k)[-top_k]
+                alive = candidate_scores + remaining >= threshold
+                candidate_ids, candidate_scores = candidate_ids[alive], candidate_scores[alive]
+
+        order = np.lexsort((candidate_ids, -candidate_scores))[:top_k]
+        return [(int(candidate_ids[i]), float(candidate_scores[i])) for i in order]
+
+    def save(self, directory: Path) -> Path:
+        """
+        Writes the index as ``.npy`` arrays plus a vocabulary file, so it can be memory-mapped.
+
+        Args:
+            directory (Path): The directory to write to. It is created if missing.
+        Returns:
+            Path: The directory.
+        """
+        self.flush()
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in _ARRAY_FILES:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+        np.save(directory / _DELETED_FILE, self.deleted)
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        (directory / _VOCABULARY_FILE).write_text(json.dumps({"k1": self.k1, "b": self.b, "terms": terms}))
+        return directory
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> "BM25Index":
+        """
+        Loads an index written by ``save``.
+
+        Args:
+            directory (Path): The directory the index was saved to.
+            mmap (bool): Memory-map the postings instead of reading them into the heap.
+        Returns:
+            BM25Index: The index.
+        Raises:
+            FileNotFoundError: If the directory does not hold a saved index.
+        """
+        directory = Path(directory)
+        vocabulary_path = directory / _VOCABULARY_FILE
+        if not vocabulary_path.exists():
+            raise FileNotFoundError(f"No lexical index found at {directory}")
+        state = json.loads(vocabulary_path.read_text())
+        index = cls(k1=state["k1"], b=state["b"])
+        for name in _ARRAY_FILES:
+            setattr(index, name, np.load(directory / f"{name}.npy", mmap_mode="r" if mmap else None))
+        deleted_path = directory / _DELETED_FILE
+        index.deleted = np.load(deleted_path, mmap_mode="r" if mmap else None) if deleted_path.exists() \
+            else np.zeros(len(index.doc_lengths), dtype=bool)
+        index.vocabulary = {term: term_id for term_id, term in enumerate(state["terms"])}
+        index._update_stats()
+        return index
@@ -0,0 +1,270 @@
+"""
+Data loaders for the supported source formats.
+
+``load_data`` reads a whole file into a DataFrame. ``iter_data_chunks``
+streams it as a sequence of DataFrames of at most ``chunk_size`` rows, so
+files larger than memory can be ingested with bounded peak memory.
+
+Files are read through pyarrow, and the frames come back with Arrow-backed
+dtypes (``pd.ArrowDtype``), so string columns stay in Arrow buffers instead
+of becoming Python objects. Both functions take:
+
+- ``columns``: only these columns are read. For CSV, Parquet, Avro and Arrow
+  files the other columns are never parsed or materialized, which is where
+  most of the time and memory goes for wide tables;
+- ``filters``: a row predicate in pyarrow's DNF form, e.g.
+  ``[("price", "<", 20), ("in_stock", "==", True)]``, or a
+  ``pyarrow.compute.Expression``. Parquet pushes it down to skip row groups
+  by their statistics; other formats apply it to every chunk as it is read.
+
+Supported formats: CSV, JSON and JSON lines, Parquet, Avro (streamed with
+fastavro) and Arrow IPC / Feather files (memory-mapped).
+"""
+import logging
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+CSV_SUFFIXES = {".csv"}
+JSON_SUFFIXES = {".json"}
+JSON_LINES_SUFFIXES = {".jsonl", ".ndjson"}
+PARQUET_SUFFIXES = {".parquet", ".pq"}
+AVRO_SUFFIXES = {".avro"}
+ARROW_SUFFIXES = {".arrow", ".feather", ".ipc"}
+
+# Arrow types for Avro primitives; other Avro types are inferred from the records
+_AVRO_TYPES = {"string": pa.string(), "int": pa.int32(), "long": pa.int64(), "float": pa.float32(),
+               "double": pa.float64(), "boolean": pa.bool_(), "bytes": pa.binary()}
+
+
+def load_data(data_path: Path, columns: list = None, filters=None) -> pd.DataFrame:
+    """
+    Load a whole data file into a DataFrame, picking the reader from the file suffix.
+
+    Args:
+        data_path (Path): The path to the data file.
+        columns (list, optional): Only read these columns. Defaults to every column.
+        filters (list | pyarrow.compute.Expression, optional): Only keep the rows matching
+            this predicate (see the module docstring).
+    Returns:
+        pd.DataFrame: The loaded data, with Arrow-backed dtypes.
+    Raises:
+        ValueError: If the file type is not supported.
+    """
+    return _to_pandas(read_table(data_path, columns=columns, filters=filters))
+
+
+def read_table(data_path: Path, columns: list = None, filters=None) -> pa.Table:
+    """
+    Load a whole data file as an Arrow table (see ``load_data``).
+    """
+    data_path = Path(data_path)
+    suffix = data_path.suffix
+    if suffix in PARQUET_SUFFIXES:
+        import pyarrow.parquet as pq
+        # Row groups whose statistics cannot match the filters are skipped without being read
+        return pq.read_table(data_path, columns=columns, filters=filters, memory_map=True)
+    if suffix in ARROW_SUFFIXES:
+        import pyarrow.feather as feather
+        table = feather.read_table(data_path, columns=_read_columns(columns, filters), memory_map=True)
+        return _filter(table, columns, filters)
+    if suffix in CSV_SUFFIXES:
+        import pyarrow.csv as csv
+        table = csv.read_csv(data_path, convert_options=_csv_convert_options(columns, filters))
+        return _filter(table, columns, filters)
+    if suffix in JSON_SUFFIXES | JSON_LINES_SUFFIXES | AVRO_SUFFIXES:
+        tables = list(_iter_tables(data_path, None, columns, filters))
+        return pa.concat_tables(tables, promote_options="permissive") if tables else pa.table({})
+    raise ValueError(f"Unsupported file type: {suffix}")
+
+
+def iter_data_chunks(data_path: Path, chunk_size: int = 50_000, columns: list = None, filters=None):
+    """
+    Stream a data file as DataFrames of at most ``chunk_size`` rows.
+
+    CSV is read block by block with pyarrow's streaming reader, Parquet through
+    a ``pyarrow.dataset`` scan, Avro record by record with fastavro, Arrow IPC
+    files batch by batch from a memory map and line-delimited JSON with pandas'
+    ``chunksize``. A plain ``.json`` document cannot be parsed incrementally,
+    so it is loaded whole and then sliced.
+
+    Args:
+        data_path (Path): The path to the data file.
+        chunk_size (int): Maximum number of rows per chunk.
+        columns (list, optional): Only read these columns. Defaults to every column.
+        filters (list | pyarrow.compute.Expression, optional): Only keep the rows matching
+            this predicate (see the module docstring).
+    Yields:
+        pd.DataFrame: Consecutive chunks of the file, each with a fresh RangeIndex and Arrow-backed dtypes.
+    Raises:
+        ValueError: If the file type is not supported or ``chunk_size`` is not positive.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be a positive integer")
+    data_path = Path(data_path)
+    if data_path.suffix not in (CSV_SUFFIXES | JSON_SUFFIXES | JSON_LINES_SUFFIXES | PARQUET_SUFFIXES
+                                | AVRO_SUFFIXES | ARROW_SUFFIXES):
+        raise ValueError(f"Unsupported file type: {data_path.suffix}")
+    for table in _rechunk(_iter_tables(data_path, chunk_size, columns, filters), chunk_size):
+        yield _to_pandas(table)
+
+
+def _iter_tables(data_path: Path, chunk_size: int, columns: list, filters):
+    """
+    Yields the file as Arrow tables of any size, already projected and filtered.
+    ``chunk_size`` is a hint; ``None`` reads in whatever units are cheapest.
+    """
+    suffix = data_path.suffix
+    if suffix in CSV_SUFFIXES:
+        import pyarrow.csv as csv
+        with csv.open_csv(data_path, convert_options=_csv_convert_options(columns, filters)) as reader:
+            for batch in reader:
+                yield _filter(pa.Table.from_batches([batch]), columns, filters)
+    elif suffix in PARQUET_SUFFIXES:
+        import pyarrow.dataset as ds
+        dataset = ds.dataset(data_path, format="parquet")
+        scan = dataset.to_batches(columns=columns, filter=_expression(filters),
+                                  batch_size=chunk_size or 2**17)
+        for batch in scan:
+            yield pa.Table.from_batches([batch])
+    elif suffix in ARROW_SUFFIXES:
+        with pa.memory_map(str(data_path)) as source:
+            reader = pa.ipc.open_file(source)
+            read_columns = _read_columns(columns, filters)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if read_columns is not None:
+                    batch = batch.select(read_columns)
+                yield _filter(pa.Table.from_batches([batch]), columns, filters)
+    elif suffix in AVRO_SUFFIXES:
+        yield from _iter_avro(data_path, chunk_size or 50_000, columns, filters)
+    elif suffix in JSON_LINES_SUFFIXES:
+        with pd.read_json(data_path, lines=True, chunksize=chunk_size or 50_000) as reader:
+            for chunk in reader:
+                yield _from_pandas(chunk, columns, filters)
+    elif suffix in JSON_SUFFIXES:
+        if chunk_size is not None:
+            logging.warning(f"{data_path.name} is not line-delimited; loading it whole before chunking.")
+        yield _from_pandas(pd.read_json(data_path), columns, filters)
+
+
+def _iter_avro(data_path: Path, chunk_size: int, columns: list, filters):
+    """
+    Streams an Avro container file with fastavro, building one Arrow table per ``chunk_size`` records.
+    """
+    import fastavro
+
+    with open(data_path, "rb") as file:
+        reader = fastavro.reader(file)
+        fields = [field["name"] for field in reader.writer_schema.get("fields", [])]
+        read_columns = _read_columns(columns, filters) or fields
+        schema = _avro_arrow_schema(reader.writer_schema, read_columns)
+        records = []
+        for record in reader:
+            records.append({name: record.get(name) for name in read_columns})
+            if len(records) == chunk_size:
+                yield _filter(pa.Table.from_pylist(records, schema=schema), columns, filters)
+                records = []
+        if records or schema is not None:
+            yield _filter(pa.Table.from_pylist(records, schema=schema), columns, filters)
+
+
+def _avro_arrow_schema(writer_schema: dict, columns: list):
+    """
+    Maps the Avro schema of the selected fields to an Arrow schema, or returns None when a
+    field has a type that is left to inference (records, arrays, logical types, ...).
+    """
+    by_name = {field["name"]: field["type"] for field in writer_schema.get("fields", [])}
+    arrow_fields = []
+    for name in columns:
+        avro_type = by_name.get(name)
+        # ["null", "string"] is how Avro spells an optional string
+        if isinstance(avro_type, list):
+            branches = [branch for branch in avro_type if branch != "null"]
+            avro_type = branches[0] if len(branches) == 1 else None
+        if not isinstance(avro_type, str) or avro_type not in _AVRO_TYPES:
+            return None
+        arrow_fields.append(pa.field(name, _AVRO_TYPES[avro_type]))
+    return pa.schema(arrow_fields)
+
+
+def _rechunk(tables, chunk_size: int):
+    """
+    Regroups a stream of tables of any size into tables of exactly ``chunk_size`` rows (the last may be shorter).
+    """
+    pending, pending_rows = [], 0
+    for table in tables:
+        while table.num_rows:
+            take = min(chunk_size - pending_rows, table.num_rows)
+            pending.append(table.slice(0, take))
+            pending_rows += take
+            table = table.slice(take)
+            if pending_rows == chunk_size:
+                yield pa.concat_tables(pending, promote_options="permissive").combine_chunks()
+                pending, pending_rows = [], 0
+    if pending:
+        yield pa.concat_tables(pending, promote_options="permissive").combine_chunks()
+
+
+def _expression(filters):
+    """
+    Converts DNF filters to a ``pyarrow.compute.Expression``; expressions pass through.
+    """
+    if filters is None or isinstance(filters, pc.Expression):
+        return filters
+    import pyarrow.parquet as pq
+    return pq.filters_to_expression(filters)
+
+
+def _filter_columns(filters) -> list:
+    """
+    The columns referenced by DNF filters, or None when they cannot be determined.
+    """
+    if filters is None:
+        return []
+    if isinstance(filters, pc.Expression):
+        return None
+    conjunctions = filters if filters and isinstance(filters[0], list) else [filters]
+    return [column for conjunction in conjunctions for column, _, _ in conjunction]
+
+
+def _read_columns(columns: list, filters):
+    """
+    The columns to read from the file: the projection plus the columns the filters need.
+    """
+    if columns is None:
+        return None
+    needed = _filter_columns(filters)
+    if needed is None:
+        return None
+    return list(columns) + [column for column in dict.fromkeys(needed) if column not in columns]
+
+
+def _filter(table: pa.Table, columns: list, filters) -> pa.Table:
+    """
+    Applies the filters to a table read from a format without predicate pushdown, then projects it.
+    """
+    if filters is not None:
+        table = table.filter(_expression(filters))
+    if columns is not None and table.column_names != list(columns):
+        table = table.select(list(columns))
+    return table
+
+
+def _csv_convert_options(columns: list, filters):
+    import pyarrow.csv as csv
+    # strings_can_be_null matches pandas, which reads "", "NA", "null", ... as missing
+    return csv.ConvertOptions(include_columns=_read_columns(columns, filters), strings_can_be_null=True)
+
+
+def _from_pandas(data: pd.DataFrame, columns: list, filters) -> pa.Table:
+    if columns is not None:
+        data = data[_read_columns(columns, filters) or list(data.columns)]
+    return _filter(pa.Table.from_pandas(data, preserve_index=False), columns, filters)
+
+
+def _to_pandas(table: pa.Table) -> pd.DataFrame:
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
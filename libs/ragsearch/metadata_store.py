@@ -0,0 +1,289 @@
+"""
+Columnar row metadata for search hits.
+
+``MetadataStore`` keeps row metadata in an Arrow table instead of one Python
+dict (or DataFrame row) per record. Search results are hydrated with a
+single vectorized ``take`` over the whole top-k set, optionally projected to
+the columns the caller asks for. A store opened from an uncompressed Arrow
+IPC file stays memory-mapped, so its columns live in the page cache rather
+than on the Python heap.
+
+``MetadataStore.mask`` evaluates structured filters over the columns and
+returns a boolean mask over the row ids, which the vector database turns
+into a FAISS id selector so filtering happens inside the index scan.
+"""
+import json
+import logging
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+
+
+DEFAULT_EXCLUDED_COLUMNS = ("embedding",)
+MASK_CACHE_SIZE = 64
+
+FILTER_OPERATORS = {
+    "eq": pc.equal,
+    "ne": pc.not_equal,
+    "gt": pc.greater,
+    "gte": pc.greater_equal,
+    "lt": pc.less,
+    "lte": pc.less_equal,
+}
+
+
+def _column_to_arrow(series: pd.Series) -> pa.Array:
+    """
+    Converts one DataFrame column to Arrow, falling back to strings for mixed-type object columns.
+    """
+    try:
+        return pa.array(series, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        logging.warning(f"Column '{series.name}' mixes value types; storing it as strings.")
+        return pa.array(series.where(series.isna(), series.astype(str)), from_pandas=True)
+
+
+def _conform(table: pa.Table, num_rows: int, schema: pa.Schema) -> pa.Table:
+    """
+    Returns ``num_rows`` rows of ``table`` laid out as ``schema``, with nulls for missing columns.
+    """
+    arrays = []
+    for field in schema:
+        if table is not None and field.name in table.column_names:
+            arrays.append(table.column(field.name).cast(field.type))
+        else:
+            arrays.append(pa.nulls(num_rows, field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _as_scalar(value, arrow_type: pa.DataType) -> pa.Scalar:
+    """
+    Converts a filter value to a scalar comparable with a column, e.g. an ISO date string
+    to a timestamp.
+    """
+    try:
+        return pa.scalar(value, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        pass
+    try:
+        return pa.scalar(value).cast(arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return pa.scalar(value)
+
+
+def _condition_mask(column: pa.ChunkedArray, condition) -> pa.ChunkedArray:
+    """
+    Evaluates one column's filter condition. See ``MetadataStore.mask`` for the forms.
+    """
+    if isinstance(condition, dict):
+        masks = []
+        for operator, value in condition.items():
+            if operator == "in":
+                masks.append(_condition_mask(column, list(value)))
+            elif operator in FILTER_OPERATORS:
+                masks.append(FILTER_OPERATORS[operator](column, _as_scalar(value, column.type)))
+            else:
+                raise ValueError(f"Unknown filter operator '{operator}'; "
+                                 f"expected one of {sorted(FILTER_OPERATORS) + ['in']}")
+        if not masks:
+            raise ValueError("A filter condition needs at least one operator")
+        mask = masks[0]
+        for other in masks[1:]:
+            mask = pc.and_kleene(mask, other)
+        return mask
+    if isinstance(condition, (list, tuple, set)):
+        values = [_as_scalar(value, column.type).as_py() for value in condition]
+        try:
+            value_set = pa.array(values, type=column.type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            value_set = pa.array(values)
+        return pc.is_in(column, value_set=value_set)
+    return pc.equal(column, _as_scalar(condition, column.type))
+
+
+class MetadataStore:
+    """
+    Row metadata stored column-wise and looked up by positional row id.
+    """
+    def __init__(self, table: pa.Table = None):
+        """
+        Args:
+            table (pa.Table, optional): The rows, positionally aligned with the vector ids.
+        """
+        self._table = table if table is not None else pa.table({})
+        self._num_rows = self._table.num_rows
+        self._mask_cache = OrderedDict()
+
+    @classmethod
+    def from_pandas(cls, data: pd.DataFrame) -> "MetadataStore":
+        """
+        Builds a store from a DataFrame. Arrow-backed columns are reused without copying.
+
+        Args:
+            data (pd.DataFrame): The row metadata.
+        Returns:
+            MetadataStore: The store.
+        """
+        arrays = [_column_to_arrow(data[column]) for column in data.columns]
+        return cls(pa.Table.from_arrays(arrays, names=[str(column) for column in data.columns]))
+
+    @classmethod
+    def open(cls, path: Path, mmap: bool = True) -> "MetadataStore":
+        """
+        Opens an Arrow IPC file written by ``write`` (or ``persistence.MetadataWriter``).
+
+        Args:
+            path (Path): The Arrow IPC file.
+            mmap (bool): Memory-map the file instead of reading it into the heap.
+        Returns:
+            MetadataStore: The store.
+        """
+        return cls(feather.read_table(path, memory_map=mmap))
+
+    def write(self, path: Path) -> Path:
+        """
+        Writes the store as an uncompressed Arrow IPC file so it can be memory-mapped.
+
+        Args:
+            path (Path): The file to write.
+        Returns:
+            Path: The written file.
+        """
+        feather.write_feather(self._table, path, compression="uncompressed")
+        return Path(path)
+
+    def __len__(self) -> int:
+        return self._num_rows
+
+    @property
+    def columns(self) -> list:
+        """
+        The names of the stored columns.
+        """
+        return self._table.column_names
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size of the column buffers in bytes (mapped, not heap, when opened with ``mmap``).
+        """
+        return self._table.nbytes
+
+    def to_pandas(self) -> pd.DataFrame:
+        """
+        Returns the rows as an Arrow-backed DataFrame without copying the column data.
+        """
+        return self._table.to_pandas(types_mapper=pd.ArrowDtype)
+
+    def append(self, rows: list, start: int = None):
+        """
+        Appends rows given as dicts. Columns missing from some rows are filled with nulls.
+
+        Args:
+            rows (list): One dict per row.
+            start (int, optional): Row id of the first row. Rows skipped between the current
+                end of the store and ``start`` are left empty. Defaults to the current length.
+        Raises:
+            ValueError: If ``start`` would overwrite existing rows or a value type conflicts
+                with the column's existing type.
+        """
+        start = self._num_rows if start is None else int(start)
+        if start < self._num_rows:
+            raise ValueError(f"Cannot append at row {start}; the store already has {self._num_rows} rows")
+        keys = list(dict.fromkeys(key for row in rows for key in row))
+        try:
+            new = pa.table({key: [row.get(key) for row in rows] for key in keys})
+            schema = pa.unify_schemas([self._table.schema, new.schema])
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            raise ValueError(f"Metadata does not match the stored columns: {e}")
+
+        parts = [_conform(self._table, self._num_rows, schema)]
+        if start > self._num_rows:
+            parts.append(_conform(None, start - self._num_rows, schema))
+        parts.append(_conform(new, len(rows), schema))
+        # Chunks are merged lazily by the next take, so repeated small appends stay cheap
+        self._table = pa.concat_tables(parts)
+        self._num_rows = start + len(rows)
+        self._mask_cache.clear()
+
+    def mask(self, filters: dict) -> np.ndarray:
+        """
+        Evaluates filters over the columns. All conditions must hold; rows with a missing
+        value never match. Masks of recently used filters are cached.
+
+        Each condition is one of:
+
+        - a value: ``{"category": "books"}``
+        - a list of allowed values: ``{"tenant_id": [3, 7]}``
+        - a dict of operators (``eq``, ``ne``, ``gt``, ``gte``, ``lt``, ``lte``, ``in``):
+          ``{"date": {"gte": "2024-01-01", "lt": "2024-02-01"}}``
+
+        Args:
+            filters (dict): Conditions keyed by column name.
+        Returns:
+            np.ndarray: A boolean mask with one entry per row.
+        Raises:
+            ValueError: If a column or operator is unknown.
+        """
+        key = json.dumps(filters, sort_keys=True, default=str)
+        cached = self._mask_cache.get(key)
+        if cached is not None:
+            self._mask_cache.move_to_end(key)
+            return cached
+
+        unknown = [column for column in filters if column not in self.columns]
+        if unknown:
+            raise ValueError(f"Unknown filter columns: {unknown}")
+        mask = pa.chunked_array([pa.array(np.ones(self._num_rows, dtype=bool))])
+        for column, condition in filters.items():
+            try:
+                condition_mask = _condition_mask(self._table.column(column), condition)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+                raise ValueError(f"Cannot apply filter {condition!r} to column '{column}': {e}")
+            mask = pc.and_kleene(mask, condition_mask)
+        result = pc.fill_null(mask, False).combine_chunks().to_numpy(zero_copy_only=False)
+        result.flags.writeable = False
+
+        self._mask_cache[key] = result
+        if len(self._mask_cache) > MASK_CACHE_SIZE:
+            self._mask_cache.popitem(last=False)
+        return result
+
+    def take(self, ids, columns: list = None, exclude=DEFAULT_EXCLUDED_COLUMNS) -> list:
+        """
+        Looks up many rows at once.
+
+        Args:
+            ids (array-like): Row ids. Ids outside the store (e.g. FAISS's ``-1``) give empty dicts.
+            columns (list, optional): Columns to return. Defaults to every column except ``exclude``.
+            exclude (tuple): Columns left out when ``columns`` is not given.
+        Returns:
+            list: One dict per id, in the order of ``ids``.
+        Raises:
+            ValueError: If a requested column does not exist.
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if columns is None:
+            names = [name for name in self.columns if name not in exclude]
+        else:
+            names = list(columns)
+            unknown = [name for name in names if name not in self.columns]
+            if unknown:
+                raise ValueError(f"Unknown metadata columns: {unknown}")
+
+        valid = (ids >= 0) & (ids < self._num_rows)
+        rows = [{} for _ in range(len(ids))]
+        if not names or not valid.any():
+            return rows
+
+        if self._table.num_columns and self._table.column(0).num_chunks > 1:
+            self._table = self._table.combine_chunks()
+        found = self._table.select(names).take(pa.array(ids[valid])).to_pylist()
+        for position, row in zip(np.flatnonzero(valid).tolist(), found):
+            rows[position] = row
+        return rows
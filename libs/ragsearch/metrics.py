@@ -0,0 +1,238 @@
+"""
+In-process metrics for the search hot path.
+
+``span`` times one stage of a request (embedding, ANN search, hydration,
+serialization, ...) into a histogram, and ``REGISTRY.render`` exposes every
+metric in the Prometheus text format for the ``/metrics`` route. The
+metrics are plain Python objects behind a lock, so recording one costs
+about a microsecond and needs no client library.
+
+Per-query log lines go through ``log_query``, which logs at DEBUG and only
+for a sample of queries (``QUERY_LOG_SAMPLE_RATE``, overridable with the
+``RAGSEARCH_QUERY_LOG_SAMPLE_RATE`` environment variable), so logging does
+not add latency under load.
+"""
+import bisect
+import logging
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Upper bounds in seconds, from sub-millisecond FAISS scans to multi-second embed calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_LOG_SAMPLE_RATE = float(os.environ.get("RAGSEARCH_QUERY_LOG_SAMPLE_RATE", "0.01"))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """
+    Common bookkeeping: a name, help text and one series per combination of label values.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric '{self.name}' expects labels {self.labelnames}, got {sorted(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items(), key=lambda item: tuple(map(str, item[0])))
+            lines.extend(self._render_series(series))
+        return lines
+
+    def _render_series(self, series: list) -> list:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in series]
+
+
+class Counter(_Metric):
+    """
+    A monotonically increasing count.
+    """
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._series.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    """
+    A value that can go up and down, e.g. the number of indexed vectors.
+    """
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = float(value)
+
+    def value(self, **labels) -> float:
+        return self._series.get(self._key(labels), 0.0)
+
+
+class Histogram(_Metric):
+    """
+    Counts observations into cumulative buckets, e.g. stage latencies in seconds.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def _render_series(self, series: list) -> list:
+        lines = []
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Holds metrics by name and renders them for Prometheus.
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric '{name}' is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram("ragsearch_stage_seconds",
+                                   "Time spent in each stage of a search request.", ("stage",))
+REQUEST_SECONDS = REGISTRY.histogram("ragsearch_request_seconds",
+                                     "End-to-end time of HTTP search requests.", ("route",))
+QUERIES = REGISTRY.counter("ragsearch_queries_total", "Search queries answered, by mode.", ("mode",))
+ANSWER_FIRST_TOKEN_SECONDS = REGISTRY.histogram("ragsearch_answer_first_token_seconds",
+                                                "Time from an answer request to its first generated token.")
+INGESTED_ROWS = REGISTRY.counter("ragsearch_ingested_rows_total", "Rows embedded and stored in the index.")
+INGEST_TARGET_ROWS = REGISTRY.gauge("ragsearch_ingest_target_rows",
+                                    "Rows the running ingestion will embed, or 0 when streaming.")
+INDEX_VECTORS = REGISTRY.gauge("ragsearch_index_vectors", "Vectors in the FAISS index, including deleted ones.")
+INDEX_ROWS = REGISTRY.gauge("ragsearch_index_rows", "Searchable rows.")
+EMBEDDING_CACHE_LOOKUPS = REGISTRY.gauge("ragsearch_embedding_cache_lookups",
+                                         "Embedding cache lookups since start, by result.", ("result",))
+RESULT_CACHE_LOOKUPS = REGISTRY.counter("ragsearch_result_cache_lookups_total",
+                                        "Query result cache lookups, by tier hit or miss.", ("result",))
+RESULT_CACHE_HIT_RATIO = REGISTRY.gauge("ragsearch_result_cache_hit_ratio",
+                                        "Share of queries answered from the result cache.")
+EMBEDDING_CACHE_HIT_RATIO = REGISTRY.gauge("ragsearch_embedding_cache_hit_ratio",
+                                           "Share of embedding cache lookups that were hits.")
+DATASETS_LOADED = REGISTRY.gauge("ragsearch_datasets_loaded", "Datasets of the engine registry currently loaded.")
+DATASETS_MEMORY_BYTES = REGISTRY.gauge("ragsearch_datasets_memory_bytes",
+                                       "Estimated memory of the loaded datasets.")
+DATASET_EVICTIONS = REGISTRY.counter("ragsearch_dataset_evictions_total",
+                                     "Datasets unloaded to stay within the registry's memory budget.")
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Times the enclosed block into ``ragsearch_stage_seconds{stage=...}``.
+
+    Args:
+        stage (str): The stage name, e.g. ``"embed"``, ``"ann"`` or ``"hydrate"``.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+def log_query(message: str, *args):
+    """
+    Logs a per-query message at DEBUG level for a sample of calls. The message is only
+    formatted when it is actually logged.
+
+    Args:
+        message (str): A ``%``-style format string.
+        *args: Its arguments.
+    """
+    if random.random() < QUERY_LOG_SAMPLE_RATE and logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(message, *args)
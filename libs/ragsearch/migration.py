@@ -0,0 +1,344 @@
+"""
+Bulk migration between persisted FAISS snapshots and ChromaDB collections.
+
+``export_to_chromadb`` copies the vectors, row keys, combined text and row
+metadata of a snapshot (see ``persistence.save_snapshot``) into a Chroma
+collection. ``import_from_chromadb`` does the reverse and writes a snapshot.
+Both move the stored embeddings, so nothing is embedded twice, and both
+work in large batches.
+
+With a ``checkpoint_dir`` the progress is recorded after every batch, and
+running the same migration again resumes where it stopped. Exports upsert,
+so a batch that is copied a second time after a crash does no harm. Imports
+spool the embeddings and metadata into the checkpoint directory and only
+build the index once the whole collection has been read.
+
+Example::
+
+    python -m ragsearch.migration export embeddings/<fingerprint> chroma/ products
+    python -m ragsearch.migration import chroma/ products embeddings/products
+"""
+import argparse
+import json
+import logging
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from .lexical import BM25Index
+from .metadata_store import MetadataStore
+from .persistence import load_row_state, load_snapshot, save_snapshot
+from .utils import content_hashes
+from .vector_db import VectorDB, get_chromadb_client
+
+
+CHECKPOINT_FILE_NAME = "checkpoint.json"
+SPOOL_FILE_NAME = "embeddings.f32"
+PARTS_DIR_NAME = "metadata-parts"
+TEXT_COLUMN = "combined_text"
+
+
+def _read_checkpoint(checkpoint_dir: Path, job: dict) -> int:
+    """
+    Returns the number of rows an earlier run of the same job already migrated.
+
+    Raises:
+        ValueError: If the checkpoint directory belongs to a different migration.
+    """
+    if checkpoint_dir is None or not (checkpoint_dir / CHECKPOINT_FILE_NAME).exists():
+        return 0
+    state = json.loads((checkpoint_dir / CHECKPOINT_FILE_NAME).read_text())
+    if state.get("job") != job:
+        raise ValueError(f"Checkpoint in {checkpoint_dir} belongs to another migration: {state.get('job')}")
+    return int(state["rows_done"])
+
+
+def _write_checkpoint(checkpoint_dir: Path, job: dict, rows_done: int, **extra):
+    """
+    Records progress, replacing the previous checkpoint atomically.
+    """
+    if checkpoint_dir is None:
+        return
+    staging = checkpoint_dir / (CHECKPOINT_FILE_NAME + ".tmp")
+    staging.write_text(json.dumps(dict(extra, job=job, rows_done=rows_done)))
+    staging.replace(checkpoint_dir / CHECKPOINT_FILE_NAME)
+
+
+def _chroma_value(value):
+    """
+    Converts a metadata value to a type Chroma accepts, or None to leave it out.
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def _report(rows: int, total: int, resumed_from: int, started: float) -> dict:
+    """
+    Throughput summary returned by both directions.
+    """
+    seconds = time.perf_counter() - started
+    return {"vectors": rows, "total": total, "resumed_from": resumed_from, "seconds": round(seconds, 3),
+            "vectors_per_second": round(rows / seconds, 1) if seconds > 0 else 0.0}
+
+
+def _log_progress(done: int, total: int, moved: int, started: float):
+    elapsed = time.perf_counter() - started
+    rate = moved / elapsed if elapsed > 0 else 0.0
+    logging.info(f"Migrated {done}/{total} vectors ({rate:.0f} vectors/s)")
+
+
+def export_to_chromadb(snapshot_dir: Path,
+                       chromadb_path: str,
+                       collection_name: str,
+                       batch_size: int = 5000,
+                       checkpoint_dir: Path = None) -> dict:
+    """
+    Copies a FAISS snapshot into a ChromaDB collection without re-embedding.
+
+    Each row becomes one Chroma record: the id is the row's ``id_column`` value
+    (or its vector id), the document is its combined text, the embedding is the
+    vector stored in the index and the metadata is the row's other columns.
+    Missing values are left out, since Chroma does not store nulls. The collection
+    is created with the inner-product space FAISS searches with.
+
+    Args:
+        snapshot_dir (Path): The snapshot to export.
+        chromadb_path (str): The ChromaDB persistence path.
+        collection_name (str): The collection to create or add to.
+        batch_size (int): Records per Chroma upsert, capped at the client's maximum batch size.
+        checkpoint_dir (Path, optional): Records progress so an interrupted export resumes.
+    Returns:
+        dict: ``vectors`` copied by this run, ``total``, ``resumed_from``, ``seconds`` and
+        ``vectors_per_second``.
+    Raises:
+        ValueError: If the checkpoint belongs to another migration.
+    """
+    snapshot_dir = Path(snapshot_dir)
+    job = {"direction": "export", "source": str(snapshot_dir.resolve()),
+           "target": str(Path(chromadb_path).resolve()), "collection": collection_name}
+    if checkpoint_dir is not None:
+        checkpoint_dir = Path(checkpoint_dir)
+        checkpoint_dir.mkdir(parents=True, exist_ok=True)
+    start = _read_checkpoint(checkpoint_dir, job)
+
+    vector_db, data, manifest = load_snapshot(snapshot_dir, mmap=True)
+    row_ids = (load_row_state(snapshot_dir) or {}).get("row_ids")
+    if row_ids is None:
+        row_ids = np.arange(len(data), dtype=np.int64)
+    metadata = MetadataStore.from_pandas(data)
+    id_column = manifest.get("id_column") if manifest.get("id_column") in metadata.columns else None
+    columns = [name for name in metadata.columns if name != "embedding"]
+
+    client = get_chromadb_client(chromadb_path)
+    collection = client.get_or_create_collection(collection_name, embedding_function=None,
+                                                 metadata={"hnsw:space": "ip"})
+    batch_size = max(1, min(batch_size, client.get_max_batch_size()))
+    total = len(data)
+    if start:
+        logging.info(f"Resuming export of {snapshot_dir} at row {start}/{total}")
+
+    started = time.perf_counter()
+    for first in range(start, total, batch_size):
+        rows = np.arange(first, min(first + batch_size, total))
+        ids = row_ids[rows]
+        records = metadata.take(rows, columns=columns)
+        if id_column:
+            keys = [str(record[id_column]) for record in records]
+        else:
+            keys = [str(vector_id) for vector_id in ids.tolist()]
+        documents = [record.pop(TEXT_COLUMN, None) for record in records]
+        metadatas = []
+        for record in records:
+            values = {key: _chroma_value(value) for key, value in record.items()}
+            values = {key: value for key, value in values.items() if value is not None}
+            metadatas.append(values or None)
+        upsert = {"ids": keys, "embeddings": vector_db.reconstruct(ids), "metadatas": metadatas}
+        if TEXT_COLUMN in columns:
+            upsert["documents"] = documents
+        collection.upsert(**upsert)
+        done = int(rows[-1]) + 1
+        _write_checkpoint(checkpoint_dir, job, done, total=total)
+        _log_progress(done, total, done - start, started)
+    return _report(total - start, total, start, started)
+
+
+def import_from_chromadb(chromadb_path: str,
+                         collection_name: str,
+                         snapshot_dir: Path,
+                         index_spec: str = "Flat",
+                         batch_size: int = 5000,
+                         checkpoint_dir: Path = None,
+                         id_column: str = "id",
+                         lexical: bool = True) -> dict:
+    """
+    Copies a ChromaDB collection into a FAISS snapshot without re-embedding.
+
+    Records are paged out of Chroma in batches and spooled to disk, then the index
+    is built from the memory-mapped spool, so memory stays bounded by the batch size
+    (plus whatever the index itself needs). Each record becomes one row holding its
+    Chroma metadata, its id in ``id_column`` and its document in ``combined_text``.
+
+    Args:
+        chromadb_path (str): The ChromaDB persistence path.
+        collection_name (str): The collection to copy.
+        snapshot_dir (Path): The snapshot directory to write, e.g. ``save_dir/<fingerprint>``.
+        index_spec (str): FAISS index type (see ``VectorDB``).
+        batch_size (int): Records read from Chroma per call.
+        checkpoint_dir (Path, optional): Holds the spool and progress so an interrupted import
+            resumes. Defaults to a temporary directory, which is removed afterwards.
+        id_column (str): Column the Chroma ids are stored in.
+        lexical (bool): Build a BM25 index over the documents too.
+    Returns:
+        dict: ``vectors`` copied by this run, ``total``, ``resumed_from``, ``seconds`` and
+        ``vectors_per_second``.
+    Raises:
+        ValueError: If the checkpoint belongs to another migration, the collection holds
+            records without embeddings, or metadata types conflict between batches.
+    """
+    snapshot_dir = Path(snapshot_dir)
+    job = {"direction": "import", "source": str(Path(chromadb_path).resolve()),
+           "collection": collection_name, "target": str(snapshot_dir.resolve())}
+    temporary = checkpoint_dir is None
+    checkpoint_dir = Path(tempfile.mkdtemp(prefix="ragsearch-import-")) if temporary else Path(checkpoint_dir)
+    parts_dir = checkpoint_dir / PARTS_DIR_NAME
+    parts_dir.mkdir(parents=True, exist_ok=True)
+    spool_path = checkpoint_dir / SPOOL_FILE_NAME
+    try:
+        start = _read_checkpoint(checkpoint_dir, job)
+        state = json.loads((checkpoint_dir / CHECKPOINT_FILE_NAME).read_text()) if start else {}
+        embedding_dim = state.get("embedding_dim")
+
+        # Drop anything written after the last checkpoint
+        for part in parts_dir.glob("*.arrow"):
+            if int(part.stem) >= start:
+                part.unlink()
+        with open(spool_path, "ab") as spool:
+            spool.truncate(start * (embedding_dim or 0) * 4)
+
+        collection = get_chromadb_client(chromadb_path).get_collection(collection_name)
+        total = collection.count()
+        if start:
+            logging.info(f"Resuming import of '{collection_name}' at record {start}/{total}")
+
+        started = time.perf_counter()
+        done = start
+        with open(spool_path, "ab") as spool:
+            while done < total:
+                batch = collection.get(include=["embeddings", "documents", "metadatas"],
+                                       limit=batch_size, offset=done)
+                if not batch["ids"]:
+                    break
+                embeddings = batch["embeddings"]
+                if embeddings is None or any(embedding is None for embedding in embeddings):
+                    raise ValueError(f"Collection '{collection_name}' has records without embeddings.")
+                embeddings = np.asarray(embeddings, dtype=np.float32)
+                embedding_dim = embedding_dim or embeddings.shape[1]
+                if embeddings.shape[1] != embedding_dim:
+                    raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match {embedding_dim}")
+
+                rows = []
+                for key, document, values in zip(batch["ids"], batch["documents"], batch["metadatas"]):
+                    row = dict(values or {})
+                    row[id_column] = key
+                    row[TEXT_COLUMN] = document or ""
+                    rows.append(row)
+                feather.write_feather(pa.Table.from_pylist(rows), parts_dir / f"{done:012d}.arrow",
+                                      compression="uncompressed")
+                spool.write(embeddings.tobytes())
+                spool.flush()
+                done += len(batch["ids"])
+                _write_checkpoint(checkpoint_dir, job, done, embedding_dim=embedding_dim)
+                _log_progress(done, total, done - start, started)
+
+        _build_snapshot(snapshot_dir, spool_path, parts_dir, done, embedding_dim, index_spec, batch_size,
+                        manifest={"file_name": collection_name, "textual_columns": [], "id_column": id_column},
+                        lexical=lexical)
+        report = _report(done - start, done, start, started)
+        logging.info(f"Imported '{collection_name}' into {snapshot_dir}: {report}")
+    except BaseException:
+        if temporary:
+            shutil.rmtree(checkpoint_dir, ignore_errors=True)
+        raise
+    # The snapshot is complete, so the spool is no longer needed
+    shutil.rmtree(checkpoint_dir if temporary else parts_dir, ignore_errors=True)
+    if not temporary:
+        spool_path.unlink(missing_ok=True)
+        (checkpoint_dir / CHECKPOINT_FILE_NAME).unlink(missing_ok=True)
+    return report
+
+
+def _build_snapshot(snapshot_dir: Path, spool_path: Path, parts_dir: Path, num_rows: int, embedding_dim: int,
+                    index_spec: str, batch_size: int, manifest: dict, lexical: bool):
+    """
+    Builds the index from the spooled embeddings and saves it with the spooled metadata.
+    """
+    vector_db = VectorDB(embedding_dim=int(embedding_dim or 1), index_spec=index_spec)
+    if num_rows:
+        vectors = np.memmap(spool_path, dtype=np.float32, mode="r", shape=(num_rows, embedding_dim))
+        for first in range(0, num_rows, batch_size):
+            vector_db.add_batch(vectors[first:first + batch_size])
+        vector_db.flush()
+
+    parts = sorted(parts_dir.glob("*.arrow"))
+    try:
+        table = pa.concat_tables([feather.read_table(part, memory_map=True) for part in parts],
+                                 promote_options="permissive") if parts else pa.table({})
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        raise ValueError(f"Chroma metadata types conflict between batches: {e}")
+    metadata_file = parts_dir / "metadata.arrow"
+    feather.write_feather(table, metadata_file, compression="uncompressed")
+
+    texts = table.column(TEXT_COLUMN).to_pylist() if num_rows else []
+    lexical_index = None
+    if lexical:
+        lexical_index = BM25Index()
+        lexical_index.add(texts, first_id=0)
+        lexical_index.flush()
+    save_snapshot(snapshot_dir, vector_db, manifest=manifest, metadata_file=metadata_file,
+                  lexical_index=lexical_index,
+                  row_state={"row_ids": np.arange(num_rows, dtype=np.int64), "text_hashes": content_hashes(texts)})
+
+
+def main(argv: list = None):
+    """
+    Command-line entry point; prints the throughput report as JSON.
+    """
+    parser = argparse.ArgumentParser(description="Move embeddings between FAISS snapshots and ChromaDB.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Copy a FAISS snapshot into a Chroma collection.")
+    export.add_argument("snapshot_dir")
+    export.add_argument("chromadb_path")
+    export.add_argument("collection_name")
+    imported = commands.add_parser("import", help="Copy a Chroma collection into a FAISS snapshot.")
+    imported.add_argument("chromadb_path")
+    imported.add_argument("collection_name")
+    imported.add_argument("snapshot_dir")
+    imported.add_argument("--index-spec", default="Flat")
+    for command in (export, imported):
+        command.add_argument("--batch-size", type=int, default=5000)
+        command.add_argument("--checkpoint-dir", default=None)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == "export":
+        report = export_to_chromadb(args.snapshot_dir, args.chromadb_path, args.collection_name,
+                                    batch_size=args.batch_size, checkpoint_dir=args.checkpoint_dir)
+    else:
+        report = import_from_chromadb(args.chromadb_path, args.collection_name, args.snapshot_dir,
+                                      index_spec=args.index_spec, batch_size=args.batch_size,
+                                      checkpoint_dir=args.checkpoint_dir)
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Snapshot persistence for the FAISS backend.
+
+A snapshot is a directory holding the FAISS index, a columnar (Arrow IPC)
+sidecar with the row metadata, optionally the BM25 lexical index, the
+per-row vector ids and content hashes, and a small manifest. Snapshots are
+keyed by a fingerprint of the source file and the textual columns that were
+embedded, so a restart over unchanged data can warm-start without calling
+the embedding API. A per-dataset pointer records the latest snapshot, so a
+restart over changed data can refresh it incrementally instead.
+"""
+import hashlib
+import json
+import logging
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from .vector_db import VectorDB
+from .sharding import ShardedVectorDB, is_sharded
+from .lexical import BM25Index
+
+
+METADATA_FILE_NAME = "metadata.arrow"
+MANIFEST_FILE_NAME = "manifest.json"
+LEXICAL_DIR_NAME = "lexical"
+ROW_STATE_FILE_NAME = "rows.npz"
+SNAPSHOT_FORMAT_VERSION = 1
+
+_READ_CHUNK_BYTES = 1 << 20
+
+
+def dataset_fingerprint(data_path: Path, textual_columns: list, options: dict = None) -> str:
+    """
+    Compute a fingerprint of a data file's contents and the columns that get embedded.
+
+    The file is hashed by content rather than by modification time, so every
+    pod that deploys the same file arrives at the same snapshot.
+
+    Args:
+        data_path (Path): The path to the source data file.
+        textual_columns (list): The columns combined into the embedded text.
+        options (dict, optional): Any other settings that change the snapshot's contents,
+            such as column prefixes, the token budget or the index type. ``None`` values are ignored.
+    Returns:
+        str: A hex digest identifying the snapshot.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"v{SNAPSHOT_FORMAT_VERSION}".encode())
+    digest.update(json.dumps(list(textual_columns)).encode())
+    options = {key: value for key, value in (options or {}).items() if value is not None}
+    if options:
+        digest.update(json.dumps(options, sort_keys=True).encode())
+    with open(data_path, "rb") as file:
+        for chunk in iter(lambda: file.read(_READ_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dataset_key(file_name: str, textual_columns: list, options: dict = None) -> str:
+    """
+    Compute a key identifying a dataset independently of its contents.
+
+    Successive versions of the same file share the key, which ``latest_snapshot``
+    uses to find the snapshot to refresh from.
+
+    Args:
+        file_name (str): The source file's name.
+        textual_columns (list): The columns combined into the embedded text.
+        options (dict, optional): The same options passed to ``dataset_fingerprint``.
+    Returns:
+        str: A hex digest.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"v{SNAPSHOT_FORMAT_VERSION}:{file_name}".encode())
+    digest.update(json.dumps(list(textual_columns)).encode())
+    options = {key: value for key, value in (options or {}).items() if value is not None}
+    if options:
+        digest.update(json.dumps(options, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def latest_snapshot(save_dir: Path, key: str):
+    """
+    Return the latest complete snapshot recorded for a dataset key.
+
+    Args:
+        save_dir (Path): The directory holding the snapshots.
+        key (str): The dataset key (see ``dataset_key``).
+    Returns:
+        Path: The snapshot directory, or None if there is none.
+    """
+    pointer = Path(save_dir) / f"{key}.latest"
+    if not pointer.exists():
+        return None
+    snapshot_dir = Path(save_dir) / pointer.read_text().strip()
+    return snapshot_dir if snapshot_exists(snapshot_dir) else None
+
+
+def set_latest_snapshot(save_dir: Path, key: str, snapshot_dir: Path):
+    """
+    Record a snapshot as the latest for a dataset key.
+
+    Args:
+        save_dir (Path): The directory holding the snapshots.
+        key (str): The dataset key.
+        snapshot_dir (Path): A snapshot directory inside ``save_dir``.
+    """
+    pointer = Path(save_dir) / f"{key}.latest"
+    staging = pointer.with_name(pointer.name + ".tmp")
+    staging.write_text(Path(snapshot_dir).name)
+    staging.replace(pointer)
+
+
+def snapshot_exists(snapshot_dir: Path) -> bool:
+    """
+    Check whether a complete snapshot has been written to a directory.
+
+    Args:
+        snapshot_dir (Path): The snapshot directory.
+    Returns:
+        bool: True if the manifest (written last) is present.
+    """
+    return (Path(snapshot_dir) / MANIFEST_FILE_NAME).exists()
+
+
+class MetadataWriter:
+    """
+    Appends DataFrame chunks to an uncompressed Arrow IPC file.
+
+    Used by streaming ingestion so row metadata goes to disk chunk by chunk
+    instead of accumulating in memory. Every chunk is cast to the schema of
+    the first one.
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.schema = None
+        self._sink = None
+        self._writer = None
+
+    def write(self, data: pd.DataFrame):
+        """
+        Append one chunk of rows.
+
+        Raises:
+            ValueError: If the chunk cannot be cast to the schema of the first chunk.
+        """
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        if self._writer is None:
+            self.schema = table.schema.remove_metadata()
+            self._sink = pa.OSFile(str(self.path), "wb")
+            self._writer = pa.ipc.new_file(self._sink, self.schema)
+        try:
+            table = table.cast(self.schema)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            raise ValueError(f"Chunk schema {table.schema} does not match the first chunk: {e}")
+        self._writer.write_table(table)
+
+    def close(self):
+        """
+        Finish the file. An empty stream still produces a valid, empty file.
+        """
+        if self._writer is None:
+            self.schema = pa.schema([])
+            self._sink = pa.OSFile(str(self.path), "wb")
+            self._writer = pa.ipc.new_file(self._sink, self.schema)
+        self._writer.close()
+        self._sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def read_metadata(path: Path, mmap: bool = True) -> pd.DataFrame:
+    """
+    Read a metadata sidecar as a DataFrame backed by Arrow memory.
+
+    With ``mmap`` the columns stay in the memory-mapped file rather than being
+    copied into Python objects, and missing values come back as ``None``.
+
+    Args:
+        path (Path): The Arrow IPC file.
+        mmap (bool): Memory-map the file instead of reading it into the heap.
+    Returns:
+        pd.DataFrame: The row metadata.
+    """
+    table = feather.read_table(path, memory_map=mmap)
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def save_snapshot(snapshot_dir: Path,
+                  vector_db: VectorDB,
+                  data: pd.DataFrame = None,
+                  manifest: dict = None,
+                  metadata_file: Path = None,
+                  lexical_index: BM25Index = None,
+                  row_state: dict = None) -> Path:
+    """
+    Persist a vector database and its row metadata as a snapshot.
+
+    Files are written to a temporary sibling directory that is renamed into
+    place, so a crash never leaves a half-written snapshot behind.
+
+    Args:
+        snapshot_dir (Path): The directory to write the snapshot to.
+        vector_db (VectorDB | ShardedVectorDB): The populated vector database.
+        data (pd.DataFrame, optional): The row metadata, positionally aligned with the index.
+        manifest (dict, optional): Extra fields to record in the manifest.
+        metadata_file (Path, optional): An already written sidecar (see ``MetadataWriter``)
+            to move into the snapshot instead of serializing ``data``.
+        lexical_index (BM25Index, optional): The lexical index built over the same rows.
+        row_state (dict, optional): Per-row arrays, e.g. ``row_ids`` and ``text_hashes``.
+    Returns:
+        Path: The snapshot directory.
+    """
+    if (data is None) == (metadata_file is None):
+        raise ValueError("Exactly one of data or metadata_file must be provided.")
+    snapshot_dir = Path(snapshot_dir)
+    staging_dir = snapshot_dir.with_name(snapshot_dir.name + ".tmp")
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    try:
+        vector_db.save(staging_dir)
+        if lexical_index is not None:
+            lexical_index.save(staging_dir / LEXICAL_DIR_NAME)
+        if row_state is not None:
+            np.savez(staging_dir / ROW_STATE_FILE_NAME, **row_state)
+        metadata_path = staging_dir / METADATA_FILE_NAME
+        if metadata_file is not None:
+            shutil.move(str(metadata_file), metadata_path)
+            table = feather.read_table(metadata_path, memory_map=True)
+            num_records, columns = table.num_rows, table.column_names
+        else:
+            # Uncompressed IPC so the sidecar can be memory-mapped on load
+            table = pa.Table.from_pandas(data, preserve_index=False)
+            feather.write_feather(table, metadata_path, compression="uncompressed")
+            num_records, columns = len(data), list(data.columns)
+        manifest = dict(manifest or {},
+                        format_version=SNAPSHOT_FORMAT_VERSION,
+                        num_records=num_records,
+                        columns=columns)
+        (staging_dir / MANIFEST_FILE_NAME).write_text(json.dumps(manifest, indent=2))
+
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+        staging_dir.rename(snapshot_dir)
+        logging.info(f"Snapshot saved to {snapshot_dir}")
+        return snapshot_dir
+    except Exception as e:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        logging.error(f"Failed to save snapshot to {snapshot_dir}: {e}")
+        raise
+
+
+def load_lexical_index(snapshot_dir: Path, mmap: bool = True):
+    """
+    Load the lexical index stored with a snapshot, if it has one.
+
+    Args:
+        snapshot_dir (Path): The snapshot directory.
+        mmap (bool): Memory-map the postings.
+    Returns:
+        BM25Index: The index, or None if the snapshot was saved without one.
+    """
+    lexical_dir = Path(snapshot_dir) / LEXICAL_DIR_NAME
+    if not lexical_dir.exists():
+        return None
+    return BM25Index.load(lexical_dir, mmap=mmap)
+
+
+def load_row_state(snapshot_dir: Path):
+    """
+    Load the per-row arrays stored with a snapshot, if it has them.
+
+    Args:
+        snapshot_dir (Path): The snapshot directory.
+    Returns:
+        dict: The arrays by name, or None if the snapshot was saved without them.
+    """
+    path = Path(snapshot_dir) / ROW_STATE_FILE_NAME
+    if not path.exists():
+        return None
+    with np.load(path) as arrays:
+        return {name: arrays[name] for name in arrays.files}
+
+
+def load_snapshot(snapshot_dir: Path, mmap: bool = True):
+    """
+    Load a snapshot written by ``save_snapshot``.
+
+    Args:
+        snapshot_dir (Path): The snapshot directory.
+        mmap (bool): Memory-map the index and the metadata sidecar.
+    Returns:
+        tuple: The restored ``VectorDB`` (or ``ShardedVectorDB``), the metadata ``pd.DataFrame``
+        and the manifest dict.
+    Raises:
+        FileNotFoundError: If the directory does not hold a complete snapshot.
+    """
+    snapshot_dir = Path(snapshot_dir)
+    if not snapshot_exists(snapshot_dir):
+        raise FileNotFoundError(f"No snapshot found at {snapshot_dir}")
+    manifest = json.loads((snapshot_dir / MANIFEST_FILE_NAME).read_text())
+    vector_db_class = ShardedVectorDB if is_sharded(snapshot_dir) else VectorDB
+    vector_db = vector_db_class.load(snapshot_dir, mmap=mmap)
+    data = read_metadata(snapshot_dir / METADATA_FILE_NAME, mmap=mmap)
+    logging.info(f"Snapshot with {len(data)} records loaded from {snapshot_dir}")
+    return vector_db, data, manifest
@@ -0,0 +1,155 @@
+"""
+Concurrent embedding pipeline used for ingestion.
+
+Batches are embedded by a thread pool with a bounded number of requests in
+flight, a token-bucket rate limit and exponential-backoff retries for rate
+limit (429) and server (5xx) errors. Results are handed to the index writer
+strictly in batch order, so FAISS insertion overlaps with the network calls
+for the batches behind it.
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Decide whether a failed embed call is worth retrying.
+
+    Args:
+        error (Exception): The exception raised by the embedding client.
+    Returns:
+        bool: True for rate limiting, server errors and transient network errors.
+    """
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting how many requests start per second.
+    """
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Args:
+            rate (float): Tokens added per second.
+            capacity (float, optional): Maximum burst size. Defaults to ``rate``.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        """
+        Block until ``tokens`` are available and take them.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class EmbeddingPipeline:
+    """
+    Embeds batches concurrently and delivers them in order to a sink.
+    """
+    def __init__(self,
+                 embedding_model,
+                 concurrency: int = 4,
+                 requests_per_second: float = None,
+                 max_retries: int = 5,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 30.0,
+                 embed_options: dict = None):
+        """
+        Args:
+            embedding_model: Client exposing ``embed(texts=...)``.
+            concurrency (int): Maximum number of embed requests in flight.
+            requests_per_second (float, optional): Rate limit for starting requests.
+            max_retries (int): Retries per batch for retryable errors.
+            backoff_base (float): First backoff delay in seconds; doubles on each retry.
+            backoff_max (float): Upper bound for a single backoff delay.
+            embed_options (dict, optional): Extra arguments of every ``embed`` call, e.g.
+                ``{"model": "embed-english-v3.0", "input_type": "search_document"}``.
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.embedding_model = embedding_model
+        self.concurrency = concurrency
+        self.rate_limiter = TokenBucket(requests_per_second) if requests_per_second else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.embed_options = embed_options or {}
+
+    def _embed_with_retry(self, texts: list) -> np.ndarray:
+        """
+        Embed one batch, retrying retryable failures with jittered exponential backoff.
+        """
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                response = self.embedding_model.embed(texts=texts, **self.embed_options)
+                return np.asarray(response.embeddings, dtype=np.float32)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                attempt += 1
+                logging.warning(f"Embed request failed ({e}); retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+
+    def run(self, batches, sink) -> int:
+        """
+        Embed every batch and pass the results to ``sink`` in input order.
+
+        Args:
+            batches (iterable): ``(batch_idx, texts)`` pairs. Consumed lazily, so it may be a generator.
+            sink (callable): Called as ``sink(batch_idx, embeddings)`` on the calling thread.
+        Returns:
+            int: The number of batches delivered.
+        Raises:
+            Exception: The first error that survived all retries. Outstanding requests are cancelled.
+        """
+        delivered = 0
+        pending = deque()
+        batches = iter(batches)
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ragsearch-embed") as executor:
+            try:
+                for batch_idx, texts in batches:
+                    pending.append((batch_idx, executor.submit(self._embed_with_retry, texts)))
+                    if len(pending) >= self.concurrency:
+                        head_idx, future = pending.popleft()
+                        sink(head_idx, future.result())
+                        delivered += 1
+                while pending:
+                    head_idx, future = pending.popleft()
+                    sink(head_idx, future.result())
+                    delivered += 1
+            except Exception:
+                for _, future in pending:
+                    future.cancel()
+                raise
+        return delivered
@@ -0,0 +1,354 @@
+"""
+Serving many datasets from one process.
+
+``EngineRegistry`` maps dataset names to engines and serves each one under
+``/datasets/<name>/`` with the routes of ``RagSearchEngine.create_app``
+(``/query``, ``/query/batch``, ``/answer``, ``/data-info``, ...). ``GET
+/datasets`` lists every dataset with its stats.
+
+Datasets are registered with a loader and only loaded on their first
+request. ``register_snapshot`` registers a persisted snapshot that is opened
+memory-mapped, so loading takes milliseconds and the pages are shared with
+other processes serving it. When ``memory_budget`` is set, the least
+recently used datasets are unloaded whenever the loaded ones exceed it;
+they load again on their next request. A dataset is never unloaded while
+it is serving a request.
+
+Serve a registry with ``SearchServer(registry=...)`` or ``registry.run()``.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+from . import metrics
+from .server import _ClosingBody
+
+
+class _Dataset:
+    """
+    A registered dataset: its loader and, once loaded, its engine and Flask app.
+    """
+    def __init__(self, name: str, loader):
+        self.name = name
+        self.loader = loader
+        self.engine = None
+        self.app = None
+        self.memory_bytes = 0
+        self.active = 0  # Requests using the engine
+        self.last_used = None
+        self.loads = 0
+        self.load_error = None
+        self.load_lock = threading.Lock()
+
+
+class EngineRegistry:
+    """
+    Lazily loaded, memory-budgeted set of named search engines behind one WSGI app.
+    """
+    def __init__(self, memory_budget: int = None, coalesce: bool = True, max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0, request_timeout: float = 30.0, max_pending: int = 1_024):
+        """
+        Args:
+            memory_budget (int, optional): Bytes the loaded datasets may use together (see
+                ``RagSearchEngine.memory_bytes``). Defaults to no limit.
+            coalesce (bool): Micro-batch concurrent ``/query`` requests of each dataset.
+            max_batch_size (int): Maximum number of queries coalesced into one batch.
+            max_wait_ms (float): Longest time a query waits for others to join its batch.
+            request_timeout (float): Seconds a coalesced search may take before the request fails with 504.
+            max_pending (int): Coalesced queries per dataset that may wait at once before requests fail with 503.
+        """
+        self.memory_budget = memory_budget
+        self.app_options = {"coalesce": coalesce, "max_batch_size": max_batch_size,
+                            "max_wait_ms": max_wait_ms, "request_timeout": request_timeout,
+                            "max_pending": max_pending}
+        self._datasets = OrderedDict()  # Least recently used first
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader):
+        """
+        Registers a dataset without loading it.
+
+        Args:
+            name (str): The dataset name, used in URLs.
+            loader (callable): Returns the dataset's ``RagSearchEngine``, e.g.
+                ``lambda: setup(path, key)``. Called on the first request, and again after an eviction.
+        Raises:
+            ValueError: If the name is empty, contains a slash or is already registered.
+        """
+        if not name or "/" in name:
+            raise ValueError(f"Invalid dataset name: {name!r}")
+        with self._lock:
+            if name in self._datasets:
+                raise ValueError(f"Dataset '{name}' is already registered.")
+            self._datasets[name] = _Dataset(name, loader)
+
+    def register_snapshot(self, name: str, snapshot_dir, embedding_model, llm_client=None, **engine_options):
+        """
+        Registers a persisted snapshot, opened memory-mapped on first use (see
+        ``RagSearchEngine.from_snapshot``).
+
+        Args:
+            name (str): The dataset name, used in URLs.
+            snapshot_dir (Path): The snapshot directory, ``save_dir/<fingerprint>``.
+            embedding_model (CohereClient): The client embedding queries.
+            llm_client (CohereClient): The client for ``/answer``.
+            **engine_options: Other ``RagSearchEngine`` arguments, e.g. ``result_cache``.
+        """
+        from .engine import RagSearchEngine
+
+        snapshot_dir = Path(snapshot_dir)
+        self.register(name, lambda: RagSearchEngine.from_snapshot(snapshot_dir, embedding_model, llm_client,
+                                                                  **engine_options))
+
+    def unregister(self, name: str):
+        """
+        Removes a dataset, unloading it first.
+        """
+        self.evict(name, force=True)
+        with self._lock:
+            self._datasets.pop(name, None)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._datasets
+
+    def __len__(self) -> int:
+        return len(self._datasets)
+
+    @property
+    def names(self) -> list:
+        with self._lock:
+            return sorted(self._datasets)
+
+    @property
+    def loaded(self) -> list:
+        """
+        Names of the loaded datasets, least recently used first.
+        """
+        with self._lock:
+            return [name for name, dataset in self._datasets.items() if dataset.engine is not None]
+
+    @property
+    def memory_bytes(self) -> int:
+        """
+        Estimated memory of the loaded datasets.
+        """
+        with self._lock:
+            return sum(dataset.memory_bytes for dataset in self._datasets.values() if dataset.engine is not None)
+
+    @contextmanager
+    def acquire(self, name: str):
+        """
+        Yields the dataset's engine, loading it if needed, and keeps it from being evicted
+        until the block exits.
+
+        Raises:
+            KeyError: If no dataset has this name.
+        """
+        dataset = self._checkout(name)
+        try:
+            yield dataset.engine
+        finally:
+            self._release(dataset)
+
+    def get(self, name: str):
+        """
+        Returns the dataset's engine, loading it if needed. Unlike ``acquire``, the engine
+        may be evicted (and closed) while the caller still uses it.
+
+        Raises:
+            KeyError: If no dataset has this name.
+        """
+        with self.acquire(name) as engine:
+            return engine
+
+    def _checkout(self, name: str) -> _Dataset:
+        """
+        Loads a dataset if needed and marks it in use and most recently used.
+        """
+        with self._lock:
+            dataset = self._datasets.get(name)
+            if dataset is None:
+                raise KeyError(name)
+            dataset.active += 1
+        try:
+            if dataset.engine is None:
+                self._load(dataset)
+        except BaseException:
+            self._release(dataset)
+            raise
+        with self._lock:
+            dataset.last_used = time.time()
+            if name in self._datasets:
+                self._datasets.move_to_end(name)
+        self._enforce_budget()
+        return dataset
+
+    def _release(self, dataset: _Dataset):
+        with self._lock:
+            dataset.active -= 1
+        self._enforce_budget()
+
+    def _load(self, dataset: _Dataset):
+        """
+        Runs the dataset's loader. Concurrent first requests wait for a single load,
+        and other datasets keep serving meanwhile.
+        """
+        with dataset.load_lock:
+            if dataset.engine is not None:
+                return
+            started = time.perf_counter()
+            try:
+                engine = dataset.loader()
+                app = engine.create_app(**self.app_options)
+            except Exception as e:
+                dataset.load_error = str(e)
+                logging.error(f"Failed to load dataset '{dataset.name}': {e}")
+                raise
+            with self._lock:
+                dataset.engine, dataset.app = engine, app
+                dataset.memory_bytes = engine.memory_bytes()
+                dataset.loads += 1
+                dataset.load_error = None
+            logging.info(f"Loaded dataset '{dataset.name}' in {time.perf_counter() - started:.2f}s "
+                         f"({dataset.memory_bytes / 2**20:.1f} MiB).")
+
+    def _enforce_budget(self):
+        """
+        Evicts idle datasets, least recently used first, until the loaded ones fit the budget.
+        """
+        if self.memory_budget is None:
+            return
+        while True:
+            with self._lock:
+                loaded = [dataset for dataset in self._datasets.values() if dataset.engine is not None]
+                if sum(dataset.memory_bytes for dataset in loaded) <= self.memory_budget:
+                    return
+                # The most recently used dataset stays even when it alone exceeds the budget
+                idle = [dataset for dataset in loaded[:-1] if dataset.active == 0]
+                if not idle:
+                    return
+                victim = idle[0]
+                engine = victim.engine
+                victim.engine, victim.app, victim.memory_bytes = None, None, 0
+            logging.info(f"Evicted dataset '{victim.name}' to stay within the memory budget.")
+            metrics.DATASET_EVICTIONS.inc()
+            engine.close()
+
+    def evict(self, name: str, force: bool = False) -> bool:
+        """
+        Unloads a dataset; it loads again on its next request.
+
+        Args:
+            name (str): The dataset name.
+            force (bool): Unload it even while it is serving requests.
+        Returns:
+            bool: True if the dataset was loaded and has been unloaded.
+        """
+        with self._lock:
+            dataset = self._datasets.get(name)
+            if dataset is None or dataset.engine is None or (dataset.active and not force):
+                return False
+            engine = dataset.engine
+            dataset.engine, dataset.app, dataset.memory_bytes = None, None, 0
+        engine.close()
+        return True
+
+    def info(self, name: str) -> dict:
+        """
+        The stats of one dataset. Row counts and columns are only known once it is loaded.
+
+        Raises:
+            KeyError: If no dataset has this name.
+        """
+        with self._lock:
+            dataset = self._datasets[name]
+            engine = dataset.engine
+            stats = {"name": name, "loaded": engine is not None, "memory_bytes": dataset.memory_bytes,
+                     "last_used": dataset.last_used, "loads": dataset.loads}
+        if dataset.load_error:
+            stats["error"] = dataset.load_error
+        if engine is not None:
+            stats.update({"file_name": engine.file_name, "num_records": len(engine.data),
+                          "columns": list(engine.data.columns)})
+            if engine.vector_db is not None:
+                stats["num_vectors"] = int(engine.vector_db.ntotal)
+        return stats
+
+    def update_metrics(self):
+        """
+        Refreshes the gauges describing the loaded datasets.
+        """
+        metrics.DATASETS_LOADED.set(len(self.loaded))
+        metrics.DATASETS_MEMORY_BYTES.set(self.memory_bytes)
+
+    @staticmethod
+    def _respond(start_response, status: str, payload: dict, headers: list = ()):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        start_response(status, [("Content-Type", "application/json"),
+                                ("Content-Length", str(len(body)))] + list(headers))
+        return [body]
+
+    def wsgi_app(self, environ, start_response):
+        """
+        The WSGI entry point: ``/datasets``, ``/metrics`` and each dataset's routes under ``/datasets/<name>/``.
+        """
+        path = environ.get("PATH_INFO", "")
+        if path in ("/datasets", "/datasets/"):
+            return self._respond(start_response, "200 OK", {"datasets": [self.info(name) for name in self.names]})
+        if path == "/metrics":
+            self.update_metrics()
+            body = metrics.REGISTRY.render().encode("utf-8")
+            start_response("200 OK", [("Content-Type", metrics.CONTENT_TYPE), ("Content-Length", str(len(body)))])
+            return [body]
+        if not path.startswith("/datasets/"):
+            return self._respond(start_response, "404 Not Found", {"error": f"Not found: {path}"})
+
+        name, slash, rest = path[len("/datasets/"):].partition("/")
+        if name not in self:
+            return self._respond(start_response, "404 Not Found", {"error": f"Unknown dataset: {name}"})
+        if not slash:
+            # The web interface fetches relative URLs, which need the trailing slash
+            location = environ.get("SCRIPT_NAME", "") + path + "/"
+            return self._respond(start_response, "308 Permanent Redirect", {"location": location},
+                                 [("Location", location)])
+        try:
+            dataset = self._checkout(name)
+        except KeyError:
+            return self._respond(start_response, "404 Not Found", {"error": f"Unknown dataset: {name}"})
+        except Exception as e:
+            return self._respond(start_response, "503 Service Unavailable",
+                                 {"error": f"Dataset '{name}' failed to load: {e}"})
+        environ = dict(environ, SCRIPT_NAME=environ.get("SCRIPT_NAME", "") + f"/datasets/{name}",
+                       PATH_INFO="/" + rest)
+        try:
+            body = dataset.app(environ, start_response)
+        except BaseException:
+            self._release(dataset)
+            raise
+        # Streamed answers keep the dataset loaded until the response is fully sent
+        return _ClosingBody(body, lambda: self._release(dataset))
+
+    def close(self):
+        """
+        Unloads every dataset.
+        """
+        for name in self.names:
+            self.evict(name, force=True)
+
+    def run(self, host: str = "0.0.0.0", port: int = 8080, graceful_timeout: float = 30.0):
+        """
+        Serves the registry from a background thread; call ``stop()`` on the returned server to shut it down.
+
+        Returns:
+            SearchServer: The running server.
+        """
+        from .server import SearchServer
+
+        server = SearchServer(registry=self, host=host, port=port,
+                              request_timeout=self.app_options["request_timeout"],
+                              graceful_timeout=graceful_timeout)
+        return server.start()
@@ -0,0 +1,207 @@
+"""
+Cache of search results in front of the embedding API and the ANN index.
+
+``QueryResultCache`` has two tiers:
+
+- an exact tier keyed on the preprocessed query text plus every search
+  parameter (``top_k``, filters, mode, columns, ...). A hit skips both the
+  embed call and the index search;
+- an optional semantic tier that, once a query has been embedded, reuses the
+  results of a cached query whose embedding is within a cosine-similarity
+  threshold of it (e.g. "red mugs" and "red mug"). A hit skips the index
+  search only.
+
+Both tiers evict least recently used entries beyond their capacity and expire
+entries after a TTL. Every lookup carries the index version; when it changes
+(rows were added, replaced or deleted) the whole cache is dropped, so results
+never outlive the data they were computed from.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+_NO_VERSION = object()
+
+
+def result_cache_key(text: str, params: dict) -> str:
+    """
+    Build the exact-tier key of a query.
+
+    Args:
+        text (str): The query as sent to the embedding model (see ``preprocess_search_text``).
+        params (dict): Every other argument that changes the results, e.g. ``top_k`` and ``filters``.
+    Returns:
+        str: The cache key.
+    """
+    return json.dumps([text, params], sort_keys=True, default=str)
+
+
+class QueryResultCache:
+    """
+    Exact and semantic result cache with LRU eviction, a TTL and index-version invalidation.
+    """
+    def __init__(self, capacity: int = 10_000, ttl: float = 300.0, semantic_threshold: float = None,
+                 semantic_capacity: int = 1_000, clock=time.monotonic):
+        """
+        Args:
+            capacity (int): Entries kept in the exact tier.
+            ttl (float): Seconds an entry stays valid. ``None`` keeps entries until evicted.
+            semantic_threshold (float, optional): Minimum cosine similarity between two query
+                embeddings for the semantic tier to reuse results, e.g. ``0.97``. Defaults to no semantic tier.
+            semantic_capacity (int): Entries kept in the semantic tier. Every semantic lookup
+                scans them, so keep this in the low thousands.
+            clock (callable): Returns the current time in seconds; injectable for tests.
+        """
+        if capacity <= 0 or semantic_capacity <= 0:
+            raise ValueError("capacity must be a positive integer")
+        if semantic_threshold is not None and not 0 < semantic_threshold <= 1:
+            raise ValueError("semantic_threshold must be in (0, 1]")
+        self.capacity = capacity
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+        self.semantic_capacity = semantic_capacity
+        self.clock = clock
+        self.version = _NO_VERSION
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._exact = OrderedDict()  # key -> (expires, results)
+        self._semantic = OrderedDict()  # (group, key) -> (expires, unit embedding, results)
+        self._matrices = {}  # group -> (keys, stacked embeddings), rebuilt after changes
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        # Called with the lock held
+        if version != self.version:
+            self._exact.clear()
+            self._semantic.clear()
+            self._matrices.clear()
+            self.version = version
+
+    def _expires(self) -> float:
+        return self.clock() + self.ttl if self.ttl is not None else float("inf")
+
+    def get(self, key: str, version=None):
+        """
+        Looks a query up in the exact tier.
+
+        Args:
+            key (str): The key from ``result_cache_key``.
+            version: The current index version.
+        Returns:
+            The cached results, or None on a miss.
+        """
+        with self._lock:
+            self._check_version(version)
+            entry = self._exact.get(key)
+            if entry is not None and entry[0] > self.clock():
+                self._exact.move_to_end(key)
+                self.exact_hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._exact[key]
+            return None
+
+    def get_similar(self, group: str, embedding, version=None):
+        """
+        Looks a query up in the semantic tier by its embedding.
+
+        Args:
+            group (str): The key of the search parameters other than the text; only entries
+                searched with the same parameters are considered.
+            embedding (array-like): The query embedding.
+            version: The current index version.
+        Returns:
+            The results of the most similar cached query above the threshold, or None.
+        """
+        if self.semantic_threshold is None:
+            return None
+        query = _unit(embedding)
+        with self._lock:
+            self._check_version(version)
+            keys, matrix = self._group_matrix(group)
+            if not keys or matrix.shape[1] != len(query):
+                return None
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.semantic_threshold:
+                return None
+            entry_key = (group, keys[best])
+            entry = self._semantic.get(entry_key)
+            if entry is None or entry[0] <= self.clock():
+                self._semantic.pop(entry_key, None)
+                self._matrices.pop(group, None)
+                return None
+            self._semantic.move_to_end(entry_key)
+            self.semantic_hits += 1
+            return entry[2]
+
+    def _group_matrix(self, group: str):
+        cached = self._matrices.get(group)
+        if cached is None:
+            keys = [key for entry_group, key in self._semantic if entry_group == group]
+            vectors = [self._semantic[(group, key)][1] for key in keys]
+            matrix = np.stack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+            cached = self._matrices[group] = (keys, matrix)
+        return cached
+
+    def put(self, key: str, results, version=None, group: str = None, embedding=None):
+        """
+        Stores the results of a query.
+
+        Args:
+            key (str): The key from ``result_cache_key``.
+            results: The results to cache. They are returned as-is on a hit, so callers must not mutate them.
+            version: The index version the results were computed against. Results computed
+                against an older version than the cache's are dropped.
+            group (str, optional): The semantic-tier group (see ``get_similar``).
+            embedding (array-like, optional): The query embedding, to store the results in the semantic tier too.
+        """
+        expires = self._expires()
+        with self._lock:
+            if self.version is _NO_VERSION:
+                self.version = version
+            if version != self.version:
+                return
+            self._exact[key] = (expires, results)
+            self._exact.move_to_end(key)
+            while len(self._exact) > self.capacity:
+                self._exact.popitem(last=False)
+            if self.semantic_threshold is None or embedding is None or group is None:
+                return
+            self._semantic[(group, key)] = (expires, _unit(embedding), results)
+            self._semantic.move_to_end((group, key))
+            self._matrices.pop(group, None)
+            while len(self._semantic) > self.semantic_capacity:
+                (evicted_group, _), _ = self._semantic.popitem(last=False)
+                self._matrices.pop(evicted_group, None)
+
+    def record_miss(self, count: int = 1):
+        with self._lock:
+            self.misses += count
+
+    def clear(self):
+        """
+        Drops every entry.
+        """
+        with self._lock:
+            self._exact.clear()
+            self._semantic.clear()
+            self._matrices.clear()
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self._exact)
+
+
+def _unit(embedding) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,298 @@
+"""
+Production serving for the RAG search engine.
+
+``SearchServer`` wraps the engine's Flask app with liveness (``/health``) and
+readiness (``/ready``) endpoints, Prometheus metrics (``/metrics``), request
+timeouts and graceful shutdown.
+With ``workers=1`` it serves from a threaded WSGI server inside the current
+process. With ``workers > 1`` it runs under gunicorn (an optional
+dependency). Each worker then loads the engine itself through
+``engine_loader``. When the loader warm-starts from a persisted snapshot, the
+workers memory-map the same index files, so they share one copy of the index
+through the page cache. To serve many datasets from one server, pass an
+``EngineRegistry`` as ``registry``.
+"""
+import json
+import logging
+import signal
+import threading
+import time
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from . import metrics
+
+
+class SearchServer:
+    """
+    Serves a ``RagSearchEngine`` with readiness reporting and graceful shutdown.
+    """
+    def __init__(self,
+                 engine=None,
+                 engine_loader=None,
+                 registry=None,
+                 host: str = "0.0.0.0",
+                 port: int = 8080,
+                 workers: int = 1,
+                 threads: int = 8,
+                 request_timeout: float = 30.0,
+                 graceful_timeout: float = 30.0,
+                 coalesce: bool = True,
+                 max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0,
+                 max_pending: int = 1_024):
+        """
+        Args:
+            engine (RagSearchEngine, optional): An already initialized engine.
+            engine_loader (callable, optional): Returns an engine, e.g. ``lambda: setup(path, key)``.
+                The server starts answering ``/health`` immediately and reports ready once
+                the loader returns.
+            registry (EngineRegistry, optional): Serve these datasets under ``/datasets/<name>/``
+                instead of a single engine. Each worker loads datasets on their first request.
+            host (str): Interface to bind.
+            port (int): Port to bind.
+            workers (int): Number of worker processes. More than one requires gunicorn.
+            threads (int): Request threads per gunicorn worker.
+            request_timeout (float): Seconds a search may take before the request fails with 504,
+                and the socket timeout for slow clients.
+            graceful_timeout (float): Seconds to wait for in-flight requests on shutdown.
+            coalesce (bool): Micro-batch concurrent ``/query`` requests.
+            max_batch_size (int): Maximum number of queries coalesced into one batch.
+            max_wait_ms (float): Longest time a query waits for others to join its batch.
+            max_pending (int): Coalesced queries that may wait at once before requests fail with 503.
+        Raises:
+            ValueError: If none of engine, loader or registry is given, or workers > 1 with an engine.
+        """
+        if engine is None and engine_loader is None and registry is None:
+            raise ValueError("One of engine, engine_loader or registry must be provided.")
+        if workers > 1 and engine_loader is None and registry is None:
+            raise ValueError("workers > 1 requires engine_loader so each worker can map the index itself.")
+        self.engine = engine
+        self.engine_loader = engine_loader
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.request_timeout = request_timeout
+        self.graceful_timeout = graceful_timeout
+        self.app_options = {"coalesce": coalesce, "max_batch_size": max_batch_size,
+                            "max_wait_ms": max_wait_ms, "request_timeout": request_timeout,
+                            "max_pending": max_pending}
+        self.load_error = None
+        self._app = None
+        self._draining = False
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self._loader_thread = None
+        if engine is not None:
+            self._app = engine.create_app(**self.app_options)
+        elif registry is not None:
+            self._app = registry.wsgi_app
+
+    @property
+    def ready(self) -> bool:
+        """
+        True once the engine (and therefore its index) is loaded and the server is not draining.
+        """
+        return self._app is not None and not self._draining
+
+    def _load_engine(self):
+        """
+        Runs ``engine_loader`` and publishes the engine's app once it returns.
+        """
+        try:
+            started = time.perf_counter()
+            engine = self.engine_loader()
+            self._app = engine.create_app(**self.app_options)
+            self.engine = engine
+            logging.info(f"Engine loaded in {time.perf_counter() - started:.2f}s; server is ready.")
+        except Exception as e:
+            self.load_error = str(e)
+            logging.error(f"Failed to load the search engine: {e}")
+
+    def _start_loading(self):
+        """
+        Loads the engine in the background if it was not passed in.
+        """
+        if self._app is None and self._loader_thread is None:
+            self._loader_thread = threading.Thread(target=self._load_engine, name="ragsearch-engine-loader",
+                                                   daemon=True)
+            self._loader_thread.start()
+
+    @staticmethod
+    def _json_response(start_response, status: str, payload: dict):
+        """
+        Writes a small JSON response without going through Flask.
+        """
+        body = json.dumps(payload).encode("utf-8")
+        start_response(status, [("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+        return [body]
+
+    def wsgi_app(self, environ, start_response):
+        """
+        The WSGI entry point: health and readiness checks, then the engine's Flask app.
+        """
+        path = environ.get("PATH_INFO", "")
+        if path == "/health":
+            return self._json_response(start_response, "200 OK", {"status": "ok"})
+        if path == "/ready":
+            payload = {"ready": self.ready, "draining": self._draining}
+            if self.engine is not None and self.engine.vector_db is not None:
+                payload["num_vectors"] = int(self.engine.vector_db.ntotal)
+            if self.registry is not None:
+                payload["datasets"] = len(self.registry)
+                payload["datasets_loaded"] = len(self.registry.loaded)
+            if self.load_error:
+                payload["error"] = self.load_error
+            return self._json_response(start_response, "200 OK" if self.ready else "503 Service Unavailable",
+                                       payload)
+        if path == "/metrics" and self._app is None:
+            # Scrapes keep working while the index loads; the engine's gauges appear once it is ready
+            body = metrics.REGISTRY.render().encode("utf-8")
+            start_response("200 OK", [("Content-Type", metrics.CONTENT_TYPE), ("Content-Length", str(len(body)))])
+            return [body]
+        if not self.ready:
+            return self._json_response(start_response, "503 Service Unavailable",
+                                       {"error": "The search index is not loaded yet."})
+
+        with self._in_flight_lock:
+            self._in_flight += 1
+        try:
+            body = self._app(environ, start_response)
+        except BaseException:
+            self._request_done()
+            raise
+        # The request is done once the server closes the body, after streaming it
+        return _ClosingBody(body, self._request_done)
+
+    def _request_done(self):
+        with self._in_flight_lock:
+            self._in_flight -= 1
+
+    def start(self) -> "SearchServer":
+        """
+        Starts serving in a background thread (single process only) and returns immediately.
+
+        Returns:
+            SearchServer: self, so ``server = SearchServer(...).start()`` works.
+        """
+        if self.workers > 1:
+            raise RuntimeError("Multi-worker serving runs in the foreground; use serve_forever().")
+        self._start_loading()
+        request_timeout = self.request_timeout
+
+        class _TimeoutRequestHandler(WSGIRequestHandler):
+            # Socket timeout so idle or slow clients cannot pin a thread forever
+            timeout = request_timeout
+
+        self._server = make_server(self.host, self.port, self.wsgi_app, threaded=True,
+                                   request_handler=_TimeoutRequestHandler)
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever, name="ragsearch-server", daemon=True)
+        self._thread.start()
+        logging.info(f"Serving on http://{self.host}:{self.port}")
+        return self
+
+    def serve_forever(self):
+        """
+        Serves in the foreground until SIGINT/SIGTERM, then shuts down gracefully.
+
+        With ``workers > 1`` this hands over to gunicorn, which handles signals itself.
+        """
+        if self.workers > 1:
+            self._serve_with_gunicorn()
+            return
+        self.start()
+        stopped = threading.Event()
+
+        def handle_signal(signum, frame):
+            logging.info(f"Received signal {signum}; shutting down...")
+            stopped.set()
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, handle_signal)
+        stopped.wait()
+        self.stop()
+
+    def stop(self, timeout: float = None):
+        """
+        Stops accepting requests, waits for in-flight ones and releases the engine's worker threads.
+
+        Args:
+            timeout (float, optional): Seconds to wait for in-flight requests. Defaults to ``graceful_timeout``.
+        """
+        timeout = self.graceful_timeout if timeout is None else timeout
+        self._draining = True
+        if self._server is not None:
+            self._server.shutdown()
+        deadline = time.monotonic() + timeout
+        while self._in_flight and time.monotonic() < deadline:
+            time.sleep(0.01)
+        if self._in_flight:
+            logging.warning(f"Shutting down with {self._in_flight} requests still in flight.")
+        if self.engine is not None and self.engine.coalescer is not None:
+            self.engine.coalescer.close()
+            self.engine.coalescer = None
+        if self.registry is not None:
+            self.registry.close()
+        if self._server is not None:
+            self._server.server_close()
+            self._thread.join(timeout=1.0)
+            self._server = None
+        logging.info("Server stopped.")
+
+    def _serve_with_gunicorn(self):
+        """
+        Runs the server under gunicorn with one engine per worker process.
+        """
+        try:
+            from gunicorn.app.base import BaseApplication
+        except ImportError:
+            raise ImportError("Serving with workers > 1 requires gunicorn: pip install gunicorn")
+
+        server = self
+        options = {
+            "bind": f"{self.host}:{self.port}",
+            "workers": self.workers,
+            "worker_class": "gthread",
+            "threads": self.threads,
+            "timeout": max(1, int(self.request_timeout * 2)),
+            "graceful_timeout": int(self.graceful_timeout),
+            # Load the engine after the fork so no threads or FAISS state cross it
+            "preload_app": False,
+        }
+
+        class _GunicornApplication(BaseApplication):
+            def load_config(self):
+                for key, value in options.items():
+                    self.cfg.set(key, value)
+
+            def load(self):
+                server._start_loading()
+                return server.wsgi_app
+
+        _GunicornApplication().run()
+
+
+class _ClosingBody:
+    """
+    Wraps a WSGI response body to run a callback when the server closes it, so a
+    graceful shutdown also waits for streamed responses such as ``/answer``.
+    """
+    def __init__(self, body, on_close):
+        self._body = body
+        self._on_close = on_close
+
+    def __iter__(self):
+        return iter(self._body)
+
+    def close(self):
+        try:
+            close = getattr(self._body, "close", None)
+            if close is not None:
+                close()
+        finally:
+            self._on_close()
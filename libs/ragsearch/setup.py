@@ -18,24 +18,81 @@ Example usage (ChromaDB):
 
 The returned RagSearchEngine instance will use the selected backend for queries.
 """
+import itertools
 import os
 from pathlib import Path
-import pandas as pd
-from cohere import Client as CohereClient
-from .vector_db import VectorDB, query_chromadb
-from .engine import RagSearchEngine
 
 def setup(data_path: Path,
           llm_api_key: str,
           use_chromadb: bool = False,
           chromadb_sqlite_path: str = None,
-          chromadb_collection_name: str = None):
+          chromadb_collection_name: str = None,
+          chromadb_query_embeddings: bool = False,
+          save_dir: str = "embeddings",
+          use_snapshot: bool = True,
+          use_embedding_cache: bool = True,
+          use_result_cache: bool = True,
+          result_cache_ttl: float = 300.0,
+          semantic_cache_threshold: float = None,
+          stream: bool = False,
+          chunk_size: int = 50_000,
+          columns: list = None,
+          filters=None,
+          text_columns: list = None,
+          column_prefixes: dict = None,
+          max_text_tokens: int = None,
+          index_spec: str = "Flat",
+          precision: str = "float32",
+          rerank_factor: int = None,
+          embedding_dim: int = None,
+          embedding_model_name: str = None,
+          num_shards: int = None,
+          lexical: bool = True,
+          id_column: str = None):
     """
     Initializes the RAG search engine.
 
     Args:
         data_path (Path): The path to the data file.
         llm_api_key (str): The API key for the Cohere client.
+        chromadb_query_embeddings (bool): Embed ChromaDB queries with Cohere and query by
+            vector instead of by text, for collections built with Cohere embeddings.
+        save_dir (str): Directory where FAISS snapshots are persisted.
+        use_snapshot (bool): Reuse a persisted FAISS index for unchanged data
+            instead of re-embedding it on every start.
+        use_embedding_cache (bool): Cache embeddings in memory and in a SQLite file
+            under ``save_dir`` so repeated texts and queries skip the API.
+        use_result_cache (bool): Cache search results so repeated queries skip the embed call
+            and the index search until the data changes.
+        result_cache_ttl (float): Seconds a cached result stays valid.
+        semantic_cache_threshold (float): Also reuse the results of a cached query whose embedding
+            has at least this cosine similarity to the new query's, e.g. ``0.97``. Off by default.
+        stream (bool): Read the file in chunks and ingest them one at a time, keeping
+            peak memory bounded by ``chunk_size`` instead of the file size (FAISS only).
+        chunk_size (int): Rows per chunk when streaming.
+        columns (list): Only read these columns from the file; ``text_columns`` and ``id_column``
+            are always read. Skipping unused columns of wide tables cuts load time and memory.
+        filters (list): Only index the rows matching this predicate, in pyarrow's DNF form, e.g.
+            ``[("in_stock", "==", True)]``. Pushed down to skip row groups for Parquet files.
+        text_columns (list): Allowlist of columns to embed; defaults to every string column.
+        column_prefixes (dict): Per-column text prepended to each value before embedding.
+        max_text_tokens (int): Truncate each embedded text to roughly this many tokens.
+        index_spec (str): FAISS index type, e.g. ``"Flat"`` (exact), ``"HNSW32"`` or
+            ``"IVF4096,PQ64"``. Indexes that need training are trained during ingestion.
+        precision (str): Store vectors as ``"float32"``, ``"float16"`` or ``"int8"`` to cut index
+            memory 2x or 4x.
+        rerank_factor (int): Keep float32 vectors on disk and rescore this many times ``top_k``
+            candidates exactly, recovering the accuracy lost to reduced precision.
+        embedding_dim (int): The embedding dimension. Defaults to the dimension of the first
+            embeddings returned by the model.
+        embedding_model_name (str): The Cohere embedding model, e.g. ``"embed-english-v3.0"``.
+            Defaults to the client's default model. Snapshots and cached embeddings are kept
+            per model, so switching models (or dimensions) never reuses the old vectors.
+        num_shards (int): Partition the FAISS index across this many shards that are searched
+            in parallel (see ``ShardedVectorDB``). Defaults to a single index.
+        lexical (bool): Build a BM25 keyword index for ``mode="lexical"`` and ``mode="hybrid"`` search.
+        id_column (str): Column holding a stable primary key per row. When the file changes, the
+            previous snapshot is refreshed by key and only added or edited rows are re-embedded.
     Returns:
         RagSearchEngine: The initialized RAG search engine.
     Raises:
@@ -44,33 +101,56 @@ def setup(data_path: Path,
         RuntimeError: If there is an error loading the data,
         initializing the Cohere client, or connecting to the vector database.
     """
+    # Imported here so that ``import ragsearch`` stays cheap for code that never calls setup()
+    import pandas as pd
+    from .engine import RagSearchEngine
+    from .embedding_cache import EmbeddingCache
+    from .result_cache import QueryResultCache
+    from .loaders import load_data, iter_data_chunks
+    from .persistence import dataset_fingerprint, dataset_key
+    from .utils import extract_textual_columns
+    from .sharding import ShardedVectorDB
+    from .vector_db import VectorDB
+
     print("Starting setup of the RAG Search Engine...")
 
     # Validate data path
     if not data_path.exists():
         raise FileNotFoundError(f"Data path does not exist: {data_path}")
 
+    # Stream only into FAISS; the ChromaDB backend serves from its own collection
+    stream = stream and not use_chromadb
+
+    # Always read the columns the engine needs, whatever the projection
+    if columns is not None:
+        needed = list(text_columns or []) + ([id_column] if id_column else [])
+        columns = list(columns) + [column for column in needed if column not in columns]
+
     # Load data
     try:
         # Get file name of the data_path
         file_name = data_path.name
-        if data_path.suffix == '.csv':
-            data = pd.read_csv(data_path)
-        elif data_path.suffix == '.json':
-            data = pd.read_json(data_path)
-        elif data_path.suffix in ['.parquet', '.pq']:
-            data = pd.read_parquet(data_path)
+        if stream:
+            chunks = iter_data_chunks(data_path, chunk_size=chunk_size, columns=columns, filters=filters)
+            first_chunk = next(chunks, pd.DataFrame())
+            textual_columns = extract_textual_columns(first_chunk, include=text_columns)
+            data = itertools.chain([first_chunk], chunks)
         else:
-            raise ValueError(f"Unsupported file type: {data_path.suffix}")
+            data = load_data(data_path, columns=columns, filters=filters)
+            textual_columns = extract_textual_columns(data, include=text_columns)
     except Exception as e:
         raise RuntimeError(f"Failed to load data: {e}")
 
     # Initialize Cohere client
     try:
+        from cohere import Client as CohereClient
         llm_client = CohereClient(api_key=llm_api_key)
     except Exception as e:
         raise RuntimeError(f"Failed to initialize Cohere client: {e}")
 
+    result_cache = QueryResultCache(ttl=result_cache_ttl, semantic_threshold=semantic_cache_threshold) \
+        if use_result_cache else None
+
     # Connect to vector database or ChromaDB
     if use_chromadb:
         if not chromadb_sqlite_path or not chromadb_collection_name:
@@ -82,19 +162,52 @@ def setup(data_path: Path,
             vector_db=None,
             file_name=file_name,
             chromadb_sqlite_path=chromadb_sqlite_path,
-            chromadb_collection_name=chromadb_collection_name
+            chromadb_collection_name=chromadb_collection_name,
+            chromadb_query_embeddings=chromadb_query_embeddings,
+            result_cache=result_cache,
+            embedding_model_name=embedding_model_name
         )
     else:
         try:
-            vector_db = VectorDB(embedding_dim=4096)
+            if num_shards:
+                vector_db = ShardedVectorDB(num_shards, embedding_dim=embedding_dim, index_spec=index_spec,
+                                            precision=precision, rerank_factor=rerank_factor)
+            else:
+                vector_db = VectorDB(embedding_dim=embedding_dim, index_spec=index_spec, precision=precision,
+                                     rerank_factor=rerank_factor)
         except Exception as e:
             raise RuntimeError(f"Failed to connect to vector database: {e}")
+        options = {"column_prefixes": column_prefixes, "max_text_tokens": max_text_tokens}
+        if index_spec != "Flat":
+            options["index_spec"] = index_spec
+        if precision != "float32":
+            options["precision"] = precision
+        options["rerank_factor"] = rerank_factor
+        options["num_shards"] = num_shards
+        options["columns"] = columns
+        options["filters"] = str(filters) if filters is not None else None
+        options["embedding_model"] = embedding_model_name
+        fingerprint = dataset_fingerprint(data_path, textual_columns, options) if use_snapshot else None
+        refresh_key = dataset_key(file_name, textual_columns, options) if use_snapshot else None
+        embedding_cache = EmbeddingCache(disk_path=Path(save_dir) / "embedding_cache.sqlite3") \
+            if use_embedding_cache else None
         engine = RagSearchEngine(
             data=data,
             embedding_model=llm_client,
             llm_client=llm_client,
             vector_db=vector_db,
-            file_name=file_name
+            save_dir=save_dir,
+            file_name=file_name,
+            fingerprint=fingerprint,
+            embedding_cache=embedding_cache,
+            text_columns=text_columns,
+            column_prefixes=column_prefixes,
+            max_text_tokens=max_text_tokens,
+            lexical=lexical,
+            id_column=id_column,
+            dataset_key=refresh_key,
+            result_cache=result_cache,
+            embedding_model_name=embedding_model_name
         )
 
     print("Setup complete.")
@@ -0,0 +1,378 @@
+"""
+A FAISS vector database partitioned across several shards.
+
+``ShardedVectorDB`` splits the id space over ``num_shards`` independent
+``VectorDB`` instances and searches them in parallel on a thread pool. FAISS
+releases the GIL while it scans, so one query keeps several cores busy
+instead of one. Each shard returns its own top-k; the per-shard lists are
+merged with a heap into the global top-k, and ids and scores come back in
+the same form as ``VectorDB`` returns them.
+
+Ids are assigned to shards by a fixed rule, so no lookup table is needed:
+
+- ``"hash"``: shard ``id % num_shards``, which spreads every batch evenly;
+- ``"range"``: consecutive blocks of ``range_size`` ids per shard, the last
+  shard taking everything beyond.
+
+Every shard is saved to its own sub-directory and can be loaded on its own
+(``ShardedVectorDB.load(directory, shards=[...])``), so shards can later be
+served from separate processes or nodes.
+"""
+import heapq
+import itertools
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .metrics import log_query
+from .vector_db import VectorDB
+
+SHARDS_FILE_NAME = "shards.json"
+PARTITIONS = ("hash", "range")
+
+
+def is_sharded(directory) -> bool:
+    """
+    Check whether a directory holds a ``ShardedVectorDB`` rather than a single ``VectorDB``.
+    """
+    return (Path(directory) / SHARDS_FILE_NAME).exists()
+
+
+def shard_dir_name(shard: int) -> str:
+    return f"shard-{shard:03d}"
+
+
+class ShardedVectorDB:
+    def __init__(self, num_shards: int, embedding_dim: int = None, partition: str = "hash",
+                 range_size: int = None, max_workers: int = None, **vector_db_options):
+        """
+        Initializes ``num_shards`` empty FAISS indexes.
+
+        Args:
+            num_shards (int): The number of shards.
+            embedding_dim (int, optional): The embedding dimension. Defaults to the dimension of the
+                first batch added.
+            partition (str): ``"hash"`` (id modulo ``num_shards``) or ``"range"`` (blocks of ``range_size`` ids).
+            range_size (int, optional): Ids per shard for range partitioning.
+            max_workers (int, optional): Threads searching shards in parallel. Defaults to ``num_shards``.
+            **vector_db_options: Passed to every shard's ``VectorDB``, e.g. ``index_spec``,
+                ``precision`` or ``rerank_factor``.
+        Raises:
+            ValueError: If the shard count or the partitioning is invalid.
+        """
+        if not isinstance(num_shards, int) or num_shards < 1:
+            raise ValueError("num_shards must be a positive integer")
+        if partition not in PARTITIONS:
+            raise ValueError(f"partition must be one of {PARTITIONS}, got '{partition}'")
+        if partition == "range" and (not isinstance(range_size, int) or range_size < 1):
+            raise ValueError("range partitioning needs a positive integer range_size")
+        self.num_shards = num_shards
+        self.partition = partition
+        self.range_size = range_size if partition == "range" else None
+        self.max_workers = max_workers
+        self.shards = [VectorDB(embedding_dim=embedding_dim, **vector_db_options) for _ in range(num_shards)]
+        self.current_id = 0
+        self._executor = None
+        logging.info(f"Sharded VectorDB initialized with {num_shards} shards ({partition} partitioning)")
+
+    @property
+    def embedding_dim(self) -> int:
+        return next((shard.embedding_dim for shard in self._loaded() if shard.embedding_dim), None)
+
+    @property
+    def index_spec(self) -> str:
+        return next(shard.index_spec for shard in self._loaded())
+
+    @property
+    def precision(self) -> str:
+        return next(shard.precision for shard in self._loaded())
+
+    @property
+    def rerank_factor(self) -> int:
+        return next(shard.rerank_factor for shard in self._loaded())
+
+    @property
+    def ntotal(self) -> int:
+        """
+        The number of vectors in the loaded shards, including tombstoned ones.
+        """
+        return sum(shard.ntotal for shard in self._loaded())
+
+    @property
+    def read_only(self) -> bool:
+        return any(shard.read_only for shard in self._loaded())
+
+    def _loaded(self):
+        return [shard for shard in self.shards if shard is not None]
+
+    def shard_of(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Returns the shard holding each id.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if self.partition == "hash":
+            return ids % self.num_shards
+        return np.minimum(ids // self.range_size, self.num_shards - 1)
+
+    def _local_ids(self, shard: int, ids: np.ndarray) -> np.ndarray:
+        """
+        Converts global ids held by a shard into that shard's positional ids.
+        """
+        if self.partition == "hash":
+            return ids // self.num_shards
+        return ids - shard * self.range_size
+
+    def _global_ids(self, shard: int, local_ids: np.ndarray) -> np.ndarray:
+        """
+        Converts a shard's positional ids back into global ids.
+        """
+        if self.partition == "hash":
+            return local_ids * self.num_shards + shard
+        return local_ids + shard * self.range_size
+
+    def _shard(self, shard: int) -> VectorDB:
+        vector_db = self.shards[shard]
+        if vector_db is None:
+            raise RuntimeError(f"Shard {shard} is not loaded.")
+        return vector_db
+
+    def _map(self, fn, shards: list) -> list:
+        """
+        Runs ``fn(shard)`` for every shard number on the thread pool and returns the results in order.
+        """
+        if len(shards) <= 1:
+            return [fn(shard) for shard in shards]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers or self.num_shards,
+                                                thread_name_prefix="ragsearch-shard")
+        return list(self._executor.map(fn, shards))
+
+    def add_batch(self, embeddings, ids=None, metadata=None) -> np.ndarray:
+        """
+        Adds a batch of embeddings, routing each row to its shard.
+
+        Args:
+            embeddings (array-like): A (n, d) matrix of embeddings.
+            ids (array-like, optional): Ids for the batch; they must continue the id sequence.
+            metadata (list, optional): One metadata entry per row.
+        Returns:
+            np.ndarray: The ids assigned to the inserted rows.
+        Raises:
+            ValueError: If the shape, ids or metadata do not match the batch.
+            RuntimeError: If a shard is read-only or not loaded.
+        """
+        # Validate the whole batch before any shard is modified
+        matrix = VectorDB._normalize_embeddings(embeddings)
+        count = matrix.shape[0]
+        expected_ids = np.arange(self.current_id, self.current_id + count, dtype=np.int64)
+        if ids is not None and not np.array_equal(np.asarray(ids, dtype=np.int64), expected_ids):
+            raise ValueError("ids must continue the positional id sequence of the index")
+        if metadata is not None and len(metadata) != count:
+            raise ValueError("metadata must contain exactly one entry per embedding")
+        dim = self.embedding_dim
+        if dim is not None and dim != matrix.shape[1]:
+            raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match index dimension {dim}")
+        owners = self.shard_of(expected_ids)
+        targets = np.unique(owners).tolist()
+        for shard in targets:
+            if self._shard(shard).read_only:
+                raise RuntimeError("Cannot add embeddings to a memory-mapped, read-only index.")
+
+        for shard in targets:
+            rows = np.flatnonzero(owners == shard)
+            shard_metadata = [metadata[row] for row in rows.tolist()] if metadata is not None else None
+            self.shards[shard].add_batch(matrix[rows], ids=self._local_ids(shard, expected_ids[rows]),
+                                         metadata=shard_metadata)
+        self.current_id += count
+        return expected_ids
+
+    def insert(self, embedding: list, metadata: dict = None):
+        """
+        Inserts a single embedding and its metadata.
+        """
+        self.add_batch([embedding], metadata=[metadata or {}])
+
+    def flush(self):
+        """
+        Trains and fills every shard's index from its buffered vectors (see ``VectorDB.flush``).
+        """
+        self._map(lambda shard: self.shards[shard].flush(),
+                  [shard for shard, vector_db in enumerate(self.shards) if vector_db is not None and vector_db._pending])
+
+    def delete(self, ids) -> int:
+        """
+        Deletes vectors by id from the shards holding them.
+
+        Args:
+            ids (array-like): The ids to delete. Unknown ids are ignored.
+        Returns:
+            int: The number of ids deleted.
+        """
+        ids = np.unique(np.asarray(ids, dtype=np.int64).reshape(-1))
+        ids = ids[(ids >= 0) & (ids < self.current_id)]
+        owners = self.shard_of(ids)
+        deleted = 0
+        for shard in np.unique(owners).tolist():
+            deleted += self._shard(shard).delete(self._local_ids(shard, ids[owners == shard]))
+        return deleted
+
+    def reconstruct(self, ids) -> np.ndarray:
+        """
+        Returns the stored vectors of some ids, in the order given (see ``VectorDB.reconstruct``).
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        owners = self.shard_of(ids)
+        vectors = np.empty((len(ids), self.embedding_dim or 0), dtype=np.float32)
+        for shard in np.unique(owners).tolist():
+            rows = owners == shard
+            vectors[rows] = self._shard(shard).reconstruct(self._local_ids(shard, ids[rows]))
+        return vectors
+
+    def search(self, query_embedding: list, top_k: int = 5, nprobe: int = None, ef_search: int = None,
+               subset=None) -> list:
+        """
+        Searches every shard for the top-k most similar embeddings (see ``search_batch``).
+        """
+        try:
+            results = self.search_batch([query_embedding], top_k=top_k, nprobe=nprobe, ef_search=ef_search,
+                                        subset=subset)[0]
+            log_query("Search completed. Found %d results.", len(results))
+            return results
+        except Exception as e:
+            logging.error(f"Failed to search in vector database: {e}")
+            raise
+
+    def search_batch(self, query_embeddings, top_k: int = 5, nprobe: int = None, ef_search: int = None,
+                     subset=None) -> list:
+        """
+        Searches all loaded shards in parallel and merges their top-k into the global top-k.
+
+        Args:
+            query_embeddings (array-like): A (q, d) matrix of query embeddings.
+            top_k (int): The number of results per query.
+            nprobe (int, optional): Inverted lists to visit for IVF shards.
+            ef_search (int, optional): Search queue size for HNSW shards.
+            subset (array-like, optional): Restricts the search to some global ids, given as a
+                boolean mask over all ids or as an array of ids.
+
+        Returns:
+            list: One list of result dictionaries per query, with global ids in ``"index"``.
+        """
+        self.flush()
+        if self.ntotal == 0:
+            raise ValueError("The FAISS index is empty. Add embeddings before searching.")
+        queries = VectorDB._normalize_embeddings(query_embeddings)
+        mask = self._subset_mask(subset) if subset is not None else None
+        shards = [shard for shard, vector_db in enumerate(self.shards) if vector_db is not None and vector_db.ntotal]
+
+        def search_shard(shard: int) -> list:
+            local_subset = None
+            if mask is not None:
+                local_ids = np.arange(self.shards[shard].current_id, dtype=np.int64)
+                local_subset = mask[self._global_ids(shard, local_ids)]
+                if not local_subset.any():
+                    return [[] for _ in range(len(queries))]
+            results = self.shards[shard].search_batch(queries, top_k=top_k, nprobe=nprobe,
+                                                      ef_search=ef_search, subset=local_subset)
+            for row in results:
+                for result in row:
+                    result["index"] = int(self._global_ids(shard, result["index"]))
+            return results
+
+        per_shard = self._map(search_shard, shards)
+        # Each shard's list is sorted best-first, so a heap merge yields the global order
+        return [list(itertools.islice(heapq.merge(*rows, key=lambda result: -result["similarity"]), top_k))
+                for rows in zip(*per_shard)]
+
+    def _subset_mask(self, subset) -> np.ndarray:
+        """
+        Converts a subset given as a boolean mask or an array of global ids into a mask over all ids.
+        """
+        subset = np.asarray(subset)
+        if subset.dtype == bool:
+            if subset.shape != (self.current_id,):
+                raise ValueError(f"A subset mask must have one entry per id ({self.current_id})")
+            return subset
+        ids = subset.astype(np.int64).reshape(-1)
+        if len(ids) and (ids.min() < 0 or ids.max() >= self.current_id):
+            raise ValueError("subset contains ids that are not in the index")
+        mask = np.zeros(self.current_id, dtype=bool)
+        mask[ids] = True
+        return mask
+
+    def save(self, directory) -> Path:
+        """
+        Writes every shard to its own sub-directory, plus the partitioning.
+
+        Args:
+            directory (str | Path): The directory to write to. It is created if missing.
+        Returns:
+            Path: The directory the shards were written to.
+        Raises:
+            RuntimeError: If only some shards are loaded.
+        """
+        if any(shard is None for shard in self.shards):
+            raise RuntimeError("Cannot save a sharded index with only some shards loaded.")
+        if self.embedding_dim is None:
+            raise ValueError("Cannot save an empty index whose embedding dimension is not known yet.")
+        for vector_db in self.shards:
+            if vector_db.index is None:
+                # A shard no id was routed to yet still gets an (empty) index on disk
+                vector_db._create_index(self.embedding_dim)
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        self._map(lambda shard: self.shards[shard].save(directory / shard_dir_name(shard)),
+                  list(range(self.num_shards)))
+        state = {"num_shards": self.num_shards, "partition": self.partition, "range_size": self.range_size,
+                 "current_id": self.current_id}
+        (directory / SHARDS_FILE_NAME).write_text(json.dumps(state))
+        logging.info(f"Sharded FAISS index with {self.ntotal} vectors saved to {directory}")
+        return directory
+
+    @classmethod
+    def load(cls, directory, mmap: bool = True, shards: list = None, max_workers: int = None) -> "ShardedVectorDB":
+        """
+        Loads shards previously written with ``save``.
+
+        Args:
+            directory (str | Path): The directory the shards were saved to.
+            mmap (bool): Memory-map the shard indexes (read-only).
+            shards (list, optional): Only load these shard numbers, e.g. the ones one node serves.
+                Searches then cover the loaded shards only. Defaults to all shards.
+            max_workers (int, optional): Threads searching shards in parallel.
+        Returns:
+            ShardedVectorDB: The restored database.
+        Raises:
+            FileNotFoundError: If the directory does not contain a sharded index.
+        """
+        directory = Path(directory)
+        if not is_sharded(directory):
+            raise FileNotFoundError(f"No sharded FAISS index found at {directory}")
+        state = json.loads((directory / SHARDS_FILE_NAME).read_text())
+        selected = set(range(state["num_shards"]) if shards is None else shards)
+
+        sharded = cls.__new__(cls)
+        sharded.num_shards = state["num_shards"]
+        sharded.partition = state["partition"]
+        sharded.range_size = state["range_size"]
+        sharded.max_workers = max_workers
+        sharded.current_id = state["current_id"]
+        sharded._executor = None
+        sharded.shards = [None] * sharded.num_shards
+        loaded = sharded._map(lambda shard: VectorDB.load(directory / shard_dir_name(shard), mmap=mmap),
+                              sorted(selected))
+        for shard, vector_db in zip(sorted(selected), loaded):
+            sharded.shards[shard] = vector_db
+        logging.info(f"Loaded {len(selected)} of {sharded.num_shards} shards from {directory}")
+        return sharded
+
+    def close(self):
+        """
+        Shuts down the search thread pool.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -1,19 +1,38 @@
 """
 Utility functions for the ragsearch package.
 """
+import numpy as np
 import pandas as pd
 import logging
 
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Rough characters-per-token ratio used to turn a token budget into a character budget
+CHARS_PER_TOKEN = 4
 
-def extract_textual_columns(data: pd.DataFrame) -> list:
+def extract_textual_columns(data: pd.DataFrame, include: list = None, exclude: list = None) -> list:
     """
     Extract columns containing textual data from a DataFrame.
+
+    Args:
+        data (pd.DataFrame): The input data.
+        include (list, optional): Allowlist of columns to use, in this order, instead of
+            every string column.
+        exclude (list, optional): Columns to leave out, e.g. IDs or URLs.
+    Returns:
+        list: The textual column names.
+    Raises:
+        ValueError: If an allowlisted column is not in the data.
     """
     try:
-        textual_columns = data.select_dtypes(include=['object']).columns.to_list()
+        if include is not None:
+            missing = [col for col in include if col not in data.columns]
+            if missing:
+                raise ValueError(f"Text columns not found in data: {missing}")
+            textual_columns = list(include)
+        else:
+            textual_columns = data.select_dtypes(include=['object', 'string']).columns.to_list()
+        if exclude:
+            textual_columns = [col for col in textual_columns if col not in set(exclude)]
         logging.info(f"Extracted textual columns: {textual_columns}")
         return textual_columns
     except Exception as e:
@@ -38,12 +57,66 @@ def preprocess_text(row, columns):
     return " | ".join(str(row[col]) if pd.notna(row[col]) else "" for col in columns)
 
 
-def batch_generate_embeddings(embedding_model, texts: list) -> list:
+def build_combined_text(data: pd.DataFrame,
+                        columns: list,
+                        prefixes: dict = None,
+                        max_tokens: int = None,
+                        separator: str = " | ") -> pd.Series:
+    """
+    Build the text to embed for every row with column-wise string operations.
+
+    Produces the same text as applying ``preprocess_text`` row by row, but in a
+    handful of vectorized passes instead of a Python call per row and column.
+
+    Args:
+        data (pd.DataFrame): The input data.
+        columns (list): The columns to combine, in order.
+        prefixes (dict, optional): Text prepended to non-missing values of a column,
+            e.g. ``{"name": "Name: "}``.
+        max_tokens (int, optional): Truncate each text to roughly this many tokens
+            (``CHARS_PER_TOKEN`` characters per token) to fit the embedding model's budget.
+        separator (str): The separator placed between columns.
+    Returns:
+        pd.Series: The combined text, aligned with ``data``'s index.
+    """
+    prefixes = prefixes or {}
+    parts = []
+    for col in columns:
+        values = data[col]
+        present = values.notna()
+        text = values.astype(str)
+        if col in prefixes:
+            text = prefixes[col] + text
+        parts.append(text.where(present, ""))
+
+    if not parts:
+        combined = pd.Series("", index=data.index, dtype=object)
+    else:
+        combined = parts[0].str.cat(parts[1:], sep=separator) if len(parts) > 1 else parts[0]
+    if max_tokens is not None:
+        combined = combined.str.slice(0, max_tokens * CHARS_PER_TOKEN)
+    return combined
+
+
+def content_hashes(texts) -> np.ndarray:
+    """
+    Hash each text to a 64-bit value, used to detect rows whose embedded text changed.
+
+    Args:
+        texts (iterable): The texts, e.g. the ``combined_text`` column.
+    Returns:
+        np.ndarray: One ``uint64`` hash per text, stable across runs.
+    """
+    return pd.util.hash_array(np.asarray(list(texts), dtype=object), categorize=False)
+
+
+def batch_generate_embeddings(embedding_model, texts: list, **embed_options) -> list:
     """
     Generate embeddings for a batch of text data using the embedding model.
+    ``embed_options`` (e.g. ``model`` and ``input_type``) are passed to ``embed``.
     """
     try:
-        response = embedding_model.embed(texts=texts)
+        response = embedding_model.embed(texts=texts, **embed_options)
         embeddings = response.embeddings
         logging.info("Generated embeddings successfully.")
         return embeddings
@@ -54,26 +127,28 @@ def batch_generate_embeddings(embedding_model, texts: list) -> list:
 def insert_embeddings_to_vector_db(vector_db, data, metadata_columns):
     """
     Inserts embeddings and associated metadata into the vector database.
+
+    The ``embedding`` column is stacked into one matrix and handed to
+    ``VectorDB.add_batch`` so the whole frame is indexed with a single call.
     """
     try:
-        for _, row in data.iterrows():
-            embedding = row["embedding"]
-            metadata = {col: row[col] for col in metadata_columns}
-            vector_db.insert(embedding=embedding, metadata=metadata)
+        embeddings = np.vstack(data["embedding"].to_numpy()).astype(np.float32, copy=False)
+        metadata = data[metadata_columns].to_dict(orient="records")
+        vector_db.add_batch(embeddings, metadata=metadata)
 
         logging.info("Embeddings and metadata successfully stored in the vector database.")
     except Exception as e:
         logging.error(f"Failed to store embeddings in vector database: {e}")
         raise
 
-def search_vector_db(vector_db, query_embedding: list, top_k: int = 5) -> list:
+def search_vector_db(vector_db, query_embedding: list, top_k: int = 5, **search_params) -> list:
     """
     Search for the top-k most relevant results in the vector database for a given query embedding.
+
+    Extra keyword arguments (e.g. ``nprobe``, ``ef_search``) are passed to ``vector_db.search``.
     """
     try:
-        results = vector_db.search(query_embedding, top_k=top_k)
-        logging.info(f"Search completed. Found {len(results)} results.")
-        return results
+        return vector_db.search(query_embedding, top_k=top_k, **search_params)
     except Exception as e:
         logging.error(f"Failed to search in vector database: {e}")
         raise
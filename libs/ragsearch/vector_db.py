@@ -2,53 +2,295 @@
 This module contains the VectorDB class which is responsible for
 managing the FAISS index and associated metadata.
 """
-import faiss
+import json
+import os
+import shutil
+import tempfile
+import threading
 import numpy as np
 import logging
+from pathlib import Path
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from .lazy import LazyModule
+from .metadata_store import MetadataStore
+from .metrics import log_query
 
+# FAISS and ChromaDB are imported on first use, so each backend only loads its own library
+faiss = LazyModule("faiss")
 
+INDEX_FILE_NAME = "index.faiss"
+STATE_FILE_NAME = "vector_db.json"
+TOMBSTONES_FILE_NAME = "tombstones.npy"
+FULL_VECTORS_FILE_NAME = "vectors.f32"
+
+# FAISS scalar quantizer codes used to store vectors at reduced precision
+PRECISION_CODES = {"float32": None, "float16": "SQfp16", "int8": "SQ8"}
+
+
+def _mmap_io_flag() -> int:
+    # Prefer mapping the flat code arrays themselves; older FAISS builds only know IO_FLAG_MMAP
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+
+def storage_index_spec(index_spec: str, precision: str = "float32") -> str:
+    """
+    Rewrites an index spec so its vectors are stored at the given precision.
+
+    ``"Flat"`` becomes ``"SQfp16"`` or ``"SQ8"`` (``IndexScalarQuantizer``), ``"IVF4096,Flat"``
+    becomes ``"IVF4096,SQ8"`` and ``"HNSW32"`` becomes ``"HNSW32,SQ8"``.
+
+    Args:
+        index_spec (str): A ``faiss.index_factory`` description.
+        precision (str): ``"float32"`` (unchanged), ``"float16"`` (2x smaller) or ``"int8"`` (4x smaller).
+    Returns:
+        str: The rewritten spec.
+    Raises:
+        ValueError: If the precision is unknown, or the spec already chooses its own encoding (e.g. PQ).
+    """
+    if precision not in PRECISION_CODES:
+        raise ValueError(f"Unknown precision '{precision}'; expected one of {sorted(PRECISION_CODES)}")
+    code = PRECISION_CODES[precision]
+    if code is None:
+        return index_spec
+    parts = index_spec.split(",")
+    if parts[-1] == "Flat":
+        parts[-1] = code
+    elif parts[-1].startswith("HNSW") and "_" not in parts[-1]:
+        parts.append(code)
+    else:
+        raise ValueError(f"Index spec '{index_spec}' already sets its own vector encoding; "
+                         f"use precision='float32' with it")
+    return ",".join(parts)
+
+
+def build_search_parameters(index, nprobe: int = None, ef_search: int = None, selector=None):
+    """
+    Builds per-call FAISS search parameters for the knobs the index understands.
+
+    Parameters are nested to match wrapper indexes (e.g. the OPQ rotation in
+    ``"OPQ64,IVF4096,PQ64"``), so they apply to the IVF or HNSW index inside.
+    The id selector is attached to the innermost parameters, because wrapper
+    indexes do not forward their own ``sel`` to the index they wrap.
+
+    Args:
+        index (faiss.Index): The index that will be searched.
+        nprobe (int, optional): Number of inverted lists visited by IVF indexes.
+        ef_search (int, optional): Size of the HNSW search queue.
+        selector (faiss.IDSelector, optional): Restricts the search to the selected ids.
+    Returns:
+        tuple: The ``faiss.SearchParameters`` (or None) and a list of the nested
+        parameter objects, which must stay referenced for as long as the parameters are used.
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIDMap):
+        inner = faiss.downcast_index(index.index)
+        keepalive = []
+        if selector is not None and isinstance(inner, faiss.IndexPreTransform):
+            # The id map only translates the outer parameters' selector, which the
+            # transform does not forward, so translate it ourselves
+            keepalive.append(selector)
+            selector = faiss.IDSelectorTranslated(index.id_map, selector)
+        params, inner_keepalive = build_search_parameters(inner, nprobe, ef_search, selector)
+        return params, keepalive + inner_keepalive + [selector]
+    if isinstance(index, faiss.IndexPreTransform):
+        inner, keepalive = build_search_parameters(index.index, nprobe, ef_search, selector)
+        if inner is None:
+            return None, keepalive
+        params = faiss.SearchParametersPreTransform()
+        params.index_params = inner
+        return params, keepalive + [inner]
+    if isinstance(index, faiss.IndexIVF) and (nprobe is not None or selector is not None):
+        # Parameter objects carry their own defaults, so keep the index's setting unless overridden
+        params = faiss.SearchParametersIVF(nprobe=int(nprobe) if nprobe is not None else index.nprobe)
+    elif isinstance(index, faiss.IndexHNSW) and (ef_search is not None or selector is not None):
+        params = faiss.SearchParametersHNSW(
+            efSearch=int(ef_search) if ef_search is not None else index.hnsw.efSearch)
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None, []
+    if selector is not None:
+        params.sel = selector
+    return params, []
+
+
+def build_id_selector(mask: np.ndarray):
+    """
+    Builds a FAISS bitmap selector from a boolean mask over the index's ids.
+
+    Args:
+        mask (np.ndarray): ``mask[i]`` is True when id ``i`` may be returned.
+    Returns:
+        tuple: The ``faiss.IDSelectorBitmap`` and the packed bitmap, which must stay
+        referenced for as long as the selector is used.
+    """
+    bitmap = np.packbits(np.asarray(mask, dtype=bool), bitorder="little")
+    return faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap)), bitmap
+
+
+class FullPrecisionVectors:
+    """
+    Float32 copies of the indexed vectors in a flat file, one row per id, read through a
+    memory map. Only the rows that are looked up are paged in.
+    """
+    def __init__(self, embedding_dim: int, path: Path = None):
+        """
+        Args:
+            embedding_dim (int): The vector dimension.
+            path (Path, optional): An existing file to map read-only. Defaults to a new
+                anonymous temporary file that vectors can be appended to.
+        """
+        self.embedding_dim = embedding_dim
+        self.path = Path(path) if path is not None else None
+        self._file = None if path is not None else tempfile.TemporaryFile(prefix="ragsearch-vectors-")
+        self.count = 0 if path is None else os.path.getsize(path) // (4 * embedding_dim)
+        self._map = None
+
+    @classmethod
+    def open(cls, path: Path, embedding_dim: int, writable: bool = False) -> "FullPrecisionVectors":
+        """
+        Opens a file written by ``save``; a writable store works on a private copy.
+        """
+        if not writable:
+            return cls(embedding_dim, path)
+        store = cls(embedding_dim)
+        with open(path, "rb") as source:
+            shutil.copyfileobj(source, store._file)
+        store.count = os.path.getsize(path) // (4 * embedding_dim)
+        return store
+
+    def append(self, vectors: np.ndarray):
+        """
+        Appends vectors for the next ids.
+        """
+        if self._file is None:
+            raise RuntimeError("Cannot add vectors to a memory-mapped, read-only store.")
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        self.count += len(vectors)
+        self._map = None
+
+    def take(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Returns the vectors of some ids.
+        """
+        if self._map is None:
+            if self._file is not None:
+                self._file.flush()
+            self._map = np.memmap(self._file if self._file is not None else self.path, dtype=np.float32,
+                                  mode="r", shape=(self.count, self.embedding_dim))
+        return np.asarray(self._map[ids])
+
+    def save(self, path: Path):
+        """
+        Writes the vectors to ``path``.
+        """
+        path = Path(path)
+        if self._file is None:
+            if path.resolve() != self.path.resolve():
+                shutil.copyfile(self.path, path)
+            return
+        self._file.flush()
+        self._file.seek(0)
+        with open(path, "wb") as target:
+            shutil.copyfileobj(self._file, target)
 
-import chromadb
-from chromadb.config import Settings
 
 class VectorDB:
-    def __init__(self, embedding_dim: int = 1024):
+    def __init__(self, embedding_dim: int = None, index_spec: str = "Flat", train_sample_size: int = 50_000,
+                 exact_scan_threshold: int = 4096, precision: str = "float32", rerank_factor: int = None):
         """
         Initializes the FAISS vector database with an in-memory index.
 
         Args:
-            embedding_dim (int): The dimension of the embeddings to be stored.
+            embedding_dim (int, optional): The dimension of the embeddings to be stored.
+                Defaults to the dimension of the first batch added.
+            index_spec (str): A ``faiss.index_factory`` description, e.g. ``"Flat"`` (exact),
+                ``"HNSW32"``, ``"IVF4096,PQ64"`` or ``"OPQ64,IVF4096,PQ64"``.
+            train_sample_size (int): For indexes that need training, the number of
+                vectors buffered during ingestion before the index is trained on them.
+            exact_scan_threshold (int): Filtered searches on approximate indexes that select at
+                most this many ids score the selected vectors exactly instead of searching the
+                index, where a very selective filter would starve the IVF lists or HNSW graph.
+            precision (str): How the index stores vectors: ``"float32"``, ``"float16"`` or
+                ``"int8"`` (FAISS scalar quantization, see ``storage_index_spec``).
+            rerank_factor (int, optional): Keep float32 copies of the vectors in a memory-mapped
+                file, fetch ``rerank_factor * top_k`` candidates from the index and rescore them
+                exactly. Recovers the accuracy lost to compressed storage.
         Raises:
-            ValueError: If the embedding dimension is not a positive integer
+            ValueError: If the embedding dimension is not a positive integer, the index spec
+                is not understood by FAISS or the precision does not apply to it.
         """
-        if not isinstance(embedding_dim, int) or embedding_dim <= 0:
+        if embedding_dim is not None and (not isinstance(embedding_dim, int) or embedding_dim <= 0):
             raise ValueError("embedding_dim must be a positive integer")
-        # Use IndexFlatIP for cosine similarity (requires normalized embeddings)
-        self.index = faiss.IndexFlatIP(embedding_dim)
-        self.metadata_store = {}  # Dictionary to store metadata
+        if rerank_factor is not None and rerank_factor < 1:
+            raise ValueError("rerank_factor must be at least 1")
+        self.embedding_dim = embedding_dim
+        self.precision = precision
+        self.index_spec = storage_index_spec(index_spec, precision)
+        self.train_sample_size = train_sample_size
+        self.exact_scan_threshold = exact_scan_threshold
+        self.rerank_factor = rerank_factor
+        self.index = None
+        self.full_vectors = None  # Float32 copies for reranking, when rerank_factor is set
+        self.metadata_store = MetadataStore()  # Columnar metadata, one row per id
         self.current_id = 0  # Incremental ID to track embeddings
-        logging.info(f"FAISS VectorDB initialized with dimension: {embedding_dim}")
+        self.tombstones = set()  # Deleted ids the index cannot remove physically
+        self._live_mask = None
+        self._stored_mask = None
+        self.read_only = False  # Set when the index is memory-mapped from disk
+        self._pending = []  # Normalized batches waiting for the index to be trained
+        self.recall_report = None  # Filled in when the index is trained
+        if embedding_dim is not None:
+            self._create_index(embedding_dim)
+        logging.info(f"FAISS VectorDB initialized with dimension: {embedding_dim or 'auto'}, "
+                     f"index: {self.index_spec}")
 
-def get_chromadb_collection(sqlite_path: str, collection_name: str):
-    """
-    Connects to a ChromaDB SQLite file and returns the specified collection using the new PersistentClient API.
-    """
-    client = chromadb.PersistentClient(path=sqlite_path)
-    return client.get_collection(collection_name)
+    def _create_index(self, embedding_dim: int):
+        """
+        Creates the empty index once the embedding dimension is known.
+        """
+        self.embedding_dim = embedding_dim
+        # Inner product on normalized embeddings gives cosine similarity
+        try:
+            self.index = faiss.index_factory(embedding_dim, self.index_spec, faiss.METRIC_INNER_PRODUCT)
+        except RuntimeError as e:
+            raise ValueError(f"Invalid FAISS index spec '{self.index_spec}': {e}")
+        if faiss.try_extract_index_ivf(self.index) is None:
+            # IVF indexes store ids natively; others need an id map so ids survive deletions
+            self.index = faiss.index_factory(embedding_dim, f"IDMap2,{self.index_spec}",
+                                             faiss.METRIC_INNER_PRODUCT)
+        self._ensure_direct_map()
+        if self.rerank_factor:
+            self.full_vectors = FullPrecisionVectors(embedding_dim)
 
-def query_chromadb(sqlite_path: str, collection_name: str, query_text: str, n_results: int = 5):
-    """
-    Query the ChromaDB collection for similar documents to the query_text.
-    """
-    collection = get_chromadb_collection(sqlite_path, collection_name)
-    results = collection.query(
-        query_texts=[query_text],
-        n_results=n_results
-    )
-    return results
+    def _ensure_direct_map(self):
+        """
+        Gives IVF indexes a hash-table direct map, so vectors can be looked up and removed by id
+        even once deletions leave gaps in the ids. Set when the index is created or loaded,
+        never while searching, so the map type never changes under a running index.
+        """
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None and ivf.direct_map.type != faiss.DirectMap.Hashtable:
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+    def _can_remove(self) -> bool:
+        """
+        True when the index can drop vectors physically: IVF indexes, and id-mapped flat or
+        quantized storage. Graph indexes (HNSW) cannot.
+        """
+        if faiss.try_extract_index_ivf(self.index) is not None:
+            return True
+        index = faiss.downcast_index(self.index)
+        return isinstance(index, faiss.IndexIDMap) and isinstance(faiss.downcast_index(index.index),
+                                                                  faiss.IndexFlatCodes)
+
+    @property
+    def ntotal(self) -> int:
+        """
+        The number of vectors in the index, including tombstoned ones.
+        """
+        return self.index.ntotal if self.index is not None else 0
 
     @staticmethod
     def _normalize_embedding(embedding: list) -> np.ndarray:
@@ -66,37 +308,596 @@ def query_chromadb(sqlite_path: str, collection_name: str, query_text: str, n_re
             raise ValueError("Cannot normalize a zero vector.")
         return embedding / norm
 
-    def search(self, query_embedding: list, top_k: int = 5) -> list:
+    @staticmethod
+    def _normalize_embeddings(embeddings) -> np.ndarray:
         """
-        Searches for the top-k most similar embeddings in the FAISS index.
+        Normalizes every row of an embedding matrix to a unit vector in one vectorized step.
 
         Args:
-            query_embedding (list): The query embedding to search for.
-            top_k (int): The number of top results to return.
+            embeddings (array-like): A (n, d) matrix of embeddings.
+        Returns:
+            np.ndarray: A C-contiguous float32 matrix of unit-length rows.
+        Raises:
+            ValueError: If the input is not two-dimensional or contains a zero vector.
+        """
+        matrix = np.array(embeddings, dtype=np.float32, order="C")
+        if matrix.ndim != 2:
+            raise ValueError(f"Expected a 2-D embedding matrix, got shape {matrix.shape}")
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        if np.any(norms == 0):
+            raise ValueError("Cannot normalize a zero vector.")
+        matrix /= norms
+        return matrix
 
+    def add_batch(self, embeddings, ids=None, metadata=None) -> np.ndarray:
+        """
+        Adds a whole batch of embeddings to the FAISS index with a single call.
+
+        Args:
+            embeddings (array-like): A (n, d) matrix of embeddings, e.g. a Cohere embed response.
+            ids (array-like, optional): Row ids for the batch. They must continue the
+                index's positional sequence; defaults to the next ``n`` ids.
+            metadata (list, optional): One metadata entry per row to keep in ``metadata_store``.
         Returns:
-            list: A list of dictionaries containing the results with similarity scores and metadata.
+            np.ndarray: The ids assigned to the inserted rows.
+        Raises:
+            ValueError: If the shape, ids or metadata do not match the batch.
+            RuntimeError: If the index was memory-mapped read-only.
+        """
+        if self.read_only:
+            raise RuntimeError("Cannot add embeddings to a memory-mapped, read-only index.")
+        matrix = self._normalize_embeddings(embeddings)
+        if self.index is None:
+            self._create_index(matrix.shape[1])
+            logging.info(f"Detected embedding dimension {self.embedding_dim}")
+        if matrix.shape[1] != self.embedding_dim:
+            raise ValueError(
+                f"Embedding dimension {matrix.shape[1]} does not match index dimension {self.embedding_dim}"
+            )
+        count = matrix.shape[0]
+        expected_ids = np.arange(self.current_id, self.current_id + count, dtype=np.int64)
+        if ids is None:
+            ids = expected_ids
+        else:
+            ids = np.asarray(ids, dtype=np.int64)
+            # IndexFlatIP assigns positional ids, so callers may only restate them
+            if not np.array_equal(ids, expected_ids):
+                raise ValueError("ids must continue the positional id sequence of the index")
+        if metadata is not None:
+            if len(metadata) != count:
+                raise ValueError("metadata must contain exactly one entry per embedding")
+            self.metadata_store.append(list(metadata), start=self.current_id)
+
+        self.current_id += count
+        if self.full_vectors is not None:
+            self.full_vectors.append(matrix)
+        if self.index.is_trained:
+            self.index.add_with_ids(matrix, ids)
+            self._live_mask = self._stored_mask = None
+        else:
+            # Buffer until there is enough data to train on
+            self._pending.append(matrix)
+            if sum(len(batch) for batch in self._pending) >= self.train_sample_size:
+                self.flush()
+        return ids
+
+    def flush(self):
+        """
+        Trains the index on the buffered vectors if it is not trained yet, then adds them.
+
+        Call this once ingestion is finished; ``save`` and ``search`` call it too.
+        """
+        if not self._pending:
+            return
+        buffered = np.concatenate(self._pending)
+        self._pending = []
+        if not self.index.is_trained:
+            self.train(buffered)
+        # Buffered rows are the most recent ids
+        first_id = self.current_id - len(buffered)
+        self.index.add_with_ids(buffered, np.arange(first_id, self.current_id, dtype=np.int64))
+        self._live_mask = self._stored_mask = None
+
+    def delete(self, ids) -> int:
+        """
+        Deletes vectors by id. Ids are never reused, so a replaced row gets a new id.
+
+        Indexes that support it (id-mapped Flat, IVF) drop the vectors physically.
+        Others (HNSW) keep them as tombstones that searches skip.
+
+        Args:
+            ids (array-like): The ids to delete. Unknown ids are ignored.
+        Returns:
+            int: The number of ids deleted.
+        Raises:
+            RuntimeError: If the index was memory-mapped read-only.
+        """
+        if self.read_only:
+            raise RuntimeError("Cannot delete from a memory-mapped, read-only index.")
+        self.flush()
+        ids = np.unique(np.asarray(ids, dtype=np.int64).reshape(-1))
+        ids = ids[(ids >= 0) & (ids < self.current_id)]
+        ids = np.array([i for i in ids.tolist() if i not in self.tombstones], dtype=np.int64)
+        if len(ids) == 0:
+            return 0
+        if self._can_remove():
+            # The hash-table direct map of IVF indexes removes an id array by lookup; id maps
+            # test every stored id against the selector, which a batch selector answers in O(1)
+            is_ivf = faiss.try_extract_index_ivf(self.index) is not None
+            selector = faiss.IDSelectorArray(ids) if is_ivf else faiss.IDSelectorBatch(ids)
+            deleted = int(self.index.remove_ids(selector))
+            logging.info(f"Removed {deleted} vectors from the FAISS index.")
+        else:
+            self.tombstones.update(ids.tolist())
+            deleted = len(ids)
+            logging.info(f"Marked {len(ids)} vectors as deleted ({len(self.tombstones)} tombstones).")
+        self._live_mask = self._stored_mask = None
+        return deleted
+
+    def live_mask(self) -> np.ndarray:
+        """
+        Returns a boolean mask over all ids that is False for tombstoned ids, or None if there are none.
         """
+        if not self.tombstones:
+            return None
+        if self._live_mask is None or len(self._live_mask) != self.current_id:
+            mask = np.ones(self.current_id, dtype=bool)
+            mask[np.fromiter(self.tombstones, dtype=np.int64)] = False
+            self._live_mask = mask
+        return self._live_mask
+
+    def stored_mask(self) -> np.ndarray:
+        """
+        Returns a boolean mask over all ids that is False for ids removed from the index,
+        or None if none were. Tombstoned ids are still stored.
+        """
+        buffered = sum(len(batch) for batch in self._pending)
+        if self.index is None or self.index.ntotal + buffered == self.current_id:
+            return None
+        if self._stored_mask is None or len(self._stored_mask) != self.current_id:
+            mask = np.zeros(self.current_id, dtype=bool)
+            mask[self._stored_ids()] = True
+            self._stored_mask = mask
+        return self._stored_mask
+
+    def _stored_ids(self) -> np.ndarray:
+        """
+        The ids held by the index, read from its inverted lists or its id map.
+        """
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            invlists, parts = ivf.invlists, []
+            for list_no in range(ivf.nlist):
+                size = invlists.list_size(list_no)
+                if size:
+                    ids = invlists.get_ids(list_no)
+                    parts.append(faiss.rev_swig_ptr(ids, size).copy())
+                    invlists.release_ids(list_no, ids)
+            return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+        index = faiss.downcast_index(self.index)
+        if isinstance(index, faiss.IndexIDMap):
+            return faiss.vector_to_array(index.id_map)
+        return np.arange(self.index.ntotal, dtype=np.int64)
+
+    def train(self, vectors: np.ndarray):
+        """
+        Trains the index on a random sample of ``vectors`` and measures its recall against Flat.
+
+        Args:
+            vectors (np.ndarray): Normalized training vectors.
+        """
+        rng = np.random.default_rng(0)
+        sample = vectors
+        if len(vectors) > self.train_sample_size:
+            sample = vectors[rng.choice(len(vectors), self.train_sample_size, replace=False)]
+        logging.info(f"Training FAISS index '{self.index_spec}' on {len(sample)} vectors...")
+        self.index.train(sample)
         try:
-            if self.index.ntotal == 0:
-                raise ValueError("The FAISS index is empty. Add embeddings before searching.")
+            self.recall_report = self.measure_recall(sample)
+            logging.info(f"Recall@{self.recall_report['k']} against Flat: {self.recall_report['recall']:.3f}")
+        except Exception as e:
+            logging.warning(f"Could not measure recall for '{self.index_spec}': {e}")
 
-            # Normalize the query embedding
-            normalized_query = self._normalize_embedding(query_embedding)
-            normalized_query = np.array([normalized_query], dtype=np.float32)
+    def measure_recall(self, vectors: np.ndarray, k: int = 10, num_queries: int = 1000,
+                       nprobe: int = None, ef_search: int = None) -> dict:
+        """
+        Measures recall@k of this index type against exact (Flat) search on held-out queries.
+
+        A slice of ``vectors`` is held out as queries; the rest is indexed both by a
+        trained copy of this index and by a Flat index, and their top-k are compared.
+
+        Args:
+            vectors (np.ndarray): A sample of normalized vectors.
+            k (int): The cut-off for recall@k.
+            num_queries (int): Maximum number of held-out queries.
+            nprobe (int, optional): IVF search knob to evaluate with.
+            ef_search (int, optional): HNSW search knob to evaluate with.
+        Returns:
+            dict: ``k``, ``recall``, ``num_queries`` and ``num_vectors``.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        num_queries = min(num_queries, max(1, len(vectors) // 10))
+        permutation = np.random.default_rng(1).permutation(len(vectors))
+        queries = vectors[permutation[:num_queries]]
+        database = vectors[permutation[num_queries:]]
+        k = min(k, len(database))
+
+        if self.index.ntotal == 0 and self.index.is_trained:
+            candidate = faiss.clone_index(self.index)
+            candidate.reset()
+        else:
+            candidate = faiss.index_factory(self.embedding_dim, self.index_spec, faiss.METRIC_INNER_PRODUCT)
+            if not candidate.is_trained:
+                candidate.train(database)
+            if faiss.try_extract_index_ivf(candidate) is None:
+                candidate = faiss.IndexIDMap2(candidate)
+        candidate.add_with_ids(database, np.arange(len(database), dtype=np.int64))
+        exact = faiss.IndexFlatIP(self.embedding_dim)
+        exact.add(database)
 
-            # Perform the search
-            distances, indices = self.index.search(normalized_query, top_k)
+        params, _keepalive = build_search_parameters(candidate, nprobe, ef_search)
+        _, found = candidate.search(queries, k, params=params)
+        _, truth = exact.search(queries, k)
+        hits = sum(len(np.intersect1d(row_found, row_truth)) for row_found, row_truth in zip(found, truth))
+        return {"k": k, "recall": hits / (k * len(queries)), "num_queries": len(queries),
+                "num_vectors": len(database)}
+
+    def insert(self, embedding: list, metadata: dict = None):
+        """
+        Inserts a single embedding and its metadata into the FAISS index.
+
+        Prefer ``add_batch`` for bulk ingestion; this is kept for single-row callers.
+
+        Args:
+            embedding (list): The embedding to insert.
+            metadata (dict, optional): The metadata associated with the embedding.
+        """
+        self.add_batch([embedding], metadata=[metadata or {}])
 
-            # Map indices to metadata
-            results = []
-            for idx, dist in zip(indices[0], distances[0]):
-                if idx != -1:  # Check if a valid result is returned
-                    metadata = self.metadata_store.get(idx, {})
-                    results.append({"index": idx, "similarity": dist, "metadata": metadata})
+    def save(self, directory) -> Path:
+        """
+        Writes the FAISS index and the id bookkeeping to a directory.
+
+        Args:
+            directory (str | Path): The directory to write to. It is created if missing.
+        Returns:
+            Path: The directory the index was written to.
+        """
+        self.flush()
+        if self.index is None:
+            raise ValueError("Cannot save an empty index whose embedding dimension is not known yet.")
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        faiss.write_index(self.index, str(directory / INDEX_FILE_NAME))
+        if self.full_vectors is not None:
+            self.full_vectors.save(directory / FULL_VECTORS_FILE_NAME)
+        tombstones_path = directory / TOMBSTONES_FILE_NAME
+        if self.tombstones:
+            np.save(tombstones_path, np.array(sorted(self.tombstones), dtype=np.int64))
+        elif tombstones_path.exists():
+            tombstones_path.unlink()
+        state = {"embedding_dim": self.embedding_dim, "current_id": self.current_id,
+                 "index_spec": self.index_spec, "precision": self.precision,
+                 "rerank_factor": self.rerank_factor, "recall_report": self.recall_report}
+        (directory / STATE_FILE_NAME).write_text(json.dumps(state))
+        logging.info(f"FAISS index with {self.index.ntotal} vectors saved to {directory}")
+        return directory
+
+    @classmethod
+    def load(cls, directory, mmap: bool = True) -> "VectorDB":
+        """
+        Loads a FAISS index previously written with ``save``.
+
+        Args:
+            directory (str | Path): The directory the index was saved to.
+            mmap (bool): Memory-map the index instead of reading it into the heap.
+                A mapped index is shared through the page cache but is read-only.
+        Returns:
+            VectorDB: The restored vector database.
+        Raises:
+            FileNotFoundError: If the directory does not contain a saved index.
+        """
+        directory = Path(directory)
+        index_path = directory / INDEX_FILE_NAME
+        if not index_path.exists():
+            raise FileNotFoundError(f"No FAISS index found at {index_path}")
+        state = json.loads((directory / STATE_FILE_NAME).read_text())
 
-            logging.info(f"Search completed. Found {len(results)} results.")
+        vector_db = cls()
+        vector_db.embedding_dim = state["embedding_dim"]
+        vector_db.index = faiss.read_index(str(index_path), _mmap_io_flag() if mmap else 0)
+        vector_db.index_spec = state.get("index_spec", "Flat")
+        vector_db.precision = state.get("precision", "float32")
+        vector_db.rerank_factor = state.get("rerank_factor")
+        if vector_db.rerank_factor and (directory / FULL_VECTORS_FILE_NAME).exists():
+            vector_db.full_vectors = FullPrecisionVectors.open(directory / FULL_VECTORS_FILE_NAME,
+                                                               vector_db.embedding_dim, writable=not mmap)
+        else:
+            vector_db.rerank_factor = None
+        vector_db.recall_report = state.get("recall_report")
+        vector_db.current_id = state["current_id"]
+        if (directory / TOMBSTONES_FILE_NAME).exists():
+            vector_db.tombstones = set(np.load(directory / TOMBSTONES_FILE_NAME).tolist())
+        # Snapshots written before the direct map was set at creation have none
+        vector_db._ensure_direct_map()
+        vector_db.read_only = mmap
+        logging.info(f"FAISS index with {vector_db.index.ntotal} vectors loaded from {directory} (mmap={mmap})")
+        return vector_db
+
+    def search(self, query_embedding: list, top_k: int = 5, nprobe: int = None, ef_search: int = None,
+               subset=None) -> list:
+        """
+        Searches for the top-k most similar embeddings in the FAISS index.
+
+        Args:
+            query_embedding (list): The query embedding to search for.
+            top_k (int): The number of top results to return.
+            nprobe (int, optional): Inverted lists to visit for IVF indexes (speed/recall trade-off).
+            ef_search (int, optional): Search queue size for HNSW indexes.
+            subset (array-like, optional): Restricts the search to these ids (see ``search_batch``).
+
+        Returns:
+            list: A list of dictionaries containing the results with similarity scores and metadata.
+        """
+        try:
+            results = self.search_batch([query_embedding], top_k=top_k, nprobe=nprobe, ef_search=ef_search,
+                                        subset=subset)[0]
+            log_query("Search completed. Found %d results.", len(results))
             return results
         except Exception as e:
             logging.error(f"Failed to search in vector database: {e}")
             raise
+
+    def search_batch(self, query_embeddings, top_k: int = 5, nprobe: int = None, ef_search: int = None,
+                     subset=None) -> list:
+        """
+        Searches for the top-k most similar embeddings of many queries with a single FAISS call.
+
+        Args:
+            query_embeddings (array-like): A (q, d) matrix of query embeddings.
+            top_k (int): The number of top results to return per query.
+            nprobe (int, optional): Inverted lists to visit for IVF indexes.
+            ef_search (int, optional): Search queue size for HNSW indexes.
+            subset (array-like, optional): Restricts the search to some ids, given as a boolean
+                mask over all ids or as an array of ids. The filter is applied inside the FAISS
+                scan, or by scoring the subset exactly when it is small (see ``exact_scan_threshold``).
+                Tombstoned ids are always excluded.
+
+        Returns:
+            list: One list of result dictionaries (as returned by ``search``) per query.
+        """
+        self.flush()
+        if self.ntotal == 0:
+            raise ValueError("The FAISS index is empty. Add embeddings before searching.")
+
+        queries = self._normalize_embeddings(query_embeddings)
+        final_k = top_k
+        if self.full_vectors is not None:
+            top_k = top_k * self.rerank_factor
+        live = self.live_mask()
+        if live is not None:
+            subset = live if subset is None else self._subset_mask(subset) & live
+        if subset is None:
+            params, _keepalive = build_search_parameters(self.index, nprobe, ef_search)
+            distances, indices = self.index.search(queries, top_k, params=params)
+        else:
+            mask = self._subset_mask(subset)
+            stored = self.stored_mask()
+            if stored is not None:
+                # Removed ids cannot be reconstructed for an exact scan
+                mask = mask & stored
+            subset_ids = np.flatnonzero(mask)
+            if len(subset_ids) == 0:
+                return [[] for _ in range(len(queries))]
+            exact_index = self._is_exact()
+            if not exact_index and len(subset_ids) <= self.exact_scan_threshold:
+                distances, indices = self._exact_subset_search(queries, subset_ids, top_k)
+            else:
+                selector, _bitmap = build_id_selector(mask)
+                params, _keepalive = build_search_parameters(self.index, nprobe, ef_search, selector)
+                distances, indices = self.index.search(queries, top_k, params=params)
+        if self.full_vectors is not None:
+            distances, indices = self._rerank(queries, indices, final_k)
+
+        # Map indices to metadata with one lookup for the whole batch
+        metadata = iter(self.metadata_store.take(indices[indices != -1]))
+        results = []
+        for row_indices, row_distances in zip(indices.tolist(), distances.tolist()):
+            results.append([
+                {"index": idx, "similarity": dist, "metadata": next(metadata)}
+                for idx, dist in zip(row_indices, row_distances)
+                if idx != -1  # Check if a valid result is returned
+            ])
+        return results
+
+    def _is_exact(self) -> bool:
+        """
+        True when the index scores every vector exactly (Flat, possibly behind an id map).
+        """
+        index = faiss.downcast_index(self.index)
+        if isinstance(index, faiss.IndexIDMap):
+            index = faiss.downcast_index(index.index)
+        return isinstance(index, faiss.IndexFlat)
+
+    def _subset_mask(self, subset) -> np.ndarray:
+        """
+        Converts a subset given as a boolean mask or an array of ids into a mask over all ids.
+        """
+        subset = np.asarray(subset)
+        if subset.dtype == bool:
+            if subset.shape != (self.current_id,):
+                raise ValueError(f"A subset mask must have one entry per id ({self.current_id})")
+            return subset
+        ids = subset.astype(np.int64).reshape(-1)
+        if len(ids) and (ids.min() < 0 or ids.max() >= self.current_id):
+            raise ValueError("subset contains ids that are not in the index")
+        mask = np.zeros(self.current_id, dtype=bool)
+        mask[ids] = True
+        return mask
+
+    def reconstruct(self, ids) -> np.ndarray:
+        """
+        Returns the stored vectors of some ids, e.g. to copy them to another index.
+
+        Vectors come back normalized, and decoded (so approximate) for compressed indexes
+        unless full-precision copies are kept for reranking.
+
+        Args:
+            ids (array-like): Live vector ids.
+        Returns:
+            np.ndarray: One row per id.
+        """
+        self.flush()
+        return self._reconstruct(np.asarray(ids, dtype=np.int64))
+
+    def _rerank(self, queries: np.ndarray, indices: np.ndarray, top_k: int):
+        """
+        Rescores candidate ids exactly against their full-precision vectors and keeps the best ``top_k``.
+        """
+        valid = indices != -1
+        vectors = self.full_vectors.take(np.where(valid, indices, 0).reshape(-1))
+        scores = np.einsum("qkd,qd->qk", vectors.reshape(*indices.shape, -1), queries)
+        scores[~valid] = -np.inf
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :top_k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+    def _reconstruct(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Returns the stored vectors of some ids: the full-precision copies when they are kept,
+        else the index's own (decoded, for compressed indexes).
+        """
+        if self.full_vectors is not None:
+            return self.full_vectors.take(ids)
+        return self.index.reconstruct_batch(ids)
+
+    def _exact_subset_search(self, queries: np.ndarray, ids: np.ndarray, top_k: int):
+        """
+        Scores a small subset of ids exactly and returns ``index.search``-shaped results.
+        """
+        scores = queries @ self._reconstruct(ids).T
+        k = min(top_k, len(ids))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        return np.take_along_axis(scores, top, axis=1), ids[top]
+
+
+_chromadb_clients = {}
+_chromadb_collections = {}
+_chromadb_lock = threading.Lock()
+
+
+def get_chromadb_client(sqlite_path: str):
+    """
+    Returns the process-wide ChromaDB client for a persistence path, opening it on first use.
+
+    Args:
+        sqlite_path (str): The ChromaDB persistence path.
+    Returns:
+        chromadb.ClientAPI: The cached client.
+    """
+    key = str(Path(sqlite_path).resolve())
+    client = _chromadb_clients.get(key)
+    if client is None:
+        with _chromadb_lock:
+            client = _chromadb_clients.get(key)
+            if client is None:
+                import chromadb
+                client = chromadb.PersistentClient(path=sqlite_path)
+                _chromadb_clients[key] = client
+                logging.info(f"Opened ChromaDB client for {sqlite_path}")
+    return client
+
+
+def get_chromadb_collection(sqlite_path: str, collection_name: str):
+    """
+    Returns the specified collection of a ChromaDB store. Clients and collections are
+    cached per process and keyed by path and collection name, so queries do not reopen
+    SQLite or reload the HNSW segment.
+
+    Args:
+        sqlite_path (str): The ChromaDB persistence path.
+        collection_name (str): The collection to open.
+    Returns:
+        chromadb.Collection: The cached collection.
+    """
+    key = (str(Path(sqlite_path).resolve()), collection_name)
+    collection = _chromadb_collections.get(key)
+    if collection is None:
+        client = get_chromadb_client(sqlite_path)
+        with _chromadb_lock:
+            collection = _chromadb_collections.get(key)
+            if collection is None:
+                collection = client.get_collection(collection_name)
+                _chromadb_collections[key] = collection
+    return collection
+
+
+def clear_chromadb_cache(sqlite_path: str = None):
+    """
+    Drops cached ChromaDB clients and collections, e.g. after a collection was recreated.
+
+    Args:
+        sqlite_path (str, optional): Only drop the entries for this path. Defaults to all.
+    """
+    path = str(Path(sqlite_path).resolve()) if sqlite_path is not None else None
+    with _chromadb_lock:
+        for key in [key for key in _chromadb_collections if path is None or key[0] == path]:
+            del _chromadb_collections[key]
+        for key in [key for key in _chromadb_clients if path is None or key == path]:
+            del _chromadb_clients[key]
+
+
+def query_chromadb_batch(sqlite_path: str, collection_name: str, query_texts: list = None,
+                         n_results: int = 5, query_embeddings=None):
+    """
+    Query the ChromaDB collection for many queries in one call.
+
+    Args:
+        sqlite_path (str): The ChromaDB persistence path.
+        collection_name (str): The collection to query.
+        query_texts (list, optional): Query texts, embedded by the collection's embedding function.
+        n_results (int): The number of results per query.
+        query_embeddings (array-like, optional): Precomputed query embeddings, one row per query,
+            e.g. from the Cohere client. Takes the place of ``query_texts``.
+    Returns:
+        dict: ChromaDB's query result, with one list per query under each key.
+    Raises:
+        ValueError: If neither or both of ``query_texts`` and ``query_embeddings`` are given.
+    """
+    if (query_texts is None) == (query_embeddings is None):
+        raise ValueError("Exactly one of query_texts or query_embeddings must be provided.")
+    if query_embeddings is not None:
+        query = {"query_embeddings": np.asarray(query_embeddings, dtype=np.float32).reshape(
+            len(query_embeddings), -1).tolist()}
+    else:
+        query = {"query_texts": list(query_texts)}
+    try:
+        collection = get_chromadb_collection(sqlite_path, collection_name)
+        return collection.query(n_results=n_results, **query)
+    except Exception as e:
+        # The collection may have been dropped or recreated since it was cached; retry once
+        logging.warning(f"ChromaDB query failed, reopening collection '{collection_name}': {e}")
+        clear_chromadb_cache(sqlite_path)
+        collection = get_chromadb_collection(sqlite_path, collection_name)
+        return collection.query(n_results=n_results, **query)
+
+
+def query_chromadb(sqlite_path: str, collection_name: str, query_text: str = None, n_results: int = 5,
+                   query_embedding=None):
+    """
+    Query the ChromaDB collection for similar documents to the query_text.
+
+    Args:
+        sqlite_path (str): The ChromaDB persistence path.
+        collection_name (str): The collection to query.
+        query_text (str, optional): The query text.
+        n_results (int): The number of results.
+        query_embedding (array-like, optional): A precomputed embedding used instead of ``query_text``.
+    Returns:
+        dict: ChromaDB's query result.
+    """
+    return query_chromadb_batch(sqlite_path, collection_name,
+                                query_texts=None if query_text is None else [query_text],
+                                n_results=n_results,
+                                query_embeddings=None if query_embedding is None else [query_embedding])
@@ -0,0 +1,43 @@
+"""
+Test the benchmark harness on a tiny catalog.
+"""
+import copy
+
+from benchmarks.run import compare, run, synthetic_catalog
+from benchmarks.startup import measure_import
+
+
+def test_synthetic_catalog_is_reproducible():
+    """
+    Test that the same seed always generates the same catalog.
+    """
+    assert synthetic_catalog(50, seed=3).equals(synthetic_catalog(50, seed=3))
+    assert not synthetic_catalog(50, seed=3).equals(synthetic_catalog(50, seed=4))
+
+
+def test_run_reports_metrics_and_compare_flags_regressions():
+    """
+    Test that a run reports every metric per case and that compare flags a slowdown.
+    """
+    report = run([300], ["Flat", "HNSW16"], isolate=False, embedding_dim=16, num_queries=20,
+                 batch_queries=40, top_k=5, batch_size=64)
+    flat, hnsw = report["results"]
+    assert flat["recall"]["recall@5"] == 1.0 and 0 < hnsw["recall"]["recall@5"] <= 1.0
+    assert flat["ingest_rows_per_second"] > 0 and flat["batch_qps"] > 0 and flat["peak_rss_mb"] > 0
+    assert flat["search_ms"]["p50"] <= flat["search_ms"]["p99"]
+
+    slower = copy.deepcopy(report)
+    slower["results"][0]["search_ms"]["p99"] *= 2
+    regressions = [change for change in compare(report, slower) if change["regression"]]
+    assert [(change["case"], change["metric"]) for change in regressions] == [("300/Flat", "search_ms.p99")]
+
+
+def test_package_import_defers_heavy_dependencies():
+    """
+    Test that importing the package or the FAISS backend does not load unused backends or the server stack.
+    """
+    package = measure_import("libs.ragsearch", repeat=1)
+    assert package["loaded"] == []
+
+    vector_db = measure_import("libs.ragsearch.vector_db", repeat=1)
+    assert not {"faiss", "chromadb", "flask", "cohere"} & set(vector_db["loaded"])
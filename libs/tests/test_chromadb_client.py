@@ -0,0 +1,67 @@
+"""
+Test the cached ChromaDB client and batched queries.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+chromadb = pytest.importorskip("chromadb")
+
+from libs.ragsearch.engine import RagSearchEngine
+from libs.ragsearch.fake import FakeEmbeddingClient
+from libs.ragsearch.vector_db import (clear_chromadb_cache, get_chromadb_collection, query_chromadb,
+                                      query_chromadb_batch)
+
+
+@pytest.fixture
+def chroma_store(tmp_path):
+    model = FakeEmbeddingClient(embedding_dim=8)
+    texts = ["chicken curry", "beef stew", "vegetable soup"]
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    collection = client.create_collection("recipes", embedding_function=None)
+    collection.add(ids=["0", "1", "2"], documents=texts,
+                   embeddings=[model.vector_for(text).tolist() for text in texts])
+    yield str(tmp_path), model
+    clear_chromadb_cache()
+
+
+def test_collection_is_cached(chroma_store):
+    """
+    Test that repeated lookups reuse one collection handle and clearing the cache reopens it.
+    """
+    path, _ = chroma_store
+    collection = get_chromadb_collection(path, "recipes")
+    assert get_chromadb_collection(path, "recipes") is collection
+    clear_chromadb_cache(path)
+    assert get_chromadb_collection(path, "recipes") is not collection
+
+
+def test_query_with_precomputed_embeddings(chroma_store):
+    """
+    Test that single and batched queries accept precomputed embeddings.
+    """
+    path, model = chroma_store
+    result = query_chromadb(path, "recipes", query_embedding=model.vector_for("beef stew"), n_results=1)
+    assert result["ids"] == [["1"]]
+
+    batch = query_chromadb_batch(path, "recipes", n_results=1,
+                                 query_embeddings=np.stack([model.vector_for("vegetable soup"),
+                                                            model.vector_for("chicken curry")]))
+    assert batch["ids"] == [["2"], ["0"]]
+    with pytest.raises(ValueError):
+        query_chromadb_batch(path, "recipes", query_texts=["soup"], query_embeddings=[[0.0] * 8])
+
+
+def test_engine_chromadb_search_many(chroma_store):
+    """
+    Test that the engine embeds ChromaDB queries itself in one call when asked to.
+    """
+    path, model = chroma_store
+    engine = RagSearchEngine(pd.DataFrame({"name": ["x"]}), model, model, vector_db=None,
+                             chromadb_sqlite_path=path, chromadb_collection_name="recipes",
+                             chromadb_query_embeddings=True, save_dir=path)
+    calls = model.calls
+    results = engine.chromadb_search_many(["chicken curry", "beef stew"], top_k=1)
+    assert results["ids"] == [["0"], ["1"]]
+    assert model.calls == calls + 1
+    assert engine.chromadb_search("vegetable soup", top_k=1)["ids"] == [["2"]]
@@ -0,0 +1,115 @@
+"""
+Test the embedding cache and the caching embedding-model wrapper.
+"""
+from types import SimpleNamespace
+
+import numpy as np
+
+from libs.ragsearch.embedding_cache import CachedEmbeddingModel, EmbeddingCache, LRUEmbeddingStore
+
+
+class RecordingEmbeddingModel:
+    """
+    Embedding client that records every batch of texts it receives.
+    """
+    def __init__(self):
+        self.batches = []
+        self.options = []
+
+    def embed(self, texts, **kwargs):
+        self.batches.append(list(texts))
+        self.options.append(kwargs)
+        return SimpleNamespace(embeddings=[[float(len(text)), 1.0, 0.5] for text in texts])
+
+
+def test_duplicates_and_repeats_skip_the_api(tmp_path):
+    """
+    Test that duplicates in a batch are embedded once and repeats are served from cache.
+    """
+    client = RecordingEmbeddingModel()
+    model = CachedEmbeddingModel(client, EmbeddingCache(disk_path=tmp_path / "cache.sqlite3"))
+
+    first = model.embed(texts=["a", "bb", "a"])
+    assert client.batches == [["a", "bb"]]
+    np.testing.assert_array_equal(first.embeddings[0], first.embeddings[2])
+
+    second = model.embed(texts=["bb", "ccc"])
+    assert client.batches[-1] == ["ccc"]
+    assert second.embeddings.shape == (2, 3)
+
+
+def test_disk_tier_survives_restart_and_keys_by_input_type(tmp_path):
+    """
+    Test that the SQLite tier serves a fresh process and input types do not collide.
+    """
+    path = tmp_path / "cache.sqlite3"
+    CachedEmbeddingModel(RecordingEmbeddingModel(), EmbeddingCache(disk_path=path)).embed(texts=["hello"])
+
+    client = RecordingEmbeddingModel()
+    model = CachedEmbeddingModel(client, EmbeddingCache(disk_path=path))
+    response = model.embed(texts=["hello"])
+    assert client.batches == []
+    np.testing.assert_allclose(response.embeddings[0], [5.0, 1.0, 0.5])
+
+    model.embed(texts=["hello"], input_type="search_query")
+    assert client.batches == [["hello"]]
+
+
+def test_a_different_model_misses_the_cache(tmp_path):
+    """
+    Test that vectors cached for one model are never served for another, and the model is sent to the API.
+    """
+    path = tmp_path / "cache.sqlite3"
+    client = RecordingEmbeddingModel()
+    CachedEmbeddingModel(client, EmbeddingCache(disk_path=path), model="embed-english-v3.0",
+                         input_type="search_document").embed(texts=["hello"])
+    assert client.options == [{"model": "embed-english-v3.0", "input_type": "search_document"}]
+
+    client = RecordingEmbeddingModel()
+    model = CachedEmbeddingModel(client, EmbeddingCache(disk_path=path), model="embed-english-light-v3.0",
+                                 input_type="search_document")
+    model.embed(texts=["hello"])
+    assert client.batches == [["hello"]]
+    model.embed(texts=["hello"], model="embed-english-v3.0")
+    assert client.batches == [["hello"]]
+
+
+def test_engine_embeds_rows_as_documents_and_searches_as_queries(tmp_path):
+    """
+    Test that the engine sends its model name and the input type matching each embed call.
+    """
+    import pandas as pd
+
+    from libs.ragsearch.engine import RagSearchEngine
+    from libs.ragsearch.fake import FakeChatClient
+    from libs.ragsearch.vector_db import VectorDB
+
+    model, options = FakeChatClient(embedding_dim=8), []
+    embed = model.embed
+
+    def recording_embed(texts, **kwargs):
+        options.append(kwargs)
+        return embed(texts=texts, **kwargs)
+
+    model.embed = recording_embed
+    data = pd.DataFrame({"name": [f"item {i}" for i in range(6)]})
+    engine = RagSearchEngine(data, model, model, vector_db=VectorDB(embedding_dim=8), save_dir=tmp_path,
+                             embedding_cache=EmbeddingCache(disk_path=tmp_path / "cache.sqlite3"),
+                             embedding_model_name="embed-english-v3.0")
+    assert options and all(option == {"model": "embed-english-v3.0", "input_type": "search_document"}
+                           for option in options)
+
+    options.clear()
+    engine.search(data["name"].iloc[0], top_k=1)
+    assert options == [{"model": "embed-english-v3.0", "input_type": "search_query"}]
+
+
+def test_lru_tier_evicts_least_recently_used():
+    """
+    Test that the in-memory tier keeps only the most recently used entries.
+    """
+    store = LRUEmbeddingStore(capacity=2)
+    store.put_many({"a": np.zeros(1), "b": np.zeros(1)})
+    store.get_many(["a"])
+    store.put_many({"c": np.zeros(1)})
+    assert set(store.get_many(["a", "b", "c"])) == {"a", "c"}
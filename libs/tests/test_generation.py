@@ -0,0 +1,142 @@
+"""
+Test context packing and streamed answer generation.
+"""
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from libs.ragsearch.engine import RagSearchEngine
+from libs.ragsearch.fake import FakeChatClient
+from libs.ragsearch.generation import estimate_tokens, pack_context, prefetch
+from libs.ragsearch.vector_db import VectorDB
+
+
+@pytest.fixture
+def engine(tmp_path):
+    data = pd.DataFrame({"name": [f"recipe {i}" for i in range(20)], "cuisine": ["thai", "greek"] * 10})
+    model = FakeChatClient(embedding_dim=8)
+    return RagSearchEngine(data, model, model, vector_db=VectorDB(embedding_dim=8), batch_size=4, save_dir=tmp_path)
+
+
+def test_pack_context_dedupes_and_respects_the_budget():
+    """
+    Test that duplicate hits are skipped, rank order is kept and the token budget is never exceeded.
+    """
+    hits = [{"metadata": {"name": "mug", "combined_text": "mug"}},
+            {"metadata": {"name": " MUG ", "combined_text": "MUG"}},
+            {"metadata": {"name": "plate " * 100, "price": None}},
+            {"metadata": {"name": "bowl"}}]
+
+    documents = pack_context(hits, max_tokens=50)
+    assert [document["id"] for document in documents] == ["0", "2"]
+    assert documents[0]["text"] == "name: mug"
+    assert sum(estimate_tokens(document["text"]) for document in documents) <= 50
+    assert [document["id"] for document in pack_context(hits, max_tokens=1_000)] == ["0", "2", "3"]
+
+
+def test_answer_streams_sources_then_tokens(engine):
+    """
+    Test that answer() starts generating with its first event and streams sources, tokens and a done event.
+    """
+    engine.llm_client.token_latency = 0.001
+    query = engine.data["combined_text"].iloc[7]
+    events = engine.answer(query, top_k=3, max_context_tokens=500, temperature=0.2)
+    assert not engine.llm_client.chat_requests
+    sources = next(events)
+    deadline = time.monotonic() + 5
+    while not engine.llm_client.chat_requests and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert engine.llm_client.chat_requests, "generation should start without waiting for the next event"
+
+    events = [sources] + list(events)
+    assert events[0]["event"] == "sources" and events[-1]["event"] == "done"
+    assert events[0]["data"][0]["metadata"]["name"] == "recipe 7"
+    answer = "".join(event["data"] for event in events if event["event"] == "token")
+    assert answer == f"Answer to {query} from documents 0 1 2"
+    assert events[-1]["data"]["finish_reason"] == "COMPLETE" and events[-1]["data"]["time_to_first_token"] > 0
+    request = engine.llm_client.chat_requests[0]
+    assert request["temperature"] == 0.2 and "max_tokens" not in request
+
+
+def test_answer_route_streams_server_sent_events(engine):
+    """
+    Test the /answer endpoint's event stream, its validation and how it reports a failing LLM.
+    """
+    client = engine.create_app().test_client()
+    response = client.post("/answer", json={"query": "recipe 4 | thai", "top_k": 2})
+    assert response.status_code == 200 and response.mimetype == "text/event-stream"
+    events = [block.split("\n") for block in response.get_data(as_text=True).strip().split("\n\n")]
+    names = [lines[0].removeprefix("event: ") for lines in events]
+    assert names[0] == "sources" and names[-1] == "done" and set(names[1:-1]) == {"token"}
+    assert json.loads(events[0][1].removeprefix("data: "))[0]["metadata"]["name"] == "recipe 4"
+    assert client.post("/answer", json={}).status_code == 400
+
+    def failing_chat_stream(**kwargs):
+        raise RuntimeError("LLM unavailable")
+        yield
+
+    engine.llm_client.chat_stream = failing_chat_stream
+    body = client.post("/answer", json={"query": "recipe 4 | thai"}).get_data(as_text=True)
+    assert body.startswith("event: sources") and "event: error" in body and "LLM unavailable" in body
+
+
+def wait_for_prefetch_threads(timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while any(thread.name == "ragsearch-prefetch" for thread in threading.enumerate()):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_abandoned_answer_stops_generation(engine):
+    """
+    Test that closing an answer after its sources, or never reading it, leaves no thread or LLM stream behind.
+    """
+    calls, closed = [], threading.Event()
+
+    def chat_stream(**kwargs):
+        calls.append(kwargs)
+        try:
+            for i in range(100_000):
+                time.sleep(0.001)
+                yield SimpleNamespace(event_type="text-generation", text=f" {i}")
+        finally:
+            closed.set()
+
+    engine.llm_client.chat_stream = chat_stream
+    events = engine.answer("recipe 3 | greek", top_k=2)
+    assert next(events)["event"] == "sources"
+    events.close()
+    assert closed.wait(5)
+    assert wait_for_prefetch_threads()
+
+    never_read = engine.answer("recipe 3 | greek", top_k=2)
+    never_read.close()
+    assert len(calls) == 1 and wait_for_prefetch_threads()
+
+
+def test_prefetch_stops_when_the_consumer_leaves():
+    """
+    Test that closing a prefetched stream early stops its producer thread.
+    """
+    produced = threading.Event()
+
+    def numbers():
+        for i in range(1_000_000):
+            produced.set()
+            yield i
+
+    stream = prefetch(numbers(), max_pending=4)
+    assert next(stream) == 0
+    stream.close()
+    assert produced.is_set() and wait_for_prefetch_threads()
+
+    stream = prefetch(numbers(), max_pending=4)
+    stream.cancel()
+    assert wait_for_prefetch_threads()
+    assert list(stream) == []
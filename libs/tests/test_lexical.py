@@ -0,0 +1,133 @@
+"""
+Test the BM25 lexical index, rank fusion and the engine's lexical and hybrid modes.
+"""
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from libs.ragsearch.engine import RagSearchEngine
+from libs.ragsearch.fake import FakeEmbeddingClient
+from libs.ragsearch.lexical import (BM25Index, reciprocal_rank_fusion, tokenize, vbyte_decode, vbyte_encode,
+                                    weighted_fusion)
+from libs.ragsearch.persistence import dataset_fingerprint
+from libs.ragsearch.vector_db import VectorDB
+
+
+def brute_force_bm25(docs, query, k1=1.2, b=0.75):
+    tokens = [tokenize(doc) for doc in docs]
+    average_length = np.mean([len(doc) for doc in tokens])
+    scores = np.zeros(len(docs))
+    for term in set(tokenize(query)):
+        df = sum(term in doc for doc in tokens)
+        idf = np.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        for i, doc in enumerate(tokens):
+            tf = Counter(doc)[term]
+            scores[i] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / average_length)) if tf else 0
+    return scores
+
+
+def test_vbyte_round_trip():
+    """
+    Test that variable-byte encoding round-trips small and large integers.
+    """
+    values = np.array([0, 1, 127, 128, 16383, 16384, 2 ** 40])
+    encoded = vbyte_encode(values)
+    assert len(encoded) == 1 + 1 + 1 + 2 + 2 + 3 + 6
+    assert vbyte_decode(encoded).tolist() == values.tolist()
+
+
+def test_bm25_top_k_matches_brute_force(tmp_path):
+    """
+    Test that MaxScore-pruned top-k equals exhaustive BM25 scoring, across flushes and a mmapped reload.
+    """
+    rng = np.random.default_rng(0)
+    words = [f"w{i}" for i in range(300)]
+    docs = [" ".join(rng.choice(words, size=rng.integers(3, 30))) for _ in range(2000)]
+    index = BM25Index()
+    index.add(docs[:1200])
+    index.flush()
+    index.add(docs[1200:], first_id=1200)
+
+    for query in ["w1 w5 w77", "w299", "w3 w3 w4 w150 w151 w152", "unknown w9"]:
+        expected = brute_force_bm25(docs, query)
+        hits = index.search(query, top_k=10)
+        assert [doc_id for doc_id, _ in hits] == np.lexsort((np.arange(len(docs)), -expected))[:10].tolist()
+        assert np.allclose([score for _, score in hits], np.sort(expected)[::-1][:10], rtol=1e-5)
+
+    reloaded = BM25Index.load(index.save(tmp_path / "lexical"), mmap=True)
+    assert reloaded.search("w1 w5 w77", top_k=10) == index.search("w1 w5 w77", top_k=10)
+    subset = np.arange(2000) % 2 == 0
+    assert all(doc_id % 2 == 0 for doc_id, _ in reloaded.search("w1 w5 w77", top_k=10, subset=subset))
+    assert index.search("nothing matches", top_k=5) == []
+
+
+def test_bm25_deletions_score_like_a_fresh_index(tmp_path):
+    """
+    Test that deleted documents leave the document count, frequencies and average length, and survive a reload.
+    """
+    rng = np.random.default_rng(1)
+    words = [f"w{i}" for i in range(50)]
+    docs = [" ".join(rng.choice(words, size=rng.integers(3, 40))) for _ in range(500)]
+    index = BM25Index()
+    index.add(docs)
+    deleted = rng.choice(len(docs), size=150, replace=False)
+    index.delete(deleted)
+    index.delete(deleted[:10])
+    live = np.setdiff1d(np.arange(len(docs)), deleted)
+    fresh = BM25Index()
+    fresh.add([docs[i] for i in live])
+
+    for query in ["w1 w5 w7", "w49", "w3 w3 w4 w10"]:
+        hits = index.search(query, top_k=20)
+        expected = [(int(live[doc_id]), score) for doc_id, score in fresh.search(query, top_k=20)]
+        assert [doc_id for doc_id, _ in hits] == [doc_id for doc_id, _ in expected]
+        assert np.allclose([score for _, score in hits], [score for _, score in expected], rtol=1e-5)
+
+    reloaded = BM25Index.load(index.save(tmp_path / "lexical"), mmap=True)
+    assert reloaded.search("w1 w5 w7", top_k=20) == index.search("w1 w5 w7", top_k=20)
+    reloaded.delete(live[:5])
+    assert not set(live[:5].tolist()) & {doc_id for doc_id, _ in reloaded.search("w1 w5 w7", top_k=500)}
+
+
+def test_rank_fusion():
+    """
+    Test reciprocal rank fusion and weighted score fusion.
+    """
+    vector = [(1, 0.9), (2, 0.8), (3, 0.1)]
+    lexical = [(3, 12.0), (1, 4.0)]
+    assert [doc_id for doc_id, _ in reciprocal_rank_fusion([vector, lexical], top_k=3)] == [1, 3, 2]
+    assert [doc_id for doc_id, _ in weighted_fusion([vector, lexical], top_k=2, weights=[0.2, 0.8])] == [3, 1]
+
+
+def test_engine_lexical_and_hybrid_modes(tmp_path):
+    """
+    Test that lexical search makes no embedding call, hybrid fuses both, and snapshots keep the index.
+    """
+    data = pd.DataFrame({"sku": [f"SKU-{1000 + i}" for i in range(20)], "name": ["mug", "plate", "bowl", "cup"] * 5})
+    data_path = tmp_path / "data.csv"
+    data.to_csv(data_path, index=False)
+    fingerprint = dataset_fingerprint(data_path, ["sku", "name"])
+    model = FakeEmbeddingClient(embedding_dim=8)
+    engine = RagSearchEngine(data, model, model, vector_db=VectorDB(embedding_dim=8), batch_size=8,
+                             save_dir=tmp_path, fingerprint=fingerprint)
+
+    calls = model.calls
+    hits = engine.search("sku-1013", top_k=3, mode="lexical")
+    assert hits[0]["metadata"]["sku"] == "SKU-1013"
+    assert engine.search_many(["1007 plate"], top_k=1, mode="lexical")[0][0]["metadata"]["sku"] == "SKU-1007"
+    assert model.calls == calls
+
+    hybrid = engine.search("SKU-1013 | cup", top_k=3, mode="hybrid")
+    assert hybrid[0]["metadata"]["sku"] == "SKU-1013" and model.calls == calls + 1
+    weighted = engine.search_many(["SKU-1013 | cup"], top_k=3, mode="hybrid", fusion="weighted",
+                                  filters={"name": "cup"})[0]
+    assert all(hit["metadata"]["name"] == "cup" for hit in weighted)
+
+    warm = RagSearchEngine(data, model, model, vector_db=VectorDB(embedding_dim=8), save_dir=tmp_path,
+                           fingerprint=fingerprint)
+    assert warm.search("sku-1013", top_k=1, mode="lexical")[0]["metadata"]["sku"] == "SKU-1013"
+
+    client = engine.create_app().test_client()
+    response = client.post("/query", json={"query": "SKU-1002", "top_k": 1, "mode": "lexical"})
+    assert response.get_json()["results"][0]["sku"] == "SKU-1002"
@@ -0,0 +1,109 @@
+"""
+Test the columnar metadata store and column selection in search results.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from libs.ragsearch.engine import RagSearchEngine
+from libs.ragsearch.fake import FakeEmbeddingClient
+from libs.ragsearch.metadata_store import MetadataStore
+from libs.ragsearch.vector_db import VectorDB
+
+
+def test_take_preserves_order_and_projects_columns(tmp_path):
+    """
+    Test vectorized lookups, missing ids, column selection and the mmapped round trip.
+    """
+    data = pd.DataFrame({"name": ["a", "b", None], "price": [1.5, np.nan, 3.0],
+                         "embedding": [[0.1], [0.2], [0.3]]})
+    store = MetadataStore.from_pandas(data)
+    assert store.take([2, -1, 0]) == [{"name": None, "price": 3.0}, {}, {"name": "a", "price": 1.5}]
+    assert store.take([1], columns=["embedding"]) == [{"embedding": [0.2]}]
+    with pytest.raises(ValueError):
+        store.take([0], columns=["missing"])
+
+    reopened = MetadataStore.open(store.write(tmp_path / "metadata.arrow"))
+    assert len(reopened) == 3
+    assert reopened.take([1, 0], columns=["name"]) == [{"name": "b"}, {"name": "a"}]
+
+
+def test_append_unifies_columns_and_fills_gaps():
+    """
+    Test that appended rows may add columns and start after a gap of rows without metadata.
+    """
+    store = MetadataStore()
+    store.append([{"title": "first"}], start=1)
+    store.append([{"title": "second", "year": 2020}])
+    assert len(store) == 3
+    assert store.take([1, 2]) == [{"title": "first", "year": None}, {"title": "second", "year": 2020}]
+    with pytest.raises(ValueError):
+        store.append([{"title": "overlap"}], start=0)
+
+
+def test_vector_db_search_uses_metadata_store():
+    """
+    Test that metadata passed to add_batch comes back with the hits.
+    """
+    vector_db = VectorDB(embedding_dim=3)
+    vector_db.add_batch(np.eye(3), metadata=[{"label": "x"}, {"label": "y"}, {"label": "z"}])
+    results = vector_db.search([0.0, 1.0, 0.0], top_k=1)
+    assert results[0]["index"] == 1 and results[0]["metadata"] == {"label": "y"}
+
+
+def test_engine_returns_selected_columns(tmp_path):
+    """
+    Test that the engine hydrates hits from the store and honours the columns argument.
+    """
+    data = pd.DataFrame({"name": [f"recipe {i}" for i in range(9)], "cuisine": ["thai", "greek", "mexican"] * 3})
+    model = FakeEmbeddingClient(embedding_dim=8)
+    engine = RagSearchEngine(data, model, model, vector_db=VectorDB(embedding_dim=8), batch_size=4,
+                             save_dir=tmp_path)
+    assert len(engine.metadata) == 9
+    query = engine.data["combined_text"].iloc[5]
+    assert engine.search(query, top_k=1)[0]["metadata"] == {"name": "recipe 5", "cuisine": "mexican",
+                                                            "combined_text": query}
+    assert engine.search_many([query], top_k=2, columns=["name"])[0][0]["metadata"] == {"name": "recipe 5"}
+
+    client = engine.create_app().test_client()
+    response = client.post("/query", json={"query": query, "top_k": 1, "columns": ["cuisine"]})
+    assert response.get_json()["results"] == [{"cuisine": "mexican"}]
+
+
+def test_mask_evaluates_filters():
+    """
+    Test equality, membership, range and date filters, with missing values never matching.
+    """
+    data = pd.DataFrame({"category": ["a", "b", None, "a"], "price": [5, 15, 25, 35],
+                         "date": pd.to_datetime(["2024-01-01", "2024-02-01", "2024-03-01", "2023-06-01"])})
+    store = MetadataStore.from_pandas(data)
+    assert store.mask({"category": "a"}).tolist() == [True, False, False, True]
+    assert store.mask({"category": ["a", "b"], "price": {"gte": 10, "lt": 30}}).tolist() == \
+        [False, True, False, False]
+    assert store.mask({"date": {"gte": "2024-01-15"}}).tolist() == [False, True, True, False]
+    assert store.mask({"category": {"ne": "a"}}).tolist() == [False, True, False, False]
+    with pytest.raises(ValueError):
+        store.mask({"missing": 1})
+    with pytest.raises(ValueError):
+        store.mask({"price": {"between": [1, 2]}})
+
+
+def test_engine_filters_search_results(tmp_path):
+    """
+    Test that filtered searches through the engine and the /query route only return matching rows.
+    """
+    data = pd.DataFrame({"name": [f"recipe {i}" for i in range(30)], "cuisine": ["thai", "greek", "mexican"] * 10,
+                         "minutes": list(range(30))})
+    model = FakeEmbeddingClient(embedding_dim=8)
+    engine = RagSearchEngine(data, model, model, vector_db=VectorDB(embedding_dim=8), batch_size=8,
+                             save_dir=tmp_path)
+    results = engine.search("recipe 4 | greek", top_k=5, filters={"cuisine": "thai", "minutes": {"lt": 20}})
+    assert len(results) == 5
+    assert all(hit["metadata"]["cuisine"] == "thai" and hit["metadata"]["minutes"] < 20 for hit in results)
+    assert engine.search_many(["recipe 4 | greek"], top_k=3, filters={"name": "recipe 7"})[0][0]["metadata"][
+        "name"] == "recipe 7"
+
+    client = engine.create_app().test_client()
+    response = client.post("/query", json={"query": "recipe 4 | greek", "top_k": 3, "columns": ["cuisine"],
+                                           "filters": {"cuisine": ["mexican"]}})
+    assert response.get_json()["results"] == [{"cuisine": "mexican"}] * 3
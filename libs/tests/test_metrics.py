@@ -0,0 +1,78 @@
+"""
+Test the hot-path metrics and the /metrics endpoint.
+"""
+import logging
+
+import pandas as pd
+import pytest
+
+from libs.ragsearch import metrics
+from libs.ragsearch.engine import RagSearchEngine
+from libs.ragsearch.fake import FakeEmbeddingClient
+from libs.ragsearch.metrics import MetricsRegistry
+from libs.ragsearch.vector_db import VectorDB
+
+
+def test_registry_renders_prometheus_text():
+    """
+    Test that counters, gauges and cumulative histogram buckets render in the exposition format.
+    """
+    registry = MetricsRegistry()
+    stage = registry.histogram("test_seconds", "Stage time.", ("stage",), buckets=(0.01, 0.1))
+    for value in (0.005, 0.05, 0.5):
+        stage.observe(value, stage='a "quoted" stage')
+    registry.counter("test_total", "Things.").inc(2)
+    registry.gauge("test_ratio", "A ratio.").set(0.25)
+
+    text = registry.render()
+    assert '# TYPE test_seconds histogram' in text
+    assert 'test_seconds_bucket{stage="a \\"quoted\\" stage",le="0.01"} 1' in text
+    assert 'test_seconds_bucket{stage="a \\"quoted\\" stage",le="0.1"} 2' in text
+    assert 'test_seconds_bucket{stage="a \\"quoted\\" stage",le="+Inf"} 3' in text
+    assert 'test_seconds_count{stage="a \\"quoted\\" stage"} 3' in text
+    assert "test_total 2" in text and "test_ratio 0.25" in text
+    assert registry.counter("test_total", "Things.") is registry.counter("test_total", "Things.")
+    with pytest.raises(ValueError):
+        registry.gauge("test_total", "Not a gauge.")
+    with pytest.raises(ValueError):
+        stage.observe(1.0)
+
+
+def test_metrics_route_reports_stages_and_index(tmp_path):
+    """
+    Test that a query records its stage spans and /metrics exposes them with the index gauges.
+    """
+    data = pd.DataFrame({"name": [f"recipe {i}" for i in range(12)]})
+    model = FakeEmbeddingClient(embedding_dim=8)
+    engine = RagSearchEngine(data, model, model, vector_db=VectorDB(embedding_dim=8), batch_size=4, save_dir=tmp_path)
+    client = engine.create_app(coalesce=False).test_client()
+    before = {stage: metrics.STAGE_SECONDS.count(stage=stage) for stage in ("embed", "ann", "hydrate", "serialize")}
+
+    assert client.post("/query", json={"query": "recipe 3", "mode": "hybrid"}).status_code == 200
+    for stage, count in before.items():
+        assert metrics.STAGE_SECONDS.count(stage=stage) == count + 1
+
+    response = client.get("/metrics")
+    assert response.status_code == 200 and response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+    assert 'ragsearch_request_seconds_count{route="/query"}' in text
+    assert "ragsearch_index_vectors 12" in text and "ragsearch_index_rows 12" in text
+    assert 'ragsearch_queries_total{mode="hybrid"}' in text
+
+
+def test_query_logs_are_sampled_at_debug(tmp_path, caplog, monkeypatch):
+    """
+    Test that per-query logs are off at INFO and sampled at DEBUG.
+    """
+    data = pd.DataFrame({"name": [f"recipe {i}" for i in range(4)]})
+    model = FakeEmbeddingClient(embedding_dim=8)
+    engine = RagSearchEngine(data, model, model, vector_db=VectorDB(embedding_dim=8), save_dir=tmp_path)
+
+    with caplog.at_level(logging.INFO):
+        engine.search("recipe 1")
+    assert "Processing search query" not in caplog.text
+
+    monkeypatch.setattr(metrics, "QUERY_LOG_SAMPLE_RATE", 1.0)
+    with caplog.at_level(logging.DEBUG):
+        engine.search("recipe 1")
+    assert "Processing search query: 'recipe 1'" in caplog.text
@@ -0,0 +1,77 @@
+"""
+Test moving embeddings between FAISS snapshots and ChromaDB collections.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("chromadb")
+
+from libs.ragsearch import migration
+from libs.ragsearch.engine import RagSearchEngine
+from libs.ragsearch.fake import FakeEmbeddingClient
+from libs.ragsearch.migration import export_to_chromadb, import_from_chromadb
+from libs.ragsearch.persistence import load_snapshot
+from libs.ragsearch.vector_db import VectorDB, clear_chromadb_cache, get_chromadb_collection
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    data = pd.DataFrame({"sku": [f"s{i}" for i in range(10)], "name": [f"item {i}" for i in range(10)],
+                         "color": ["red", "blue"] * 5, "price": [float(i) if i != 3 else None for i in range(10)]})
+    model = FakeEmbeddingClient(embedding_dim=8)
+    engine = RagSearchEngine(data, model, model, vector_db=VectorDB(embedding_dim=8, index_spec="HNSW16"),
+                             batch_size=4, save_dir=tmp_path / "snapshots", fingerprint="v1", id_column="sku")
+    engine.delete(["s9"])
+    yield engine.persist(), engine, model
+    clear_chromadb_cache()
+
+
+def test_round_trip_without_re_embedding(tmp_path, snapshot):
+    """
+    Test that a snapshot exported to Chroma and imported back keeps its vectors, keys and metadata.
+    """
+    snapshot_dir, engine, model = snapshot
+    calls = model.calls
+    report = export_to_chromadb(snapshot_dir, str(tmp_path / "chroma"), "products", batch_size=4)
+    assert report["vectors"] == report["total"] == 9
+    collection = get_chromadb_collection(str(tmp_path / "chroma"), "products")
+    record = collection.get(ids=["s3"], include=["embeddings", "documents", "metadatas"])
+    assert record["documents"] == [engine.data["combined_text"][3]]
+    assert record["metadatas"][0] == {"sku": "s3", "name": "item 3", "color": "blue"}
+    np.testing.assert_allclose(record["embeddings"][0], model.vector_for(engine.data["combined_text"][3]),
+                               atol=1e-6)
+
+    report = import_from_chromadb(str(tmp_path / "chroma"), "products", tmp_path / "imported", batch_size=4)
+    assert report["vectors"] == 9
+    vector_db, data, manifest = load_snapshot(tmp_path / "imported")
+    assert sorted(data["id"]) == [f"s{i}" for i in range(9)]
+    row = data.index[data["id"] == "s5"][0]
+    hit = vector_db.search(model.vector_for(data["combined_text"][row]), top_k=1)[0]
+    assert hit["index"] == row and manifest["id_column"] == "id"
+    assert model.calls == calls
+
+
+def test_interrupted_migrations_resume(tmp_path, snapshot, monkeypatch):
+    """
+    Test that rerunning a migration with the same checkpoint directory picks up where it stopped.
+    """
+    snapshot_dir, _, _ = snapshot
+    chroma_path, checkpoints = str(tmp_path / "chroma"), tmp_path / "checkpoints"
+    export_to_chromadb(snapshot_dir, chroma_path, "products", batch_size=4, checkpoint_dir=checkpoints / "export")
+    report = export_to_chromadb(snapshot_dir, chroma_path, "products", checkpoint_dir=checkpoints / "export")
+    assert report["resumed_from"] == 9 and report["vectors"] == 0
+    with pytest.raises(ValueError):
+        export_to_chromadb(snapshot_dir, chroma_path, "other", checkpoint_dir=checkpoints / "export")
+
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+    with monkeypatch.context() as patch:
+        patch.setattr(migration, "_build_snapshot", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            import_from_chromadb(chroma_path, "products", tmp_path / "imported", batch_size=4,
+                                 checkpoint_dir=checkpoints / "import")
+    report = import_from_chromadb(chroma_path, "products", tmp_path / "imported", batch_size=4,
+                                  checkpoint_dir=checkpoints / "import")
+    assert report["resumed_from"] == 9 and report["total"] == 9
+    assert len(load_snapshot(tmp_path / "imported")[1]) == 9
@@ -0,0 +1,59 @@
+"""
+Test the concurrent embedding pipeline against the fake embedding client.
+"""
+import time
+
+import numpy as np
+import pytest
+
+from libs.ragsearch.fake import FakeEmbeddingClient
+from libs.ragsearch.pipeline import EmbeddingPipeline, TokenBucket
+
+
+def test_batches_are_delivered_in_order_and_overlap():
+    """
+    Test that concurrent requests still reach the sink in batch order, faster than sequentially.
+    """
+    client = FakeEmbeddingClient(embedding_dim=4, latency=0.05)
+    batches = [(idx, [f"text {idx}-{j}" for j in range(3)]) for idx in range(8)]
+    delivered = []
+
+    started = time.perf_counter()
+    EmbeddingPipeline(client, concurrency=8).run(batches, lambda idx, emb: delivered.append((idx, emb)))
+    elapsed = time.perf_counter() - started
+
+    assert [idx for idx, _ in delivered] == list(range(8))
+    np.testing.assert_allclose(delivered[5][1][1], client.vector_for("text 5-1"))
+    assert elapsed < 8 * 0.05
+
+
+def test_rate_limit_errors_are_retried():
+    """
+    Test that 429 responses are retried with backoff until the batch succeeds.
+    """
+    client = FakeEmbeddingClient(embedding_dim=4, fail_first=2)
+    delivered = []
+    EmbeddingPipeline(client, concurrency=1, backoff_base=0.001).run([(0, ["a"])], lambda idx, emb: delivered.append(idx))
+    assert delivered == [0]
+    assert client.calls == 3
+
+
+def test_exhausted_retries_raise():
+    """
+    Test that a batch failing past max_retries aborts the run.
+    """
+    client = FakeEmbeddingClient(embedding_dim=4, fail_first=10)
+    pipeline = EmbeddingPipeline(client, concurrency=2, max_retries=1, backoff_base=0.001)
+    with pytest.raises(Exception, match="429"):
+        pipeline.run([(0, ["a"]), (1, ["b"])], lambda idx, emb: None)
+
+
+def test_token_bucket_limits_rate():
+    """
+    Test that the token bucket spaces out requests beyond the burst capacity.
+    """
+    bucket = TokenBucket(rate=50, capacity=1)
+    started = time.perf_counter()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.perf_counter() - started >= 5 / 50 * 0.9
@@ -0,0 +1,79 @@
+"""
+Test serving many datasets from one engine registry.
+"""
+import pandas as pd
+import pytest
+from werkzeug.test import Client
+
+from libs.ragsearch.engine import RagSearchEngine
+from libs.ragsearch.fake import FakeChatClient
+from libs.ragsearch.registry import EngineRegistry
+from libs.ragsearch.vector_db import VectorDB
+
+
+def build_engine(save_dir, model, prefix: str, rows: int = 12) -> RagSearchEngine:
+    data = pd.DataFrame({"name": [f"{prefix} {i}" for i in range(rows)]})
+    return RagSearchEngine(data, model, model, vector_db=VectorDB(embedding_dim=8), save_dir=save_dir,
+                           fingerprint=prefix, file_name=f"{prefix}.csv")
+
+
+def test_registry_serves_snapshots_lazily_per_dataset(tmp_path):
+    """
+    Test that datasets load memory-mapped on first request and each one answers under its own prefix.
+    """
+    model = FakeChatClient(embedding_dim=8)
+    for prefix in ("recipes", "books"):
+        build_engine(tmp_path, model, prefix)
+    registry = EngineRegistry()
+    for prefix in ("recipes", "books"):
+        registry.register_snapshot(prefix, tmp_path / prefix, model, model)
+    client = Client(registry.wsgi_app)
+
+    listing = client.get("/datasets").get_json()["datasets"]
+    assert [(dataset["name"], dataset["loaded"]) for dataset in listing] == [("books", False), ("recipes", False)]
+
+    response = client.post("/datasets/books/query", json={"query": "books 5", "top_k": 1})
+    assert response.get_json()["results"][0]["name"] == "books 5"
+    assert registry.loaded == ["books"]
+    info = client.get("/datasets/books/data-info").get_json()
+    assert info["file_name"] == "books.csv" and info["num_records"] == 12 and info["memory_bytes"] > 0
+    assert registry.get("books").vector_db.read_only
+
+    assert client.get("/datasets/recipes").status_code == 308
+    assert client.get("/datasets/films/data-info").status_code == 404
+    with pytest.raises(ValueError):
+        registry.register_snapshot("books", tmp_path / "books", model)
+
+
+def test_registry_evicts_least_recently_used_within_budget(tmp_path):
+    """
+    Test that cold datasets are unloaded to fit the memory budget, but never while serving a request.
+    """
+    model = FakeChatClient(embedding_dim=8)
+    loads = []
+
+    def loader(prefix):
+        def load():
+            loads.append(prefix)
+            return build_engine(tmp_path, model, prefix)
+        return load
+
+    one_engine = build_engine(tmp_path, model, "probe").memory_bytes()
+    registry = EngineRegistry(memory_budget=int(one_engine * 2.5))
+    for prefix in ("a", "b", "c"):
+        registry.register(prefix, loader(prefix))
+
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")
+    registry.get("c")
+    assert registry.loaded == ["a", "c"] and registry.memory_bytes <= registry.memory_budget
+
+    with registry.acquire("a") as engine:
+        registry.get("b")
+        assert registry.loaded == ["a", "b"]
+        assert engine.search("a 3", top_k=1)[0]["metadata"]["name"] == "a 3"
+    registry.get("b")
+    assert registry.loaded == ["a", "b"]
+    assert loads == ["a", "b", "c", "b"]
+    assert registry.evict("a") and registry.loaded == ["b"]
@@ -0,0 +1,113 @@
+"""
+Test the query result cache and its use by the engine.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from libs.ragsearch.engine import RagSearchEngine
+from libs.ragsearch.fake import FakeEmbeddingClient
+from libs.ragsearch.result_cache import QueryResultCache, result_cache_key
+from libs.ragsearch.vector_db import VectorDB
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class PluralBlindEmbeddingClient(FakeEmbeddingClient):
+    """
+    Embeds "mug" and "mugs" to the same vector, like a model that sees them as near-duplicates.
+    """
+    def vector_for(self, text: str) -> np.ndarray:
+        return super().vector_for(text.rstrip("s"))
+
+
+def test_exact_tier_expires_evicts_and_follows_the_index_version():
+    """
+    Test that entries expire after the TTL, the least recently used one is evicted and a new index version drops all.
+    """
+    clock = FakeClock()
+    cache = QueryResultCache(capacity=2, ttl=10, clock=clock)
+    keys = [result_cache_key(text, {"top_k": 5}) for text in ("a", "b", "c")]
+    assert keys[0] != result_cache_key("a", {"top_k": 6})
+
+    assert cache.get(keys[0], version=1) is None
+    cache.put(keys[0], ["A"], version=1)
+    cache.put(keys[1], ["B"], version=1)
+    assert cache.get(keys[0], version=1) == ["A"]
+    cache.put(keys[2], ["C"], version=1)
+    assert cache.get(keys[1], version=1) is None and cache.get(keys[0], version=1) == ["A"]
+
+    clock.now = 11
+    assert cache.get(keys[0], version=1) is None
+    cache.put(keys[0], ["A"], version=1)
+    assert cache.get(keys[0], version=2) is None
+    cache.put(keys[0], ["stale"], version=1)
+    assert cache.get(keys[0], version=2) is None
+
+
+def test_semantic_tier_matches_near_duplicate_embeddings():
+    """
+    Test that a semantic lookup reuses results above the threshold and only within the same parameter group.
+    """
+    cache = QueryResultCache(semantic_threshold=0.95)
+    cache.put("red mug", ["hit"], version=0, group="top5", embedding=[1.0, 0.1, 0.0])
+
+    assert cache.get_similar("top5", [1.0, 0.12, 0.0], version=0) == ["hit"]
+    assert cache.get_similar("top5", [0.0, 1.0, 0.0], version=0) is None
+    assert cache.get_similar("top10", [1.0, 0.1, 0.0], version=0) is None
+    assert QueryResultCache().get_similar("top5", [1.0, 0.1, 0.0], version=0) is None
+    with pytest.raises(ValueError):
+        QueryResultCache(semantic_threshold=1.5)
+
+
+def test_engine_serves_repeated_queries_from_cache(tmp_path):
+    """
+    Test that repeated and near-duplicate queries skip the embed call until the rows change.
+    """
+    data = pd.DataFrame({"sku": ["a", "b", "c"], "name": ["mug", "plate", "bowl"]})
+    model = PluralBlindEmbeddingClient(embedding_dim=8)
+    cache = QueryResultCache(semantic_threshold=0.99)
+    engine = RagSearchEngine(data, model, model, vector_db=VectorDB(embedding_dim=8), save_dir=tmp_path,
+                             id_column="sku", result_cache=cache)
+
+    first = engine.search("B | Plate", top_k=2)
+    calls = model.calls
+    assert engine.search("  b | plate ", top_k=2) == first
+    assert model.calls == calls
+    first[0]["metadata"]["name"] = "mutated"
+    assert engine.search("b | plate", top_k=2)[0]["metadata"]["name"] == "plate"
+
+    engine.search("b | plates", top_k=2)
+    assert model.calls == calls + 1 and cache.semantic_hits == 1
+    engine.search("b | plate", top_k=1)
+    assert model.calls == calls + 2
+
+    batch = engine.search_many(["b | plate", "a | mug", "a | mug"], top_k=2)
+    assert batch[0][0]["metadata"]["sku"] == "b" and batch[1] == batch[2]
+    assert cache.exact_hits == 3
+
+    calls = model.calls
+    engine.upsert(pd.DataFrame({"sku": ["b"], "name": ["platter"]}))
+    names = [hit["metadata"]["name"] for hit in engine.search("b | plate", top_k=3)]
+    assert sorted(names) == ["bowl", "mug", "platter"] and model.calls > calls
+
+
+@pytest.mark.parametrize("use_cache", [True, False])
+def test_chromadb_search_many_accepts_no_queries(tmp_path, use_cache):
+    """
+    Test that an empty ChromaDB batch returns an empty result without querying the collection.
+    """
+    model = PluralBlindEmbeddingClient(embedding_dim=8)
+    engine = RagSearchEngine(pd.DataFrame({"name": ["mug"]}), model, model, vector_db=None, save_dir=tmp_path,
+                             chromadb_sqlite_path=str(tmp_path / "missing"), chromadb_collection_name="products",
+                             result_cache=QueryResultCache() if use_cache else None)
+
+    result = engine.chromadb_search_many([])
+    assert result["ids"] == [] and result["documents"] == [] and result["distances"] == []
+    assert model.calls == 0
@@ -0,0 +1,113 @@
+"""
+Test batched search through the engine and the Flask routes.
+"""
+import threading
+
+import pandas as pd
+import pytest
+
+from libs.ragsearch.coalescer import CoalescerFullError, RequestCoalescer
+from libs.ragsearch.engine import RagSearchEngine
+from libs.ragsearch.fake import FakeEmbeddingClient
+from libs.ragsearch.vector_db import VectorDB
+
+
+@pytest.fixture
+def engine(tmp_path):
+    data = pd.DataFrame({"name": [f"recipe {i}" for i in range(30)], "cuisine": ["thai", "greek", "mexican"] * 10})
+    model = FakeEmbeddingClient(embedding_dim=8)
+    return RagSearchEngine(data, model, model, vector_db=VectorDB(embedding_dim=8), batch_size=4, save_dir=tmp_path)
+
+
+def test_search_many_matches_single_searches(engine):
+    """
+    Test that batched search returns the same hits as one search per query, with fewer embed calls.
+    """
+    queries = [engine.data["combined_text"].iloc[i] for i in (3, 11, 27, 3, 20, 8)]
+    calls_before = engine.embedding_model.calls
+    batched = engine.search_many(queries, top_k=3)
+    assert engine.embedding_model.calls - calls_before == 2  # ceil(6 / batch_size)
+
+    singles = [engine.search(query, top_k=3) for query in queries]
+    assert batched == singles
+    assert [results[0]["metadata"]["name"] for results in batched] == \
+        ["recipe 3", "recipe 11", "recipe 27", "recipe 3", "recipe 20", "recipe 8"]
+
+
+def test_batch_query_route(engine):
+    """
+    Test the /query/batch endpoint and its validation.
+    """
+    client = engine.create_app().test_client()
+    response = client.post("/query/batch", json={"queries": ["recipe 5 | mexican", "recipe 6 | thai"], "top_k": 2})
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [len(hits) for hits in results] == [2, 2]
+    assert results[1][0]["name"] == "recipe 6"
+
+    assert client.post("/query/batch", json={"queries": []}).status_code == 400
+    assert client.post("/query", json={"query": "recipe 1 | greek"}).status_code == 200
+
+
+def test_coalescer_batches_concurrent_queries():
+    """
+    Test that concurrent submissions share batched searches and get their own results back.
+    """
+    batch_sizes = []
+
+    def search_many(queries, top_k=5, **params):
+        batch_sizes.append(len(queries))
+        return [[f"{query}-{rank}" for rank in range(top_k)] for query in queries]
+
+    coalescer = RequestCoalescer(search_many, max_batch_size=8, max_wait_ms=50)
+    results = {}
+
+    def worker(i):
+        results[i] = coalescer.search(f"q{i}", top_k=1 + i % 3)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    coalescer.close()
+
+    assert sum(batch_sizes) == 16
+    assert len(batch_sizes) < 16
+    assert max(batch_sizes) <= 8
+    assert results[4] == ["q4-0", "q4-1"]
+    with pytest.raises(RuntimeError):
+        coalescer.submit("late")
+
+
+def test_full_coalescer_rejects_queries_with_503(engine):
+    """
+    Test that queries beyond max_pending are rejected until pending ones finish, and /query answers 503.
+    """
+    release = threading.Event()
+
+    def search_many(queries, top_k=5, **params):
+        release.wait(5)
+        return [[query] for query in queries]
+
+    coalescer = RequestCoalescer(search_many, max_batch_size=2, max_wait_ms=1, max_pending=3)
+    futures = [coalescer.submit(f"q{i}") for i in range(3)]
+    with pytest.raises(CoalescerFullError):
+        coalescer.submit("q3")
+    release.set()
+    assert [future.result(timeout=5) for future in futures] == [["q0"], ["q1"], ["q2"]]
+    assert coalescer.pending == 0 and coalescer.search("q4", timeout=5) == ["q4"]
+    coalescer.close()
+
+    client = engine.create_app(max_pending=1).test_client()
+    blocked = threading.Event()
+    engine_search_many, engine.coalescer.search_many = engine.coalescer.search_many, search_many
+    release.clear()
+    engine.coalescer.submit("recipe 1").add_done_callback(lambda future: blocked.set())
+    for route in ("/query", "/answer"):
+        response = client.post(route, json={"query": "recipe 2 | thai"})
+        assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+    release.set()
+    assert blocked.wait(5)
+    engine.coalescer.search_many = engine_search_many
+    assert client.post("/query", json={"query": "recipe 2 | thai"}).status_code == 200
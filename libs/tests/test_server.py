@@ -0,0 +1,72 @@
+"""
+Test the production server's readiness checks, timeouts and graceful shutdown.
+"""
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from libs.ragsearch.engine import RagSearchEngine
+from libs.ragsearch.fake import FakeEmbeddingClient
+from libs.ragsearch.server import SearchServer
+from libs.ragsearch.vector_db import VectorDB
+
+
+def build_engine(save_dir):
+    data = pd.DataFrame({"name": [f"recipe {i}" for i in range(12)], "cuisine": ["thai", "greek", "mexican"] * 4})
+    model = FakeEmbeddingClient(embedding_dim=8)
+    return RagSearchEngine(data, model, model, vector_db=VectorDB(embedding_dim=8), batch_size=4, save_dir=save_dir)
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_server_reports_ready_after_background_load(tmp_path):
+    """
+    Test that /health answers immediately, while /ready and searches wait for the engine loader.
+    """
+    release = threading.Event()
+
+    def loader():
+        release.wait(5)
+        return build_engine(tmp_path)
+
+    server = SearchServer(engine_loader=loader, host="127.0.0.1", port=0).start()
+    base = f"http://127.0.0.1:{server.port}"
+    try:
+        assert get(f"{base}/health") == (200, {"status": "ok"})
+        status, payload = get(f"{base}/ready")
+        assert status == 503 and payload["ready"] is False
+        assert get(f"{base}/data-info")[0] == 503
+
+        release.set()
+        server._loader_thread.join(5)
+        status, payload = get(f"{base}/ready")
+        assert status == 200 and payload["num_vectors"] == 12
+
+        request = urllib.request.Request(f"{base}/query", data=json.dumps({"query": "recipe 4 | greek"}).encode(),
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            assert json.loads(response.read())["results"][0]["name"] == "recipe 4"
+    finally:
+        server.stop()
+    assert not server.ready
+    assert server.engine.coalescer is None
+
+
+def test_server_requires_engine_or_loader():
+    """
+    Test that the server validates its engine configuration.
+    """
+    with pytest.raises(ValueError):
+        SearchServer()
+    with pytest.raises(ValueError):
+        SearchServer(engine=object(), workers=2)
@@ -0,0 +1,110 @@
+"""
+Test the sharded FAISS vector database.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from libs.ragsearch.engine import RagSearchEngine
+from libs.ragsearch.fake import FakeEmbeddingClient
+from libs.ragsearch.sharding import ShardedVectorDB, is_sharded
+from libs.ragsearch.vector_db import VectorDB
+
+
+@pytest.mark.parametrize("partition, range_size", [("hash", None), ("range", 70)])
+def test_sharded_search_matches_single_index(partition, range_size):
+    """
+    Test that merging the shards' top-k gives the same ids and scores as one exact index, with filters and deletes.
+    """
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((300, 16)).astype(np.float32)
+    queries = rng.standard_normal((5, 16)).astype(np.float32)
+    single = VectorDB(embedding_dim=16)
+    sharded = ShardedVectorDB(4, partition=partition, range_size=range_size)
+    for start in range(0, 300, 64):
+        metadata = [{"row": i} for i in range(start, min(start + 64, 300))]
+        single.add_batch(vectors[start:start + 64], metadata=metadata)
+        sharded.add_batch(vectors[start:start + 64], metadata=metadata)
+    assert sharded.ntotal == 300 and sharded.current_id == 300
+    assert sorted(np.bincount(sharded.shard_of(np.arange(300)))) == ([75] * 4 if partition == "hash" else [70, 70, 70, 90])
+
+    def hits(vector_db, **kwargs):
+        return [[(hit["index"], round(hit["similarity"], 5), hit["metadata"]["row"]) for hit in results]
+                for results in vector_db.search_batch(queries, top_k=10, **kwargs)]
+
+    assert hits(sharded) == hits(single)
+    subset = np.arange(0, 300, 7)
+    assert hits(sharded, subset=subset) == hits(single, subset=subset)
+    assert sharded.delete([hit[0] for hit in hits(single)[0][:3]]) == 3
+    single.delete([hit[0] for hit in hits(single)[0][:3]])
+    assert hits(sharded) == hits(single)
+    np.testing.assert_allclose(sharded.reconstruct([5, 150, 299]), single.reconstruct([5, 150, 299]), rtol=1e-6)
+
+
+def test_shards_save_and_load_independently(tmp_path):
+    """
+    Test that a saved sharded index loads whole or one shard at a time, memory-mapped and read-only.
+    """
+    vectors = np.random.default_rng(1).standard_normal((40, 8)).astype(np.float32)
+    sharded = ShardedVectorDB(3, index_spec="HNSW16")
+    sharded.add_batch(vectors)
+    sharded.save(tmp_path)
+    assert is_sharded(tmp_path) and not is_sharded(tmp_path / "shard-000")
+
+    loaded = ShardedVectorDB.load(tmp_path)
+    assert loaded.read_only and loaded.ntotal == 40
+    assert loaded.search(vectors[13], top_k=1)[0]["index"] == 13
+    with pytest.raises(RuntimeError):
+        loaded.add_batch(vectors[:1])
+
+    one_shard = ShardedVectorDB.load(tmp_path, shards=[1])
+    assert one_shard.ntotal == 13
+    assert {hit["index"] % 3 for hit in one_shard.search(vectors[13], top_k=5)} == {1}
+    assert VectorDB.load(tmp_path / "shard-001").ntotal == 13
+
+
+def test_engine_with_sharded_index(tmp_path):
+    """
+    Test that the engine ingests into shards, warm-starts from a sharded snapshot and updates it.
+    """
+    data = pd.DataFrame({"sku": [f"s{i}" for i in range(10)], "name": [f"recipe {i}" for i in range(10)]})
+    model = FakeEmbeddingClient(embedding_dim=8)
+
+    def make_engine():
+        return RagSearchEngine(data.copy(), model, model, vector_db=ShardedVectorDB(4), batch_size=3,
+                               save_dir=tmp_path, fingerprint="sharded", id_column="sku")
+
+    make_engine()
+    calls = model.calls
+    engine = make_engine()
+    assert model.calls == calls
+    assert isinstance(engine.vector_db, ShardedVectorDB) and engine.vector_db.read_only
+    assert engine.search("s7 | recipe 7", top_k=1)[0]["metadata"]["sku"] == "s7"
+
+    engine.upsert(pd.DataFrame({"sku": ["s3"], "name": ["soup"]}))
+    assert not engine.vector_db.read_only
+    assert engine.search("s3 | soup", top_k=1)[0]["metadata"]["name"] == "soup"
+
+
+def test_engine_deletes_on_sharded_ivf_after_filtered_search(tmp_path):
+    """
+    Test deletes, filtered searches and a snapshot round trip on IVF shards, then a plain search.
+    """
+    data = pd.DataFrame({"sku": [f"s{i}" for i in range(60)], "name": [f"recipe {i}" for i in range(60)],
+                         "cuisine": ["thai", "greek", "mexican"] * 20})
+    model = FakeEmbeddingClient(embedding_dim=8)
+    engine = RagSearchEngine(data.copy(), model, model, batch_size=8, save_dir=tmp_path, fingerprint="ivf",
+                             id_column="sku",
+                             vector_db=ShardedVectorDB(3, index_spec="IVF4,Flat", train_sample_size=12))
+    engine.delete(["s1", "s4"])
+    assert all(hit["metadata"]["cuisine"] == "greek"
+               for hit in engine.search("recipe 7 | greek", top_k=3, filters={"cuisine": "greek"}))
+    engine.persist()
+
+    engine = RagSearchEngine.from_snapshot(tmp_path / "ivf", model, model, id_column="sku")
+    engine.upsert(pd.DataFrame({"sku": ["s9"], "name": ["soup"], "cuisine": ["thai"]}))
+    engine.delete(["s10"])
+    assert not any(shard.tombstones for shard in engine.vector_db.shards)
+    skus = [hit["metadata"]["sku"] for hit in engine.search("recipe 10 | greek", top_k=10)]
+    assert skus and not {"s1", "s4", "s10"} & set(skus)
+    assert engine.search("s9 | soup | thai", top_k=1)[0]["metadata"]["name"] == "soup"
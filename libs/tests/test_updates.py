@@ -0,0 +1,123 @@
+"""
+Test stable ids, deletes and incremental refreshes of the FAISS index.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from libs.ragsearch.engine import RagSearchEngine
+from libs.ragsearch.fake import FakeEmbeddingClient
+from libs.ragsearch.persistence import dataset_fingerprint, dataset_key, latest_snapshot
+from libs.ragsearch.sharding import ShardedVectorDB
+from libs.ragsearch.vector_db import VectorDB
+
+
+@pytest.mark.parametrize("index_spec", ["Flat", "HNSW16", "IVF4,Flat"])
+def test_vector_db_delete(tmp_path, index_spec):
+    """
+    Test that deleted ids never come back, whether removed physically or tombstoned, across save and load.
+    """
+    vectors = np.random.default_rng(0).standard_normal((200, 8)).astype(np.float32)
+    vector_db = VectorDB(embedding_dim=8, index_spec=index_spec, train_sample_size=200)
+    vector_db.add_batch(vectors)
+    assert vector_db.delete([5, 7, 7, 999]) == 2
+    assert vector_db.delete([5]) == 0
+    assert vector_db.search(vectors[5], top_k=1, nprobe=4)[0]["index"] != 5
+
+    vector_db.add_batch(vectors[:1], ids=[200])
+    loaded = VectorDB.load(vector_db.save(tmp_path))
+    hits = loaded.search_batch(vectors[[5, 7, 0]], top_k=3, nprobe=4)
+    assert all(hit["index"] not in (5, 7) for results in hits for hit in results)
+    assert {hits[2][0]["index"], hits[2][1]["index"]} == {0, 200}
+    with pytest.raises(RuntimeError):
+        loaded.delete([1])
+
+
+@pytest.mark.parametrize("num_shards", [None, 3])
+def test_ivf_deletes_around_filtered_searches(num_shards):
+    """
+    Test that IVF deletes stay physical after an exact filtered scan, and later searches skip removed ids.
+    """
+    vectors = np.random.default_rng(0).standard_normal((60, 8)).astype(np.float32)
+    options = {"index_spec": "IVF4,Flat", "train_sample_size": 15}
+    vector_db = ShardedVectorDB(num_shards, **options) if num_shards else VectorDB(**options)
+    vector_db.add_batch(vectors)
+    shards = vector_db.shards if num_shards else [vector_db]
+
+    assert vector_db.delete([1]) == 1
+    subset = np.arange(0, 60, 3)
+    hits = vector_db.search_batch(vectors[:2], top_k=5, subset=subset)
+    assert all(hit["index"] in subset for results in hits for hit in results)
+    assert vector_db.delete([2, 3]) == 2
+    assert not any(shard.tombstones for shard in shards)
+    assert vector_db.ntotal == 57
+
+    for kwargs in ({}, {"subset": np.arange(0, 10)}, {"nprobe": 4}):
+        hits = vector_db.search_batch(vectors[:4], top_k=5, **kwargs)
+        assert not {1, 2, 3} & {hit["index"] for results in hits for hit in results}
+
+
+def make_engine(data, model, tmp_path, data_path):
+    data.to_csv(data_path, index=False)
+    options = {"index_spec": "HNSW16"}
+    return RagSearchEngine(data.copy(), model, model, vector_db=VectorDB(embedding_dim=8, index_spec="HNSW16"),
+                           batch_size=4, save_dir=tmp_path / "snapshots", id_column="sku",
+                           fingerprint=dataset_fingerprint(data_path, ["name", "color"], options),
+                           dataset_key=dataset_key(data_path.name, ["name", "color"], options))
+
+
+def test_refresh_only_embeds_changed_rows(tmp_path):
+    """
+    Test that a new version of the file re-embeds only added and edited rows, and deletes removed ones.
+    """
+    data = pd.DataFrame({"sku": range(100, 120), "name": [f"item {i}" for i in range(20)],
+                         "color": ["red", "blue"] * 10, "price": range(20)})
+    data_path = tmp_path / "catalog.csv"
+    model = FakeEmbeddingClient(embedding_dim=8)
+    make_engine(data, model, tmp_path, data_path)
+    assert model.texts_embedded == 20
+
+    changed = data[data["sku"] != 103].copy()
+    changed.loc[changed["sku"] == 105, "name"] = "item five renamed"
+    changed.loc[changed["sku"] == 106, "price"] = 999
+    changed = pd.concat([changed, pd.DataFrame({"sku": [200], "name": ["new item"], "color": ["green"],
+                                                "price": [1]})], ignore_index=True)
+    engine = make_engine(changed, model, tmp_path, data_path)
+    assert model.texts_embedded == 22
+    assert len(engine.data) == 20 and engine.vector_db.index.ntotal == 22  # HNSW keeps tombstones
+
+    assert engine.search("item five renamed | blue", top_k=1)[0]["metadata"]["sku"] == 105
+    assert engine.search("item 6 | red", top_k=1)[0]["metadata"]["price"] == 999
+    assert all(hit["metadata"]["sku"] != 103 for hit in engine.search("item 3 | red", top_k=20))
+    assert engine.search("new item", top_k=1, mode="lexical")[0]["metadata"]["sku"] == 200
+    assert all(hit["metadata"]["color"] == "green"
+               for hit in engine.search("item", top_k=5, filters={"color": "green"}))
+    assert len(list((tmp_path / "snapshots").glob("*.latest"))) == 1
+    assert latest_snapshot(tmp_path / "snapshots", engine.dataset_key).name == engine.fingerprint
+
+    # The refreshed snapshot warm-starts with its stable ids intact
+    embedded = model.texts_embedded
+    warm = make_engine(changed, model, tmp_path, data_path)
+    assert model.texts_embedded == embedded
+    assert warm.search("item five renamed | blue", top_k=1)[0]["metadata"]["sku"] == 105
+
+
+def test_upsert_and_delete(tmp_path):
+    """
+    Test upserts and deletes by primary key, including on a memory-mapped warm start.
+    """
+    data = pd.DataFrame({"sku": ["a", "b", "c"], "name": ["mug", "plate", "bowl"], "color": ["red"] * 3})
+    model = FakeEmbeddingClient(embedding_dim=8)
+    engine = make_engine(data, model, tmp_path, tmp_path / "data.csv")
+    engine = make_engine(data, model, tmp_path, tmp_path / "data.csv")
+    assert engine.vector_db.read_only
+
+    stats = engine.upsert(pd.DataFrame({"sku": ["b", "d"], "name": ["plate", "spoon"], "color": ["blue", "red"]}))
+    assert stats == {"added": 1, "updated": 1, "deleted": 0, "unchanged": 2}
+    assert engine.search("b | plate | blue", top_k=1)[0]["metadata"]["color"] == "blue"
+    assert sorted(hit["metadata"]["sku"] for hit in engine.search("plate", top_k=10)) == ["a", "b", "c", "d"]
+
+    assert engine.delete(["a"])["deleted"] == 1
+    assert "a" not in [hit["metadata"]["sku"] for hit in engine.search("mug | red", top_k=10, mode="hybrid")]
+    with pytest.raises(ValueError):
+        engine.upsert(pd.DataFrame({"sku": ["x", "x"], "name": ["dup", "dup"], "color": ["red", "red"]}))
@@ -0,0 +1,49 @@
+"""
+Test the text-building utilities.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from libs.ragsearch.utils import build_combined_text, extract_textual_columns, preprocess_text
+
+
+@pytest.fixture
+def products():
+    return pd.DataFrame({
+        "sku": ["A-1", "B-2", "C-3"],
+        "title": ["red mug", None, "blue plate"],
+        "notes": ["dishwasher safe", "", np.nan],
+        "price": [4.5, np.nan, 12.0],
+    })
+
+
+def test_matches_row_wise_preprocess_text(products):
+    """
+    Test that the vectorized builder reproduces the row-wise apply output exactly.
+    """
+    columns = ["title", "notes", "price"]
+    expected = products.apply(lambda row: preprocess_text(row, columns), axis=1).tolist()
+    assert build_combined_text(products, columns).tolist() == expected
+
+
+def test_prefixes_and_token_budget(products):
+    """
+    Test that prefixes apply only to present values and texts are truncated.
+    """
+    combined = build_combined_text(products, ["title", "notes"], prefixes={"title": "Title: "})
+    assert combined.tolist() == ["Title: red mug | dishwasher safe", " | ", "Title: blue plate | "]
+
+    truncated = build_combined_text(products, ["title", "notes"], max_tokens=2)
+    assert truncated.tolist() == ["red mug ", " | ", "blue pla"]
+
+
+def test_textual_column_allowlist(products):
+    """
+    Test that an allowlist overrides dtype detection and exclusions are honoured.
+    """
+    assert extract_textual_columns(products) == ["sku", "title", "notes"]
+    assert extract_textual_columns(products, exclude=["sku"]) == ["title", "notes"]
+    assert extract_textual_columns(products, include=["notes", "price"]) == ["notes", "price"]
+    with pytest.raises(ValueError):
+        extract_textual_columns(products, include=["missing"])
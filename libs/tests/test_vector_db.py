@@ -0,0 +1,203 @@
+"""
+Test the FAISS-backed VectorDB and the engine's bulk ingestion path.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from libs.ragsearch.engine import RagSearchEngine
+from libs.ragsearch.fake import FakeEmbeddingClient
+from libs.ragsearch.vector_db import VectorDB, storage_index_spec
+
+
+def test_add_batch_normalizes_and_assigns_ids():
+    """
+    Test that add_batch indexes a whole matrix with unit-norm rows.
+    """
+    vector_db = VectorDB(embedding_dim=4)
+    embeddings = np.array([[3.0, 4.0, 0.0, 0.0], [0.0, 0.0, 0.0, 2.0]])
+
+    ids = vector_db.add_batch(embeddings, metadata=[{"name": "a"}, {"name": "b"}])
+
+    assert ids.tolist() == [0, 1]
+    assert vector_db.index.ntotal == 2
+    stored = vector_db.index.reconstruct_n(0, 2)
+    np.testing.assert_allclose(np.linalg.norm(stored, axis=1), 1.0, rtol=1e-6)
+
+    results = vector_db.search([0.0, 0.0, 0.0, 1.0], top_k=1)
+    assert results[0]["index"] == 1
+    assert results[0]["metadata"] == {"name": "b"}
+
+
+def test_add_batch_rejects_bad_input():
+    """
+    Test that mismatched dimensions, ids and zero vectors are rejected.
+    """
+    vector_db = VectorDB(embedding_dim=4)
+    with pytest.raises(ValueError):
+        vector_db.add_batch(np.ones((2, 3)))
+    with pytest.raises(ValueError):
+        vector_db.add_batch(np.ones((2, 4)), ids=[5, 6])
+    with pytest.raises(ValueError):
+        vector_db.add_batch(np.zeros((1, 4)))
+    assert vector_db.index.ntotal == 0
+
+
+def test_engine_ingests_in_batches(tmp_path):
+    """
+    Test that the engine embeds each batch once and search hydrates the matching row.
+    """
+    data = pd.DataFrame({"name": [f"recipe {i}" for i in range(7)], "cuisine": ["thai"] * 7})
+    model = FakeEmbeddingClient(embedding_dim=8)
+    engine = RagSearchEngine(data, model, model, vector_db=VectorDB(embedding_dim=model.embedding_dim),
+                             batch_size=3, save_dir=tmp_path)
+
+    assert engine.vector_db.index.ntotal == 7
+    assert model.calls == 3
+
+    results = engine.search(data["combined_text"].iloc[4], top_k=1)
+    assert results[0]["metadata"]["name"] == "recipe 4"
+
+
+def test_save_and_mmap_load_round_trip(tmp_path):
+    """
+    Test that a saved index loads memory-mapped, searchable and read-only.
+    """
+    vector_db = VectorDB(embedding_dim=4)
+    vector_db.add_batch(np.eye(4))
+    vector_db.save(tmp_path)
+
+    loaded = VectorDB.load(tmp_path)
+    assert loaded.index.ntotal == 4
+    assert loaded.current_id == 4
+    assert loaded.search([0.0, 1.0, 0.0, 0.0], top_k=1)[0]["index"] == 1
+    with pytest.raises(RuntimeError):
+        loaded.add_batch(np.eye(4))
+
+
+def test_engine_warm_starts_from_snapshot(tmp_path):
+    """
+    Test that a second engine over the same fingerprint skips the embedding API.
+    """
+    data = pd.DataFrame({"name": [f"recipe {i}" for i in range(5)], "cuisine": ["thai"] * 5})
+    model = FakeEmbeddingClient(embedding_dim=8)
+    RagSearchEngine(data.copy(), model, model, vector_db=VectorDB(embedding_dim=model.embedding_dim),
+                    save_dir=tmp_path, fingerprint="abc123")
+    assert model.calls == 1
+
+    engine = RagSearchEngine(data.copy(), model, model, vector_db=VectorDB(embedding_dim=model.embedding_dim),
+                             save_dir=tmp_path, fingerprint="abc123")
+    assert model.calls == 1
+    assert engine.vector_db.index.ntotal == 5
+    results = engine.search("recipe 2 | thai", top_k=1)
+    assert results[0]["metadata"]["name"] == "recipe 2"
+
+
+def test_ivf_index_trains_on_buffered_sample():
+    """
+    Test that a trainable index buffers until the sample is large enough, then trains and reports recall.
+    """
+    vectors = np.random.default_rng(0).standard_normal((2000, 16)).astype(np.float32)
+    vector_db = VectorDB(embedding_dim=16, index_spec="IVF16,Flat", train_sample_size=1000)
+
+    vector_db.add_batch(vectors[:600])
+    assert not vector_db.index.is_trained and vector_db.index.ntotal == 0
+    vector_db.add_batch(vectors[600:])
+    assert vector_db.index.is_trained and vector_db.index.ntotal == 2000
+    assert 0.0 < vector_db.recall_report["recall"] <= 1.0
+
+    # Visiting every list makes IVF exact
+    results = vector_db.search(vectors[1234], top_k=1, nprobe=16)
+    assert results[0]["index"] == 1234
+
+
+def test_hnsw_and_opq_specs_search():
+    """
+    Test that factory specs without and with a pre-transform accept search knobs.
+    """
+    vectors = np.random.default_rng(1).standard_normal((1200, 16)).astype(np.float32)
+    for spec, knobs in [("HNSW16", {"ef_search": 64}), ("OPQ4,IVF8,PQ4x4", {"nprobe": 8})]:
+        vector_db = VectorDB(embedding_dim=16, index_spec=spec, train_sample_size=1000)
+        vector_db.add_batch(vectors)
+        vector_db.flush()
+        assert vector_db.index.ntotal == 1200
+        assert len(vector_db.search(vectors[5], top_k=3, **knobs)) == 3
+    assert vector_db.measure_recall(vectors, k=5)["k"] == 5
+
+
+def test_invalid_index_spec():
+    """
+    Test that an unknown factory string is reported as a ValueError.
+    """
+    with pytest.raises(ValueError):
+        VectorDB(embedding_dim=16, index_spec="NotAnIndex")
+
+
+@pytest.mark.parametrize("index_spec", ["Flat", "HNSW16", "OPQ4,IVF8,Flat"])
+def test_filtered_search_only_returns_subset(tmp_path, index_spec):
+    """
+    Test that a subset filters inside the index scan and that small subsets are scored exactly.
+    """
+    vectors = np.random.default_rng(3).standard_normal((1000, 16)).astype(np.float32)
+    vector_db = VectorDB(embedding_dim=16, index_spec=index_spec, train_sample_size=1000, exact_scan_threshold=50)
+    vector_db.add_batch(vectors)
+    vector_db = VectorDB.load(vector_db.save(tmp_path), mmap=True)
+    vector_db.exact_scan_threshold = 50
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    for subset in (np.arange(0, 1000, 40), np.arange(0, 1000, 2)):
+        mask = np.zeros(1000, dtype=bool)
+        mask[subset] = True
+        results = vector_db.search_batch(vectors[:3], top_k=5, subset=mask, nprobe=8)
+        for query, hits in zip(normalized[:3], results):
+            assert hits and all(mask[hit["index"]] for hit in hits)
+            expected = subset[np.argsort(-(normalized[subset] @ query))[:5]]
+            if index_spec == "Flat" or len(subset) <= 50:
+                assert [hit["index"] for hit in hits] == expected.tolist()
+
+    assert vector_db.search(vectors[0], top_k=3, subset=[]) == []
+    with pytest.raises(ValueError):
+        vector_db.search(vectors[0], subset=np.ones(10, dtype=bool))
+
+
+def test_storage_index_spec():
+    """
+    Test that precisions map onto FAISS scalar quantizer specs.
+    """
+    assert storage_index_spec("Flat", "float16") == "SQfp16"
+    assert storage_index_spec("IVF64,Flat", "int8") == "IVF64,SQ8"
+    assert storage_index_spec("HNSW32", "int8") == "HNSW32,SQ8"
+    assert storage_index_spec("IVF64,PQ8") == "IVF64,PQ8"
+    with pytest.raises(ValueError):
+        storage_index_spec("IVF64,PQ8", "float16")
+    with pytest.raises(ValueError):
+        storage_index_spec("Flat", "int4")
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_reduced_precision_with_exact_rerank(tmp_path, precision):
+    """
+    Test that compressed storage shrinks the index, detects the dimension and reranks exactly from disk.
+    """
+    vectors = np.random.default_rng(4).standard_normal((2000, 64)).astype(np.float32)
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = normalized[:20] + 0.3 * np.random.default_rng(5).standard_normal((20, 64)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    expected = np.argsort(-(queries @ normalized.T), axis=1)[:, :5]
+
+    vector_db = VectorDB(precision=precision, rerank_factor=4)
+    vector_db.add_batch(vectors)
+    assert vector_db.embedding_dim == 64
+    directory = vector_db.save(tmp_path)
+    assert (directory / "index.faiss").stat().st_size < 0.6 * normalized.nbytes
+
+    loaded = VectorDB.load(directory, mmap=True)
+    results = loaded.search_batch(queries, top_k=5)
+    assert [[hit["index"] for hit in hits] for hits in results] == expected.tolist()
+    np.testing.assert_allclose([hit["similarity"] for hit in results[0]],
+                               queries[0] @ normalized[expected[0]].T, rtol=1e-5)
+    np.testing.assert_array_equal(loaded.reconstruct([7]), normalized[[7]])
+
+    writable = VectorDB.load(directory, mmap=False)
+    writable.add_batch(vectors[:1])
+    assert writable.search(vectors[0], top_k=2)[1]["index"] in (0, 2000)